@@ -71,7 +71,7 @@ class AdminReceipt(admin.ModelAdmin):
     filter_horizontal = ('tags',)
 
     def favorite_count(self, instance):
-        return instance.favorites_of_users.count()
+        return instance.favorites_count
 
     def get_tags(self, obj):
         return ', '.join([tag.name for tag in obj.tags.all()])
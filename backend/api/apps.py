@@ -1,7 +1,16 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
     verbose_name = 'foodgram api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .db import check_connections
+        if settings.DB_HEALTH_CHECKS:
+            request_started.connect(
+                check_connections, dispatch_uid='api.check_connections')
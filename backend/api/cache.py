@@ -0,0 +1,226 @@
+import hashlib
+import threading
+import uuid
+
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .models import Receipt, Tag, TagReceipt
+
+RECIPES_CACHE_ALIAS = 'recipes'
+ALL_RECIPES = 'all'
+
+_pending = threading.local()
+
+
+def get_cache():
+    return caches[RECIPES_CACHE_ALIAS]
+
+
+def generation_key(scope):
+    return f'recipes:gen:{scope}'
+
+
+def detail_key(pk):
+    """Ключ детальной страницы; ``pk`` приводится к числу.
+
+    Иначе ``/recipes/01/`` и ``/recipes/1/`` кешировались бы под разными
+    ключами, а инвалидация сбрасывала бы только второй.
+    """
+    return f'recipes:detail:{int(pk)}'
+
+
+def get_generations(scopes):
+    """Возвращает текущие поколения областей инвалидации.
+
+    Отсутствующее поколение (ещё не создано или вытеснено)
+    заменяется новым случайным значением, так что записи, собранные
+    со старым поколением, становятся недостижимы.
+    """
+    cache = get_cache()
+    keys = [generation_key(scope) for scope in scopes]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            generations[key] = cache.get(key)
+    return [generations[key] for key in keys]
+
+
+def list_key(request):
+    params = sorted(
+        (name, sorted(set(values)))
+        for name, values in request.query_params.lists()
+    )
+    scopes = [
+        f'tag:{slug}' for slug in sorted(
+            set(request.query_params.getlist('tags')))
+    ]
+    author = request.query_params.get('author')
+    if author:
+        scopes.append(
+            f'author:{int(author) if author.isdigit() else author}')
+    if not scopes:
+        scopes.append(ALL_RECIPES)
+    raw = repr((request.get_host(), params, get_generations(scopes)))
+    return 'recipes:list:' + hashlib.md5(raw.encode()).hexdigest()
+
+
+class AnonymousCacheMixin:
+    """Кеширует ответы ``list`` и ``retrieve`` для анонимных запросов.
+
+    Поля ``volatile_fields`` (счётчики избранного и корзины) меняются
+    на каждое нажатие кнопки, поэтому в кеш попадают пустыми, а при
+    выдаче подставляются из базы одним запросом по первичному ключу.
+    Иначе каждое нажатие сбрасывало бы все кешированные списки.
+
+    Инвалидация адресная и доходит до всех воркеров, только если кеш
+    ``recipes`` у них общий (``RECIPES_CACHE=file`` на одной машине).
+    Процессный ``lru`` годится лишь для одного процесса: остальные
+    воркеры отдавали бы устаревшие ответы до RECIPES_CACHE_TIMEOUT.
+    """
+    volatile_fields = ()
+
+    def list(self, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(
+            list_key(request), super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        if not request.user.is_anonymous or not str(pk).isdigit():
+            return super().retrieve(request, *args, **kwargs)
+        return self.cached_response(
+            detail_key(pk), super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, key, handler, request, *args, **kwargs):
+        cache = get_cache()
+        data = cache.get(key)
+        if data is not None:
+            return Response(self.overlay_volatile(data))
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(key, self.strip_volatile(response.data))
+        return response
+
+    def items(self, data):
+        if isinstance(data, dict):
+            return data['results'] if 'results' in data else [data]
+        return data
+
+    def strip_volatile(self, data):
+        if not self.volatile_fields:
+            return data
+        blank = dict.fromkeys(self.volatile_fields)
+        items = [{**item, **blank} for item in self.items(data)]
+        if not isinstance(data, dict):
+            return items
+        return {**data, 'results': items} if 'results' in data else items[0]
+
+    def overlay_volatile(self, data):
+        items = self.items(data)
+        if not self.volatile_fields or not items:
+            return data
+        values = {
+            pk: dict(zip(self.volatile_fields, row))
+            for pk, *row in self.queryset.model.objects.filter(
+                pk__in=[item['id'] for item in items]
+            ).values_list('pk', *self.volatile_fields)
+        }
+        for item in items:
+            item.update(values.get(item['id'], {}))
+        return data
+
+
+class PendingInvalidations(dict):
+    """Инвалидации одной транзакции; сама служит её on_commit-колбэком.
+
+    Набор привязан к транзакции (точнее, к текущей точке сохранения),
+    а не к потоку: при откате колбэк выбрасывается вместе с набором,
+    и отменённые изменения не смешиваются со следующей транзакцией.
+    """
+
+    flushed = False
+
+    def __call__(self):
+        self.flushed = True
+        flush_invalidations(self)
+
+    def is_registered(self):
+        if self.flushed:
+            return False
+        connection = transaction.get_connection()
+        savepoints = set(connection.savepoint_ids)
+        return any(
+            callback is self and sids == savepoints
+            for sids, callback in connection.run_on_commit
+        )
+
+
+def invalidate_receipt(receipt_id, tag_ids=(), author_id=None,
+                       touched=False):
+    """Откладывает инвалидацию рецепта до фиксации транзакции.
+
+    Сбрасывается кеш детальной страницы рецепта и поколения списков
+    для его тегов и автора. ``tag_ids`` и ``author_id`` передаются,
+    когда после фиксации их уже не получить из базы: при удалении
+    рецепта или снятии с него тегов. ``touched`` означает, что сам
+    рецепт сохранялся и его ``modified`` уже обновлён.
+    """
+    pending = getattr(_pending, 'receipts', None)
+    registered = pending is not None and pending.is_registered()
+    if not registered:
+        pending = _pending.receipts = PendingInvalidations()
+    known_tags, known_author, known_touched = pending.get(
+        receipt_id, (set(), None, False))
+    pending[receipt_id] = (
+        known_tags | set(tag_ids),
+        author_id or known_author,
+        touched or known_touched
+    )
+    if not registered:
+        # Вне транзакции колбэк выполняется сразу.
+        transaction.on_commit(pending)
+
+
+def invalidate_receipts(queryset):
+    """Инвалидирует рецепты, в ответах которых видна изменённая запись.
+
+    Автор и ингредиенты выводятся внутри рецепта, поэтому их правка
+    сдвигает ``modified`` рецептов, иначе ETag отдал бы 304 со старыми
+    данными.
+    """
+    for receipt_id in queryset.values_list('pk', flat=True):
+        invalidate_receipt(receipt_id)
+
+
+def flush_invalidations(pending):
+    receipt_ids = list(pending)
+    tag_ids = set()
+    author_ids = set(
+        Receipt.objects.filter(pk__in=[
+            pk for pk, (_, author_id, *_) in pending.items()
+            if author_id is None
+        ]).values_list('author_id', flat=True)
+    )
+    for known_tags, known_author, *_ in pending.values():
+        tag_ids |= known_tags
+        if known_author is not None:
+            author_ids.add(known_author)
+    Receipt.objects.filter(
+        pk__in=[pk for pk, (*_, touched) in pending.items() if not touched]
+    ).update(modified=timezone.now())
+    tag_ids.update(
+        TagReceipt.objects.filter(
+            receipt_id__in=receipt_ids).values_list('tag_id', flat=True)
+    )
+    slugs = Tag.objects.filter(pk__in=tag_ids).values_list('slug', flat=True)
+    scopes = [ALL_RECIPES]
+    scopes += [f'tag:{slug}' for slug in slugs]
+    scopes += [f'author:{author_id}' for author_id in author_ids]
+    cache = get_cache()
+    cache.delete_many([detail_key(pk) for pk in receipt_ids])
+    cache.delete_many([generation_key(scope) for scope in scopes])
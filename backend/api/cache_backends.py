@@ -0,0 +1,114 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class _Store:
+    def __init__(self):
+        self.data = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+
+class SizedLRUCache(BaseCache):
+    """Кеш в памяти процесса с вытеснением по суммарному размеру.
+
+    В отличие от ``LocMemCache``, ограничивающего число записей,
+    здесь ограничен объём сериализованных значений в байтах
+    (``OPTIONS['MAX_SIZE']``); при переполнении вытесняются давно
+    не использовавшиеся записи.
+    """
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        self.max_size = int(
+            params.get('OPTIONS', {}).get('MAX_SIZE', 64 * 1024 * 1024))
+        with _stores_lock:
+            self._store = _stores.setdefault(name, _Store())
+
+    def _get_alive(self, key):
+        item = self._store.data.get(key)
+        if item is None:
+            return None
+        value, expiry = item
+        if expiry is not None and expiry <= time.time():
+            self._remove(key)
+            return None
+        return value
+
+    def _remove(self, key):
+        value, _ = self._store.data.pop(key)
+        self._store.size -= len(value)
+
+    def _set(self, key, value, timeout):
+        pickled = pickle.dumps(value, self.pickle_protocol)
+        if len(pickled) > self.max_size:
+            return False
+        if key in self._store.data:
+            self._remove(key)
+        self._store.data[key] = (pickled, self.get_backend_timeout(timeout))
+        self._store.size += len(pickled)
+        while self._store.size > self.max_size:
+            self._remove(next(iter(self._store.data)))
+        return True
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._store.lock:
+            if self._get_alive(key) is not None:
+                return False
+            return self._set(key, value, timeout)
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._store.lock:
+            pickled = self._get_alive(key)
+            if pickled is None:
+                return default
+            self._store.data.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._store.lock:
+            self._set(key, value, timeout)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        with self._store.lock:
+            pickled = self._get_alive(key)
+            if pickled is None:
+                return False
+            self._store.data[key] = (
+                pickled, self.get_backend_timeout(timeout))
+            return True
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._store.lock:
+            if key not in self._store.data:
+                return False
+            self._remove(key)
+            return True
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._store.lock:
+            return self._get_alive(key) is not None
+
+    def clear(self):
+        with self._store.lock:
+            self._store.data.clear()
+            self._store.size = 0
@@ -0,0 +1,140 @@
+import datetime as dt
+import gzip
+import json
+
+from django.core.cache import cache
+from django.db.models import Count, Max
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import quote_etag
+from rest_framework import status
+
+from .conditional import etag_matches
+from .models import Ingredient, IngredientTombstone
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+EPOCH = dt.datetime(1970, 1, 1, tzinfo=dt.timezone.utc)
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, no-cache'
+
+
+def to_version(modified):
+    if modified is None:
+        return 0
+    return (modified - EPOCH) // dt.timedelta(microseconds=1)
+
+
+def from_version(version):
+    return EPOCH + dt.timedelta(microseconds=version)
+
+
+def catalog_state():
+    """Версия каталога и число ингредиентов.
+
+    Версия учитывает и удаления: удалённый ингредиент оставляет
+    ``IngredientTombstone``, и каталог меняет версию.
+    """
+    state = Ingredient.objects.aggregate(
+        modified=Max('modified'), total=Count('pk'))
+    deleted = IngredientTombstone.objects.aggregate(
+        deleted=Max('deleted'))['deleted']
+    return max(
+        to_version(state['modified']), to_version(deleted)
+    ), state['total']
+
+
+def dump(version, total, ingredients, full, deleted=()):
+    content = {
+        'version': version,
+        'count': total,
+        'full': full,
+        'ingredients': list(ingredients),
+    }
+    if not full:
+        content['deleted'] = list(deleted)
+    return json.dumps(
+        content, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    return data
+
+
+def choose_encoding(request):
+    accepted = {
+        value.split(';')[0].strip()
+        for value in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')
+    }
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return 'identity'
+
+
+def snapshot(version, total, encoding):
+    """Сжатый снимок каталога; строится один раз на версию и кодировку."""
+    key = f'ingredient_catalog:{version}:{total}:{encoding}'
+    content = cache.get(key)
+    if content is None:
+        ingredients = Ingredient.objects.order_by('pk').values(
+            'id', 'name', 'measurement_unit')
+        content = compress(
+            dump(version, total, ingredients, full=True), encoding)
+        cache.set(key, content, timeout=None)
+    return content
+
+
+def catalog_response(request):
+    """Снимок каталога ингредиентов или изменения с версии ``since``.
+
+    Дельта содержит изменённые и добавленные ингредиенты и список
+    ``deleted`` с id удалённых после ``since``. ETag свой для каждой
+    кодировки: тело gzip и br различается побайтно.
+    """
+    version, total = catalog_state()
+    encoding = choose_encoding(request)
+    since = request.query_params.get('since')
+    if since is not None and since.isdigit():
+        etag = f'catalog-{version}-{total}-since-{since}'
+        cache_control = REVALIDATE
+    else:
+        etag = f'catalog-{version}-{total}'
+        pinned = request.query_params.get('version') == str(version)
+        cache_control = IMMUTABLE if pinned else REVALIDATE
+    etag = quote_etag(f'{etag}-{encoding}')
+    if etag_matches(etag, request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+    elif since is not None and since.isdigit():
+        since = from_version(int(since))
+        ingredients = Ingredient.objects.filter(
+            modified__gt=since
+        ).order_by('pk').values('id', 'name', 'measurement_unit')
+        deleted = IngredientTombstone.objects.filter(
+            deleted__gt=since
+        ).order_by('ingredient_id').values_list('ingredient_id', flat=True)
+        response = HttpResponse(
+            compress(dump(version, total, ingredients, full=False,
+                          deleted=deleted),
+                     encoding),
+            content_type='application/json'
+        )
+    else:
+        response = HttpResponse(
+            snapshot(version, total, encoding),
+            content_type='application/json'
+        )
+    if encoding != 'identity' and response.status_code == 200:
+        response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
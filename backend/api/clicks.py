@@ -0,0 +1,95 @@
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils import timezone
+
+from .models import Receipt, ShortLinkClick
+
+logger = logging.getLogger(__name__)
+UPSERT_BATCH_SIZE = 1000
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_pending = Counter()
+_wakeup = threading.Event()
+_owner_pid = None
+
+
+def record(receipt_id):
+    """Считает переход в памяти процесса; в базу он попадёт пачкой."""
+    with _lock:
+        if _owner_pid != os.getpid():
+            start()
+        _pending[receipt_id, timezone.localdate()] += 1
+        if len(_pending) >= settings.SHORT_LINK_CLICKS_MAX_PENDING:
+            _wakeup.set()
+
+
+def start():
+    """Запускает фоновый сброс; после fork у потомка свой поток и счётчик."""
+    global _owner_pid
+    _owner_pid = os.getpid()
+    _pending.clear()
+    threading.Thread(
+        target=flush_forever, name='short-link-clicks', daemon=True
+    ).start()
+
+
+def flush_forever():
+    while True:
+        _wakeup.wait(settings.SHORT_LINK_CLICKS_FLUSH_INTERVAL)
+        _wakeup.clear()
+        flush()
+        connection.close()
+
+
+def upsert(rows):
+    table = connection.ops.quote_name(ShortLinkClick._meta.db_table)
+    count = connection.ops.quote_name('count')
+    placeholders = ', '.join(['(%s, %s, %s)'] * len(rows))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} (receipt_id, day, {count}) '
+            f'VALUES {placeholders} '
+            f'ON CONFLICT (receipt_id, day) '
+            f'DO UPDATE SET {count} = {table}.{count} + excluded.{count}',
+            [value for row in rows for value in row]
+        )
+
+
+def flush():
+    """Одним INSERT ... ON CONFLICT переносит накопленное в базу.
+
+    При ошибке счётчики возвращаются в память и уйдут со следующим
+    сбросом: переход может быть учтён дважды, но не потерян.
+    """
+    global _pending
+    # atexit ждёт сброса, уже начатого фоновым потоком.
+    with _flush_lock:
+        with _lock:
+            if not _pending:
+                return
+            batch, _pending = _pending, Counter()
+        try:
+            alive = set(Receipt.objects.filter(
+                pk__in={receipt_id for receipt_id, _ in batch}
+            ).order_by().values_list('pk', flat=True))
+            rows = [
+                (receipt_id, day, total)
+                for (receipt_id, day), total in batch.items()
+                if receipt_id in alive
+            ]
+            for begin in range(0, len(rows), UPSERT_BATCH_SIZE):
+                upsert(rows[begin:begin + UPSERT_BATCH_SIZE])
+        except DatabaseError:
+            logger.exception('Не удалось сохранить переходы по ссылкам')
+            with _lock:
+                _pending.update(batch)
+
+
+atexit.register(flush)
@@ -0,0 +1,115 @@
+import hashlib
+
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.http import (http_date, parse_etags,
+                               parse_http_date_safe, quote_etag)
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import RemovalMark
+
+REMOVED_RECIPES = 'recipes'
+REMOVED_TAGS = 'tags'
+REMOVED_INGREDIENTS = 'ingredients'
+
+
+def etag_matches(etag, if_none_match):
+    """Слабое сравнение ETag, как требует RFC 7232 для If-None-Match."""
+    if if_none_match.strip() == '*':
+        return True
+    bare = etag[2:] if etag.startswith('W/') else etag
+    return any(
+        (tag[2:] if tag.startswith('W/') else tag) == bare
+        for tag in parse_etags(if_none_match)
+    )
+
+
+def mark_removed(scope):
+    """Отмечает, что объект области выпал из списков.
+
+    Вызывается внутри транзакции изменения, поэтому отметка становится
+    видна остальным воркерам вместе с ним.
+    """
+    now = timezone.now()
+    if not RemovalMark.objects.filter(scope=scope).update(removed=now):
+        RemovalMark.objects.get_or_create(
+            scope=scope, defaults={'removed': now})
+
+
+class ConditionalGetMixin:
+    """Условные GET-запросы для ``list`` и ``retrieve``.
+
+    Версией объекта служит его поле ``modified``. Для списка берётся
+    максимальная версия в отфильтрованной выборке (по индексу, без
+    подсчёта строк) и отметка ``RemovalMark`` области ``removal_scope``,
+    которая сдвигается, когда объект выпадает из выборки; совпадение
+    с ``If-None-Match`` или ``If-Modified-Since`` даёт ``304`` без
+    сериализации.
+    """
+    version_field = 'modified'
+    removal_scope = None
+
+    def get_conditional_queryset(self):
+        return self.filter_queryset(self.queryset.all())
+
+    def get_user_state(self, request):
+        return ()
+
+    def list(self, request, *args, **kwargs):
+        version = self.get_conditional_queryset().aggregate(
+            version=Max(self.version_field))['version']
+        removed = self.removal_scope and RemovalMark.objects.filter(
+            scope=self.removal_scope).values_list('removed', flat=True).first()
+        digest = hashlib.md5(repr((
+            version, removed, self.get_user_state(request)
+        )).encode()).hexdigest()
+        # Удаление не сдвигает максимальную версию, поэтому списки
+        # проверяются только по ETag, учитывающему отметку исключения.
+        return self.conditional_response(
+            'W/' + quote_etag(digest), max(
+                filter(None, (version, removed)), default=None), False,
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup = self.lookup_url_kwarg or self.lookup_field
+        version = self.queryset.filter(
+            **{self.lookup_field: kwargs[lookup]}
+        ).values_list(self.version_field, flat=True).first()
+        if version is None:
+            return super().retrieve(request, *args, **kwargs)
+        tag = f'{kwargs[lookup]}-{version.timestamp():.6f}'
+        user_state = self.get_user_state(request)
+        if user_state:
+            tag += '-' + hashlib.md5(
+                repr(user_state).encode()).hexdigest()[:12]
+        return self.conditional_response(
+            quote_etag(tag), version, not user_state,
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def conditional_response(self, etag, last_modified, use_modified_since,
+                             handler, request, *args, **kwargs):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            not_modified = etag_matches(etag, if_none_match)
+        else:
+            since = parse_http_date_safe(
+                request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+            not_modified = (
+                use_modified_since and since is not None
+                and last_modified is not None
+                and int(last_modified.timestamp()) <= since
+            )
+        if not_modified:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(
+                last_modified.timestamp())
+        return response
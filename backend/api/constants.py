@@ -2,3 +2,17 @@ MAX_CHAR_LENGTH = 64
 MIN_AMOUNT = 1
 MAX_AMOUNT = 10000
 PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+EXPORT_CHUNK_SIZE = 2000
+INGREDIENT_AUTOCOMPLETE_LIMIT = 20
+RECEIPT_IMAGE_VARIANTS = (('card', 320), ('detail', 960))
+AVATAR_IMAGE_VARIANTS = (('avatar', 128),)
+IMAGE_VARIANT_FORMATS = (('webp', 'WEBP', 80), ('jpeg', 'JPEG', 82))
+IMAGE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+IMAGE_MAX_SIDE = 10000
+IMAGE_HEADER_LIMIT = 256 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+UPLOAD_TOKEN_LENGTH = 32
+CLICK_STATS_DAYS = 30
+CLICK_STATS_MAX_DAYS = 366
+BATCH_MAX_SIZE = 500
@@ -0,0 +1,62 @@
+from django.db import connection, models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Receipt, User
+
+
+def actual_count(model, field):
+    """Подзапрос с фактическим числом строк ``model`` на объект."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def shift_counter(queryset, field, delta, **extra):
+    return queryset.update(
+        **{field: Greatest(
+            F(field) + delta, 0, output_field=models.IntegerField())},
+        **extra
+    )
+
+
+def shift_receipt_counter(receipt_ids, field, delta):
+    """Сдвигает счётчик рецептов, обновляя вместе с ним их версию.
+
+    Кеш не сбрасывается: счётчики подставляются в кешированные ответы
+    из базы (``AnonymousCacheMixin.volatile_fields``).
+    """
+    shift_counter(
+        Receipt.objects.filter(pk__in=receipt_ids), field, delta,
+        modified=timezone.now()
+    )
+
+
+def shift_user_counter(user_ids, field, delta):
+    shift_counter(User.objects.filter(pk__in=user_ids), field, delta)
+
+
+def increment_returning(model, pk, field, fields, **extra):
+    """Увеличивает счётчик на единицу и возвращает объект с ``fields``.
+
+    ``UPDATE ... RETURNING`` заменяет отдельный SELECT для ответа.
+    Возвращает None, если объекта нет.
+    """
+    qn = connection.ops.quote_name
+    meta = model._meta
+    column = qn(meta.get_field(field).column)
+    assignments, params = [f'{column} = {column} + 1'], []
+    for name, value in extra.items():
+        extra_field = meta.get_field(name)
+        assignments.append(f'{qn(extra_field.column)} = %s')
+        params.append(extra_field.get_db_prep_save(value, connection))
+    columns = ', '.join(
+        qn(meta.get_field(name).column) for name in fields)
+    return next(iter(model.objects.raw(
+        f'UPDATE {qn(meta.db_table)} SET {", ".join(assignments)} '
+        f'WHERE {qn(meta.pk.column)} = %s '
+        f'RETURNING {qn(meta.pk.column)}, {columns}',
+        (*params, pk)
+    )), None)
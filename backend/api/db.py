@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.db import connections
+
+
+def check_connections(**kwargs):
+    """Закрывает перед запросом порванные постоянные соединения.
+
+    При ``CONN_MAX_AGE`` соединение переживает запрос; если база его
+    оборвала (перезапуск, PgBouncer, сетевой таймаут), первый запрос
+    упал бы с ошибкой. ``is_usable`` выполняет ``SELECT 1``, поэтому
+    соединение проверяется не чаще раза в ``DB_HEALTH_CHECK_INTERVAL``
+    секунд. Между проверками порванное соединение закроет сам Django
+    по ``errors_occurred`` в конце запроса, упавшего на нём. Ещё не
+    открытое соединение не проверяется: оно откроется при первом
+    обращении.
+    """
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        checked = getattr(connection, 'health_checked', None)
+        if (
+            checked is not None
+            and checked[0] is connection.connection
+            and now - checked[1] < settings.DB_HEALTH_CHECK_INTERVAL
+        ):
+            continue
+        if connection.is_usable():
+            connection.health_checked = (connection.connection, now)
+        else:
+            connection.close()
@@ -0,0 +1,258 @@
+import csv
+import json
+import os
+import zlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import fonts
+
+HEADER = ('Ингредиент', 'Мера измерения', 'Количество')
+FOOTER = 'AlexMos Production'
+CYRILLIC_UPPER = 'АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ'
+CYRILLIC_LOWER = CYRILLIC_UPPER.lower()
+PDF_ENCODING = 'cp1251'
+
+
+def glyph_name(char):
+    """Имя глифа по Adobe Glyph List, понятное всем просмотрщикам."""
+    if char in CYRILLIC_UPPER:
+        return f'afii{10017 + CYRILLIC_UPPER.index(char)}'
+    if char in CYRILLIC_LOWER:
+        return f'afii{10065 + CYRILLIC_LOWER.index(char)}'
+    return f'uni{ord(char):04X}'
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def export_txt(rows):
+    header = '{:<30} {:<20} {:<10}'.format(*HEADER)
+    yield header + '\n'
+    yield '-' * len(header) + '\n'
+    for name, measurement_unit, amount in rows:
+        yield '{:<30} {:<20} {:<10}\n'.format(name, measurement_unit, amount)
+    yield f'\n{FOOTER}'
+
+
+def export_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(HEADER)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def export_json(rows):
+    yield '['
+    separator = ''
+    for name, measurement_unit, amount in rows:
+        yield separator + json.dumps({
+            'name': name,
+            'measurement_unit': measurement_unit,
+            'amount': amount,
+        }, ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+@lru_cache(maxsize=4)
+def embedded_font(font_path):
+    """Описание шрифта для PDF и его урезанный до cp1251 сжатый файл.
+
+    Считается один раз на процесс: набор глифов не зависит от
+    содержимого списка покупок.
+    """
+    from PIL import ImageFont
+    font = ImageFont.truetype(font_path, 1000)
+    widths, differences, chars = [], [], []
+    for code in range(32, 256):
+        try:
+            char = bytes((code,)).decode(PDF_ENCODING)
+        except UnicodeDecodeError:
+            widths.append(0)
+            continue
+        chars.append(char)
+        widths.append(round(font.getlength(char)))
+        if code >= 128:
+            differences.append(f'{code} /{glyph_name(char)}')
+    with open(font_path, 'rb') as font_file:
+        data = fonts.subset(font_file.read(), chars)
+    ascent, descent = font.getmetrics()
+    return {
+        'name': ''.join(font.getname()[0].split()),
+        'ascent': ascent,
+        'descent': descent,
+        'widths': ' '.join(map(str, widths)),
+        'differences': ' '.join(differences),
+        'length': len(data),
+        'data': zlib.compress(data, 9),
+    }
+
+
+class PDFWriter:
+    """Потоковая запись PDF: страница уходит клиенту, как только заполнена.
+
+    Смещения объектов для таблицы xref накапливаются по ходу записи,
+    а дерево страниц записывается последним, так что в памяти
+    держится только текущая страница. Кириллица выводится TrueType-шрифтом
+    (SHOPPING_LIST_PDF_FONT) в кодировке cp1251; встраивается только
+    подмножество глифов этой кодировки. Без шрифта используется
+    Helvetica, не содержащая кириллицы.
+    """
+    encoding = PDF_ENCODING
+    page_width = 595
+    page_height = 842
+    margin = 40
+    font_size = 11
+    leading = 16
+    columns = (0, 280, 420)
+
+    def __init__(self, font_path=None):
+        self.font_path = font_path
+        self.offsets = {}
+        self.position = 0
+        self.pages = []
+        self.next_id = 4
+
+    def allocate(self):
+        self.next_id += 1
+        return self.next_id - 1
+
+    def emit(self, data):
+        self.position += len(data)
+        return data
+
+    def obj(self, obj_id, body):
+        self.offsets[obj_id] = self.position
+        return self.emit(f'{obj_id} 0 obj\n'.encode() + body + b'\nendobj\n')
+
+    def stream(self, obj_id, content, extra=''):
+        return self.obj(
+            obj_id,
+            f'<< /Length {len(content)}{extra} >>\nstream\n'.encode()
+            + content + b'\nendstream'
+        )
+
+    def font_objects(self):
+        if not self.font_path:
+            yield self.obj(3, (
+                b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica '
+                b'/Encoding /WinAnsiEncoding >>'
+            ))
+            return
+        font = embedded_font(self.font_path)
+        name, ascent, descent = font['name'], font['ascent'], font['descent']
+        descriptor_id, file_id = self.allocate(), self.allocate()
+        yield self.obj(3, (
+            f'<< /Type /Font /Subtype /TrueType /BaseFont /{name} '
+            f'/FirstChar 32 /LastChar 255 /Widths [{font["widths"]}] '
+            f'/Encoding << /Type /Encoding /BaseEncoding /WinAnsiEncoding '
+            f'/Differences [{font["differences"]}] >> '
+            f'/FontDescriptor {descriptor_id} 0 R >>'
+        ).encode())
+        yield self.obj(descriptor_id, (
+            f'<< /Type /FontDescriptor /FontName /{name} /Flags 32 '
+            f'/FontBBox [-1000 {-descent} 2000 {ascent}] /ItalicAngle 0 '
+            f'/Ascent {ascent} /Descent {-descent} /CapHeight {ascent} '
+            f'/StemV 80 /FontFile2 {file_id} 0 R >>'
+        ).encode())
+        yield self.stream(
+            file_id, font['data'],
+            f' /Length1 {font["length"]} /Filter /FlateDecode')
+
+    def text(self, value):
+        encoded = str(value).encode(self.encoding, 'replace')
+        return encoded.replace(b'\\', b'\\\\').replace(
+            b'(', b'\\(').replace(b')', b'\\)')
+
+    def page(self, lines):
+        content = [b'BT /F1 %d Tf' % self.font_size]
+        y = self.page_height - self.margin
+        for line in lines:
+            for x, value in zip(self.columns, line):
+                content.append(b'1 0 0 1 %d %d Tm (%s) Tj' % (
+                    self.margin + x, y, self.text(value)))
+            y -= self.leading
+        content.append(b'ET')
+        content_id, page_id = self.allocate(), self.allocate()
+        self.pages.append(page_id)
+        yield self.stream(content_id, b'\n'.join(content))
+        yield self.obj(page_id, (
+            f'<< /Type /Page /Parent 2 0 R '
+            f'/MediaBox [0 0 {self.page_width} {self.page_height}] '
+            f'/Resources << /Font << /F1 3 0 R >> >> '
+            f'/Contents {content_id} 0 R >>'
+        ).encode())
+
+    def write(self, rows):
+        per_page = (self.page_height - 2 * self.margin) // self.leading
+        yield self.emit(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        yield from self.font_objects()
+        lines = [HEADER, ('', '', '')]
+        for row in rows:
+            lines.append(row)
+            if len(lines) == per_page:
+                yield from self.page(lines)
+                lines = []
+        lines += [('', '', ''), (FOOTER,)]
+        yield from self.page(lines)
+        kids = ' '.join(f'{page_id} 0 R' for page_id in self.pages)
+        yield self.obj(2, (
+            f'<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>'
+        ).encode())
+        yield self.obj(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+        xref_position = self.position
+        xref = [f'xref\n0 {self.next_id}\n', '0000000000 65535 f \n']
+        xref += [
+            f'{self.offsets[obj_id]:010d} 00000 n \n'
+            for obj_id in range(1, self.next_id)
+        ]
+        yield self.emit(''.join(xref).encode())
+        yield self.emit((
+            f'trailer\n<< /Size {self.next_id} /Root 1 0 R >>\n'
+            f'startxref\n{xref_position}\n%%EOF\n'
+        ).encode())
+
+
+def export_pdf(rows):
+    font_path = settings.SHOPPING_LIST_PDF_FONT
+    if font_path and not os.path.exists(font_path):
+        font_path = None
+    return PDFWriter(font_path).write(rows)
+
+
+EXPORTERS = {
+    'txt': export_txt,
+    'csv': export_csv,
+    'json': export_json,
+    'pdf': export_pdf,
+}
+
+
+def cached_export(rows, export_format, cache_key):
+    """Отдаёт выгрузку по частям, попутно сохраняя её в кеш.
+
+    Кешируются только выгрузки не больше SHOPPING_LIST_CACHE_MAX_SIZE:
+    как только размер превышен, буфер отбрасывается. PDF с урезанным
+    шрифтом занимает десятки килобайт и кешируется наравне с остальными.
+    """
+    buffer = []
+    size = 0
+    for chunk in EXPORTERS[export_format](rows):
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        if buffer is not None:
+            size += len(chunk)
+            if size > settings.SHOPPING_LIST_CACHE_MAX_SIZE:
+                buffer = None
+            else:
+                buffer.append(chunk)
+        yield chunk
+    if buffer is not None:
+        cache.set(cache_key, b''.join(buffer))
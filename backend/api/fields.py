@@ -1,12 +1,99 @@
 import base64
+import binascii
+import os
+
 from django.core.files.base import ContentFile
 from rest_framework import serializers
 
+from .constants import IMAGE_UPLOAD_MAX_SIZE
+from .images import variant_urls
+from .models import ImageUpload
+from .uploads import UploadedImage
+
+
+def missing_pks(pks, found):
+    return ', '.join(str(pk) for pk in sorted(set(pks) - found.keys()))
+
+
+class PrimaryKeyListField(serializers.ListField):
+    """Список id, разрешаемый в объекты одним запросом ``in_bulk``.
+
+    ``PrimaryKeyRelatedField(many=True)`` делает SELECT на каждый
+    элемент; здесь запрос один, а все неизвестные id попадают в одну
+    ошибку. Порядок и повторы id сохраняются.
+    """
+
+    default_error_messages = {
+        'does_not_exist': 'Не найдены объекты с id: {pk_list}.',
+    }
+
+    def __init__(self, queryset, **kwargs):
+        self.queryset = queryset
+        kwargs.setdefault('child', serializers.IntegerField(min_value=1))
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        pks = super().to_internal_value(data)
+        found = self.queryset.all().in_bulk(set(pks))
+        if len(found) < len(set(pks)):
+            self.fail('does_not_exist', pk_list=missing_pks(pks, found))
+        return [found[pk] for pk in pks]
+
+    def to_representation(self, value):
+        return [obj.pk for obj in value.all()]
+
 
 class Base64ImageField(serializers.ImageField):
+    """Картинка в data URI, файлом multipart или токеном ``upload:<token>``.
+
+    Имя файла задаёт хранилище по содержимому, здесь важно лишь
+    расширение: повторная отправка того же изображения не создаёт копию.
+    """
+
+    default_error_messages = {
+        'invalid_upload': 'Загрузка не найдена или ещё не завершена.',
+        'too_large': 'Файл больше допустимого размера.',
+    }
+
     def to_internal_value(self, data):
-        if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+        if isinstance(data, str) and data.startswith('upload:'):
+            data = self.get_upload(data[len('upload:'):])
+        elif isinstance(data, str) and data.startswith('data:image'):
+            if len(data) * 3 // 4 > IMAGE_UPLOAD_MAX_SIZE:
+                self.fail('too_large')
+            try:
+                format, imgstr = data.split(';base64,')
+                content = base64.b64decode(imgstr)
+            except (ValueError, binascii.Error):
+                self.fail('invalid_image')
+            ext = format.split('/')[-1].split('+')[0].lower()
+            data = ContentFile(content, name='image.' + ext)
         return super().to_internal_value(data)
+
+    def get_upload(self, token):
+        request = self.context.get('request')
+        upload = ImageUpload.objects.filter(
+            token=token,
+            user_id=getattr(request and request.user, 'id', None)
+        ).first()
+        if upload is None or not upload.complete or not os.path.exists(
+                upload.path):
+            self.fail('invalid_upload')
+        return UploadedImage(upload)
+
+
+class ImageVariantsField(serializers.Field):
+    """Уменьшенные копии изображения: размер и ссылки на WebP и JPEG."""
+
+    def __init__(self, image_field='image', **kwargs):
+        self.image_field = image_field
+        kwargs.setdefault('source', '*')
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, instance):
+        return variant_urls(
+            getattr(instance, self.image_field),
+            getattr(instance, f'{self.image_field}_variants'),
+            self.context.get('request')
+        )
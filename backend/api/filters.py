@@ -1,6 +1,12 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, FloatField, Max, Q, Value
+from django.db.models.functions import Cast, Greatest
 from django_filters.rest_framework import FilterSet, filters
+from rest_framework.filters import BaseFilterBackend
 
 from .models import Ingredient, Receipt
+from .trigrams import query_variants, trigrams
 
 
 class IngredientFilter(FilterSet):
@@ -30,3 +36,58 @@ class TagFilter(FilterSet):
         if value and self.request.user.is_authenticated:
             return queryset.filter(shopping_list__user=self.request.user)
         return queryset if not value else queryset.none()
+
+
+class TrigramSearchFilter(BaseFilterBackend):
+    """Нечёткий поиск по названию (``?fuzzy=``) с ранжированием.
+
+    На PostgreSQL кандидаты отбираются оператором ``%`` по GIN-индексу
+    pg_trgm, на остальных СУБД — по таблице триграмм ``trigrams``.
+    Результаты ниже TRIGRAM_SIMILARITY_THRESHOLD отбрасываются,
+    остальные сортируются по убыванию сходства. Запрос латиницей
+    дополнительно ищется в транслитерации на кириллицу.
+    """
+    search_param = 'fuzzy'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        variants = [
+            variant for variant in query_variants(query) if trigrams(variant)
+        ]
+        if not variants:
+            return queryset
+        if connection.vendor == 'postgresql':
+            queryset, similarities = self.filter_postgres(queryset, variants)
+        else:
+            queryset, similarities = self.filter_trigrams(queryset, variants)
+        similarity = (
+            Greatest(*similarities) if len(similarities) > 1
+            else similarities[0]
+        )
+        return queryset.annotate(similarity=similarity).filter(
+            similarity__gte=settings.TRIGRAM_SIMILARITY_THRESHOLD
+        ).order_by('-similarity', 'pk')
+
+    def filter_postgres(self, queryset, variants):
+        from django.contrib.postgres.search import TrigramSimilarity
+        condition = Q()
+        for variant in variants:
+            condition |= Q(name__trigram_similar=variant)
+        return queryset.filter(condition), [
+            TrigramSimilarity('name', variant) for variant in variants
+        ]
+
+    def filter_trigrams(self, queryset, variants):
+        grams = [trigrams(variant) for variant in variants]
+        queryset = queryset.filter(trigrams__trigram__in=set().union(*grams))
+        total = Cast(Max('trigrams__total'), FloatField())
+        similarities = []
+        for query_grams in grams:
+            hits = Cast(Count(
+                'trigrams',
+                filter=Q(trigrams__trigram__in=query_grams),
+                distinct=True
+            ), FloatField())
+            similarities.append(
+                hits / (Value(float(len(query_grams))) + total - hits))
+        return queryset, similarities
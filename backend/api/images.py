@@ -0,0 +1,140 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import invalidate_receipt, invalidate_receipts
+from .constants import (AVATAR_IMAGE_VARIANTS, IMAGE_VARIANT_FORMATS,
+                        RECEIPT_IMAGE_VARIANTS)
+from .models import Receipt, User
+
+logger = logging.getLogger(__name__)
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.IMAGE_VARIANT_WORKERS,
+            thread_name_prefix='image-variants'
+        )
+    return _executor
+
+
+def variant_urls(image, variants, request=None):
+    """Карта вариантов для ответа API, если они построены для ``image``."""
+    if not image or variants.get('source') != image.name:
+        return {}
+    result = {}
+    for name, variant in variants.items():
+        if name == 'source':
+            continue
+        result[name] = {
+            'width': variant['width'],
+            'height': variant['height'],
+        }
+        for fmt, *_ in IMAGE_VARIANT_FORMATS:
+            url = default_storage.url(variant[fmt])
+            result[name][fmt] = (
+                request.build_absolute_uri(url) if request else url)
+    return result
+
+
+def flatten(image):
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_variants(name, sizes):
+    """Уменьшенные копии изображения в WebP и JPEG.
+
+    Копии кладутся в подкаталог ``variants`` каталога загрузок.
+    Изображения меньше целевого размера не увеличиваются.
+    """
+    with default_storage.open(name) as file:
+        original = ImageOps.exif_transpose(Image.open(file))
+        original.load()
+    directory = os.path.join(name.split('/')[0], 'variants')
+    stem = os.path.splitext(os.path.basename(name))[0]
+    variants = {'source': name}
+    for variant, size in sizes:
+        image = original.copy()
+        image.thumbnail((size, size), Image.LANCZOS)
+        variants[variant] = {'width': image.width, 'height': image.height}
+        for fmt, pil_format, quality in IMAGE_VARIANT_FORMATS:
+            buffer = io.BytesIO()
+            (image if fmt == 'webp' else flatten(image)).save(
+                buffer, pil_format, quality=quality)
+            variants[variant][fmt] = default_storage.save(
+                os.path.join(directory, f'{stem}.{variant}.{fmt}'),
+                ContentFile(buffer.getvalue())
+            )
+    return variants
+
+
+def stored_files(variants):
+    return {
+        variant[fmt]
+        for name, variant in variants.items() if name != 'source'
+        for fmt, *_ in IMAGE_VARIANT_FORMATS
+    }
+
+
+def build_variants(model, pk, field, sizes):
+    """Строит варианты и сохраняет их, только если оригинал не сменился.
+
+    Возвращает True, если варианты записаны. Файлы общие для одинаковых
+    изображений, поэтому прежние копии не удаляются здесь, а остаются
+    сборщику ``collect_media``.
+    """
+    image_field, variants_field = field, f'{field}_variants'
+    instance = model.objects.filter(pk=pk).only(
+        image_field, variants_field).first()
+    if instance is None or not getattr(instance, image_field):
+        return False
+    name = getattr(instance, image_field).name
+    variants = render_variants(name, sizes)
+    extra = {'modified': timezone.now()} if model is Receipt else {}
+    with transaction.atomic():
+        updated = model.objects.filter(
+            pk=pk, **{image_field: name}
+        ).update(**{variants_field: variants}, **extra)
+        if updated and model is Receipt:
+            invalidate_receipt(pk, touched=True)
+        elif updated:
+            invalidate_receipts(Receipt.objects.filter(author_id=pk))
+    return bool(updated)
+
+
+def build_receipt_variants(pk):
+    return build_variants(Receipt, pk, 'image', RECEIPT_IMAGE_VARIANTS)
+
+
+def build_avatar_variants(pk):
+    return build_variants(User, pk, 'avatar', AVATAR_IMAGE_VARIANTS)
+
+
+def run(task, pk):
+    try:
+        task(pk)
+    except Exception:
+        logger.exception('Не удалось построить варианты изображения %s', pk)
+    finally:
+        close_old_connections()
+
+
+def schedule(task, pk):
+    """Ставит построение вариантов в фоновый пул после фиксации."""
+    transaction.on_commit(lambda: get_executor().submit(run, task, pk))
@@ -0,0 +1,92 @@
+import heapq
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.models import Count
+
+from .catalog import catalog_state
+from .models import Ingredient
+
+PREFIX_END = '\U0010ffff'
+
+_lock = threading.Lock()
+_index = None
+
+
+class IngredientIndex:
+    """Отсортированный массив ингредиентов для поиска по префиксу.
+
+    Ключи приведены через ``casefold``, поэтому границы диапазона
+    префикса находятся двоичным поиском, а из диапазона выбираются
+    самые часто используемые в рецептах ингредиенты.
+    """
+
+    def __init__(self, rows, version):
+        rows = sorted(rows, key=lambda row: (row[1].casefold(), row[0]))
+        self.keys = [name.casefold() for _, name, _, _ in rows]
+        self.items = [
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for pk, name, unit, _ in rows
+        ]
+        self.usage = [usage for *_, usage in rows]
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+    def search(self, prefix, limit):
+        prefix = prefix.casefold()
+        start = bisect_left(self.keys, prefix)
+        end = bisect_left(self.keys, prefix + PREFIX_END, start)
+        positions = heapq.nsmallest(
+            limit, range(start, end),
+            key=lambda position: (-self.usage[position], position)
+        )
+        return [self.items[position] for position in positions]
+
+
+def current_version():
+    """Версия справочника из базы, общая для всех процессов.
+
+    Учитывает изменения, удаления (по ``IngredientTombstone``) и число
+    ингредиентов, поэтому индекс устаревает сразу во всех воркерах.
+    """
+    return catalog_state()
+
+
+def load(version):
+    rows = Ingredient.objects.annotate(
+        usage=Count('ingredients_in_receipt')
+    ).values_list('id', 'name', 'measurement_unit', 'usage')
+    return IngredientIndex(list(rows), version)
+
+
+def get_index():
+    """Индекс процесса; перестраивается после изменений и по таймауту.
+
+    Таймаут обновляет частоту использования ингредиентов в рецептах,
+    которая на версию справочника не влияет.
+    """
+    global _index
+    index = _index
+    version = current_version()
+    if (
+        index is None
+        or index.version != version
+        or time.monotonic() - index.loaded_at
+        > settings.INGREDIENT_INDEX_TIMEOUT
+    ):
+        with _lock:
+            if _index is index:
+                _index = load(version)
+            index = _index
+    return index
+
+
+def invalidate():
+    """Сбрасывает индекс текущего процесса.
+
+    Остальные процессы увидят новую версию справочника в базе.
+    """
+    global _index
+    _index = None
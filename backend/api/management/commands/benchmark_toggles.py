@@ -0,0 +1,113 @@
+import multiprocessing
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.models import Receipt
+from api.views import ReceiptViewSet
+from users.models import User
+
+
+def percentile(values, share):
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def toggle_favorites(args):
+    """Воркер: добавляет и убирает рецепт из избранного ``toggles`` раз.
+
+    Запросы идут через настоящий view, без HTTP, каждый в своей
+    транзакции, как у gunicorn-воркера.
+    """
+    user_id, receipt_id, toggles = args
+    connections.close_all()
+    user = User.objects.get(pk=user_id)
+    factory = APIRequestFactory()
+    view = ReceiptViewSet.as_view(
+        {'post': 'favorite', 'delete': 'delete_favorite'})
+    path = f'/api/recipes/{receipt_id}/favorite/'
+    latencies, errors = [], 0
+    for number in range(toggles):
+        request = (factory.post if number % 2 == 0 else factory.delete)(path)
+        force_authenticate(request, user=user)
+        start = time.perf_counter()
+        try:
+            response = view(request, pk=receipt_id)
+        except OperationalError:
+            errors += 1
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            errors += 1
+    connections.close_all()
+    return latencies, errors
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочная проверка записи: несколько процессов одновременно '
+        'добавляют рецепт в избранное и убирают его. Печатает задержки '
+        'и завершается ошибкой, если p95 выше цели.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument(
+            '--toggles', type=int, default=200,
+            help='Запросов на процесс.'
+        )
+        parser.add_argument(
+            '--target-ms', type=float, default=50,
+            help='Допустимая задержка p95 в миллисекундах.'
+        )
+
+    def handle(self, *args, **options):
+        if options['processes'] < 1 or options['toggles'] < 1:
+            raise CommandError('Нужен хотя бы один процесс и один запрос.')
+        marker = uuid.uuid4().hex[:8]
+        users = [
+            User.objects.create_user(
+                username=f'bench-{marker}-{number}',
+                email=f'bench-{marker}-{number}@example.com',
+                password=None
+            )
+            for number in range(options['processes'] + 1)
+        ]
+        author, *workers = users
+        receipt = Receipt.objects.create(
+            author=author, name='benchmark', text='benchmark',
+            cooking_time=1, image='recipes/benchmark.png'
+        )
+        connections.close_all()
+        try:
+            started = time.perf_counter()
+            with multiprocessing.get_context('fork').Pool(
+                    options['processes']) as pool:
+                results = pool.map(toggle_favorites, [
+                    (user.pk, receipt.pk, options['toggles'])
+                    for user in workers
+                ])
+            elapsed = time.perf_counter() - started
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+        latencies = sorted(
+            latency for chunk, _ in results for latency in chunk)
+        errors = sum(count for _, count in results)
+        if not latencies:
+            raise CommandError(f'Все запросы завершились ошибкой: {errors}.')
+        p95 = percentile(latencies, 0.95)
+        self.stdout.write(
+            f'{connections["default"].vendor}: {len(latencies)} запросов '
+            f'за {elapsed:.1f} с ({len(latencies) / elapsed:.0f} в секунду), '
+            f'ошибок {errors}\n'
+            f'p50 {percentile(latencies, 0.5):.1f} мс, p95 {p95:.1f} мс, '
+            f'p99 {percentile(latencies, 0.99):.1f} мс, '
+            f'max {latencies[-1]:.1f} мс'
+        )
+        if errors or p95 > options['target_ms']:
+            raise CommandError(
+                f'Цель не достигнута: p95 {p95:.1f} мс при цели '
+                f'{options["target_ms"]:.0f} мс, ошибок {errors}.')
+        self.stdout.write(self.style.SUCCESS('Цель достигнута.'))
@@ -0,0 +1,76 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from api.images import build_avatar_variants, build_receipt_variants
+from api.models import Receipt
+from users.models import User
+
+BATCH_SIZE = 200
+TARGETS = (
+    (Receipt, 'image', build_receipt_variants),
+    (User, 'avatar', build_avatar_variants),
+)
+
+
+def build(task, pk):
+    try:
+        return task(pk), None
+    except Exception as error:
+        return False, f'{pk}: {error}'
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит уменьшенные копии изображений рецептов и аватаров, '
+        'для которых их ещё нет или они устарели.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересобрать копии для всех изображений.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Сколько изображений обрабатывать параллельно.'
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers должен быть положительным.')
+        with ThreadPoolExecutor(options['workers']) as executor:
+            for model, field, task in TARGETS:
+                built = failed = 0
+                for pks in self.pending(model, field, options['force']):
+                    for done, error in executor.map(
+                            lambda pk: build(task, pk), pks):
+                        built += done
+                        if error:
+                            failed += 1
+                            self.stderr.write(error)
+                self.stdout.write(
+                    f'{model._meta.label}.{field}: построено {built}, '
+                    f'ошибок {failed}'
+                )
+
+    @staticmethod
+    def pending(model, field, force):
+        """Пачки id объектов, которым нужны копии, по возрастанию id."""
+        objects = model.objects.exclude(
+            **{field: ''}).exclude(**{f'{field}__isnull': True}).order_by('pk')
+        last = 0
+        while True:
+            rows = list(objects.filter(pk__gt=last).values_list(
+                'pk', field, f'{field}_variants')[:BATCH_SIZE])
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield [
+                pk for pk, name, variants in rows
+                if force or variants.get('source') != name
+            ]
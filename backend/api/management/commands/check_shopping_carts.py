@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import ShoppingCartItem, ShoppingList
+from api.shopping_cart import live_totals, recompute
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет агрегированные списки покупок с рецептами в корзинах '
+        'и при --fix пересобирает расходящиеся.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help='Пересобрать агрегат для пользователей с расхождениями.'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = sorted(
+            set(ShoppingList.objects.values_list('user_id', flat=True))
+            | set(ShoppingCartItem.objects.values_list('user_id', flat=True))
+        )
+        broken = []
+        for start in range(0, len(user_ids), BATCH_SIZE):
+            batch = user_ids[start:start + BATCH_SIZE]
+            live = {
+                (row['receipt__shopping_list__user'], row['ingredient']):
+                    (row['total'], row['recipes'])
+                for row in live_totals(batch)
+            }
+            stored = {
+                (user_id, ingredient_id): (total, recipes)
+                for user_id, ingredient_id, total, recipes
+                in ShoppingCartItem.objects.filter(
+                    user_id__in=batch
+                ).values_list(
+                    'user_id', 'ingredient_id', 'total_amount',
+                    'recipe_count'
+                )
+            }
+            broken += sorted({
+                user_id for user_id, ingredient_id in live.keys() | stored
+                if live.get((user_id, ingredient_id))
+                != stored.get((user_id, ingredient_id))
+            })
+        self.stdout.write(
+            f'Проверено списков: {len(user_ids)}, '
+            f'с расхождениями: {len(broken)}'
+        )
+        if broken and options['fix']:
+            for start in range(0, len(broken), BATCH_SIZE):
+                with transaction.atomic():
+                    recompute(broken[start:start + BATCH_SIZE])
+            self.stdout.write(self.style.SUCCESS('Расхождения исправлены.'))
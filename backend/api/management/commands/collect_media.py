@@ -0,0 +1,104 @@
+import os
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.images import stored_files
+from api.models import Receipt
+from api.uploads import discard, expired_uploads
+from users.models import User
+
+CHUNK_SIZE = 2000
+REFERENCES = (
+    (Receipt, 'image', 'image_variants'),
+    (User, 'avatar', 'avatar_variants'),
+)
+
+
+def count_references():
+    """Сколько раз каждый файл хранилища упомянут в базе."""
+    references = Counter()
+    for model, field, variants_field in REFERENCES:
+        rows = model.objects.exclude(**{field: ''}).exclude(
+            **{f'{field}__isnull': True}
+        ).values_list(field, variants_field).order_by()
+        for name, variants in rows.iterator(chunk_size=CHUNK_SIZE):
+            references[name] += 1
+            if variants.get('source') == name:
+                references.update(stored_files(variants))
+    return references
+
+
+def walk(storage, path):
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield os.path.join(path, name)
+    for directory in directories:
+        yield from walk(storage, os.path.join(path, directory))
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет из хранилища медиафайлы, на которые не ссылается ни один '
+        'рецепт или пользователь, включая уменьшенные копии, '
+        'и просроченные незавершённые загрузки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что было бы удалено.'
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=settings.MEDIA_GC_MIN_AGE,
+            help=(
+                'Не трогать файлы моложе стольких секунд: их транзакция '
+                'могла ещё не зафиксироваться.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        if options['min_age'] < 0:
+            raise CommandError('--min-age не может быть отрицательным.')
+        references = count_references()
+        storage = default_storage
+        cutoff = timezone.now() - timedelta(
+            seconds=options['min_age'])
+        roots = {
+            model._meta.get_field(field).upload_to.strip('/')
+            for model, field, _ in REFERENCES
+        }
+        total = shared = removed = freed = 0
+        for root in sorted(roots):
+            if not storage.exists(root):
+                continue
+            for name in walk(storage, root):
+                total += 1
+                if references[name] > 1:
+                    shared += 1
+                if references[name] or (
+                        storage.get_modified_time(name) > cutoff):
+                    continue
+                size = storage.size(name)
+                if options['dry_run']:
+                    self.stdout.write(name)
+                else:
+                    storage.delete(name)
+                removed += 1
+                freed += size
+        expired = 0
+        for upload in expired_uploads().iterator():
+            expired += 1
+            if not options['dry_run']:
+                discard(upload)
+        self.stdout.write(self.style.SUCCESS(
+            f'Просроченных загрузок: {expired}. '
+            f'Файлов: {total}, общих: {shared}, '
+            f'{"к удалению" if options["dry_run"] else "удалено"}: '
+            f'{removed} ({freed / 1024 / 1024:.1f} МБ)'
+        ))
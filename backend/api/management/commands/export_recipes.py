@@ -0,0 +1,136 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Prefetch
+
+from api.models import IngredientReceipt, Receipt
+
+CHUNK_SIZE = 500
+
+
+def dump_receipt(receipt):
+    return {
+        'id': receipt.pk,
+        'author': {
+            'email': receipt.author.email,
+            'username': receipt.author.username,
+        },
+        'name': receipt.name,
+        'text': receipt.text,
+        'cooking_time': receipt.cooking_time,
+        'pub_date': receipt.pub_date.isoformat(),
+        'image': receipt.image.name,
+        'legacy_short_links': [
+            link.code for link in receipt.legacy_short_links.all()
+        ],
+        'tags': [
+            {'slug': tag.slug, 'name': tag.name} for tag in receipt.tags.all()
+        ],
+        'ingredients': [
+            {
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount,
+            }
+            for item in receipt.receipts.all()
+        ],
+    }
+
+
+def cut_after_lines(file, lines):
+    """Обрезает файл после ``lines`` целых строк и возвращает последнюю."""
+    file.seek(0)
+    line = b''
+    for number in range(lines):
+        line = file.readline()
+        if not line.endswith(b'\n'):
+            raise CommandError(
+                f'В файле только {number} целых строк, '
+                f'продолжить с {lines} нельзя.'
+            )
+    file.truncate()
+    return line
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает рецепты с ингредиентами, тегами, авторами и путями '
+        'к изображениям в NDJSON: один рецепт на строку, по возрастанию id.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', '-o',
+            help='Файл для выгрузки; по умолчанию stdout.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help=f'Рецептов на один запрос (по умолчанию {CHUNK_SIZE}).'
+        )
+        parser.add_argument(
+            '--start-line', type=int, default=0,
+            help=(
+                'Продолжить прерванную выгрузку: оставить в --output '
+                'столько готовых строк и дописать остальные.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        chunk_size, start_line = options['chunk_size'], options['start_line']
+        if chunk_size < 1 or start_line < 0:
+            raise CommandError(
+                '--chunk-size и --start-line не могут быть отрицательными.')
+        if start_line and not options['output']:
+            raise CommandError('--start-line требует --output.')
+        last = 0
+        if options['output']:
+            output = open(
+                options['output'], 'r+b' if start_line else 'wb')
+            if start_line:
+                try:
+                    last = json.loads(
+                        cut_after_lines(output, start_line))['id']
+                except (ValueError, KeyError, TypeError):
+                    output.close()
+                    raise CommandError(
+                        f'Строка {start_line} не похожа на выгрузку рецепта.')
+        else:
+            output = None
+        recipes = Receipt.objects.order_by('pk').select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            'legacy_short_links',
+            Prefetch(
+                'receipts',
+                queryset=IngredientReceipt.objects.select_related(
+                    'ingredient').order_by('pk')
+            )
+        )
+        # iterator() в Django 3.2 не умеет prefetch_related, поэтому
+        # идём пачками по первичному ключу: память не растёт с таблицей.
+        written = 0
+        try:
+            while True:
+                chunk = list(recipes.filter(pk__gt=last)[:chunk_size])
+                if not chunk:
+                    break
+                lines = ''.join(
+                    json.dumps(dump_receipt(receipt), ensure_ascii=False)
+                    + '\n'
+                    for receipt in chunk
+                )
+                if output is None:
+                    self.stdout.write(lines, ending='')
+                else:
+                    output.write(lines.encode())
+                    output.flush()
+                written += len(chunk)
+                last = chunk[-1].pk
+        finally:
+            if output is not None:
+                output.close()
+        self.stderr.write(
+            f'Выгружено рецептов: {written}, строк всего: '
+            f'{start_line + written}'
+        )
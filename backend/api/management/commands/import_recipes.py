@@ -0,0 +1,240 @@
+import json
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from api import ingredient_index
+from api.cache import invalidate_receipt
+from api.constants import MAX_AMOUNT, MIN_AMOUNT
+from api.counters import actual_count
+from api.models import (Ingredient, IngredientReceipt, IngredientTrigram,
+                        LegacyShortLink, Receipt, ReceiptTrigram, Tag,
+                        TagReceipt)
+from api.trigrams import fill_missing_trigrams
+from users.models import User
+
+CHUNK_SIZE = 500
+
+
+def read_lines(path, start_line):
+    """Номера и разобранные строки NDJSON, начиная после ``start_line``."""
+    with open(path, encoding='utf-8') as file:
+        for number, line in enumerate(
+                islice(file, start_line, None), start_line + 1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except json.JSONDecodeError as error:
+                raise CommandError(f'Строка {number}: {error}')
+
+
+def check_amount(value, number, what):
+    if not isinstance(value, int) or not MIN_AMOUNT <= value <= MAX_AMOUNT:
+        raise CommandError(f'Строка {number}: неверное значение {what}.')
+    return value
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает рецепты из NDJSON, выгруженного export_recipes. '
+        'Рецепты сохраняют свои id; уже существующие пропускаются, '
+        'авторы ищутся по email, недостающие теги и ингредиенты создаются. '
+        'Файлы изображений переносятся отдельно.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='NDJSON-файл с рецептами.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help=f'Рецептов в одной транзакции (по умолчанию {CHUNK_SIZE}).'
+        )
+        parser.add_argument(
+            '--start-line', type=int, default=0,
+            help='Пропустить столько строк: продолжение после сбоя.'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size, start_line = options['chunk_size'], options['start_line']
+        if chunk_size < 1 or start_line < 0:
+            raise CommandError(
+                '--chunk-size и --start-line не могут быть отрицательными.')
+        lines = read_lines(options['path'], start_line)
+        totals = {'created': 0, 'existing': 0, 'orphans': 0}
+        self.new_ingredients = False
+        try:
+            while True:
+                chunk = list(islice(lines, chunk_size))
+                if not chunk:
+                    break
+                try:
+                    with transaction.atomic():
+                        for key, value in self.load(chunk).items():
+                            totals[key] += value
+                except (KeyError, TypeError) as error:
+                    raise CommandError(
+                        f'Строки {chunk[0][0]}-{chunk[-1][0]}: '
+                        f'неполная запись ({error!r}).'
+                    )
+                self.stdout.write(f'Готово строк: {chunk[-1][0]}')
+        except OSError as error:
+            raise CommandError(f'{options["path"]}: {error}')
+        self.finish()
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено рецептов: {totals["created"]}, '
+            f'уже были: {totals["existing"]}, '
+            f'без автора: {totals["orphans"]}'
+        ))
+
+    def load(self, chunk):
+        existing = set(Receipt.objects.filter(
+            pk__in=[row['id'] for _, row in chunk]
+        ).values_list('pk', flat=True))
+        fresh = [
+            (number, row) for number, row in chunk
+            if row['id'] not in existing
+        ]
+        authors = User.objects.in_bulk(
+            {row['author']['email'] for _, row in fresh},
+            field_name='email'
+        )
+        orphans = [
+            number for number, row in fresh
+            if row['author']['email'] not in authors
+        ]
+        if orphans:
+            self.stderr.write(
+                'Нет авторов для строк: '
+                + ', '.join(str(number) for number in orphans)
+            )
+        fresh = [
+            (number, row) for number, row in fresh
+            if row['author']['email'] in authors
+        ]
+        if not fresh:
+            return {'existing': len(existing), 'orphans': len(orphans)}
+        tags = self.resolve_tags(fresh)
+        ingredients = self.resolve_ingredients(fresh)
+        receipts = []
+        for number, row in fresh:
+            receipt = Receipt(
+                id=row['id'],
+                author=authors[row['author']['email']],
+                name=row['name'],
+                text=row['text'],
+                image=row['image'],
+                cooking_time=check_amount(
+                    row['cooking_time'], number, 'cooking_time'),
+            )
+            receipts.append(receipt)
+        Receipt.objects.bulk_create(receipts)
+        # auto_now_add затирает дату при вставке, возвращаем исходную.
+        for receipt, (number, row) in zip(receipts, fresh):
+            receipt.pub_date = parse_datetime(row['pub_date'])
+            if receipt.pub_date is None:
+                raise CommandError(f'Строка {number}: неверная pub_date.')
+        Receipt.objects.bulk_update(receipts, ('pub_date',))
+        TagReceipt.objects.bulk_create(
+            TagReceipt(receipt_id=row['id'], tag=tags[tag['slug']])
+            for _, row in fresh
+            for tag in {tag['slug']: tag for tag in row['tags']}.values()
+        )
+        items = []
+        for number, row in fresh:
+            amounts = {}
+            for item in row['ingredients']:
+                key = ingredients[item['name'], item['measurement_unit']]
+                amounts[key] = amounts.get(key, 0) + check_amount(
+                    item['amount'], number, 'amount')
+            items += [
+                IngredientReceipt(
+                    receipt_id=row['id'], ingredient=ingredient,
+                    amount=amount
+                )
+                for ingredient, amount in amounts.items()
+            ]
+        IngredientReceipt.objects.bulk_create(items)
+        LegacyShortLink.objects.bulk_create(
+            (
+                LegacyShortLink(receipt_id=row['id'], code=code)
+                for _, row in fresh
+                for code in row.get('legacy_short_links', ())
+            ),
+            ignore_conflicts=True
+        )
+        author_ids = {receipt.author_id for receipt in receipts}
+        User.objects.filter(pk__in=author_ids).update(
+            recipes_count=actual_count(Receipt, 'author'))
+        for receipt in receipts:
+            invalidate_receipt(receipt.pk, touched=True)
+        return {
+            'created': len(receipts),
+            'existing': len(existing),
+            'orphans': len(orphans),
+        }
+
+    @staticmethod
+    def resolve_tags(rows):
+        wanted = {
+            tag['slug']: tag['name'] for _, row in rows for tag in row['tags']
+        }
+        tags = Tag.objects.in_bulk(wanted, field_name='slug')
+        missing = wanted.keys() - tags.keys()
+        if missing:
+            Tag.objects.bulk_create(
+                (Tag(slug=slug, name=wanted[slug]) for slug in missing),
+                ignore_conflicts=True
+            )
+            tags = Tag.objects.in_bulk(wanted, field_name='slug')
+            if wanted.keys() - tags.keys():
+                raise CommandError(
+                    'Не удалось создать теги: '
+                    + ', '.join(sorted(wanted.keys() - tags.keys()))
+                )
+        return tags
+
+    def resolve_ingredients(self, rows):
+        wanted = {
+            (item['name'], item['measurement_unit'])
+            for _, row in rows for item in row['ingredients']
+        }
+
+        def known():
+            return {
+                (ingredient.name, ingredient.measurement_unit): ingredient
+                for ingredient in Ingredient.objects.filter(
+                    name__in={name for name, _ in wanted})
+                if (ingredient.name, ingredient.measurement_unit) in wanted
+            }
+
+        ingredients = known()
+        missing = wanted - ingredients.keys()
+        if missing:
+            Ingredient.objects.bulk_create(
+                (
+                    Ingredient(name=name, measurement_unit=unit)
+                    for name, unit in missing
+                ),
+                ignore_conflicts=True
+            )
+            self.new_ingredients = True
+            ingredients = known()
+        return ingredients
+
+    def finish(self):
+        """Досчитывает то, что bulk_create обходит стороной."""
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                for sql in connection.ops.sequence_reset_sql(
+                        no_style(), (Receipt,)):
+                    cursor.execute(sql)
+        else:
+            fill_missing_trigrams(Receipt, ReceiptTrigram, 'receipt')
+            if self.new_ingredients:
+                fill_missing_trigrams(
+                    Ingredient, IngredientTrigram, 'ingredient')
+        if self.new_ingredients:
+            ingredient_index.invalidate()
@@ -0,0 +1,235 @@
+import csv
+import io
+import json
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api import ingredient_index
+from api.constants import MAX_CHAR_LENGTH
+from api.models import Ingredient, IngredientTrigram, Tag
+from api.trigrams import fill_missing_trigrams
+
+BATCH_SIZE = 5000
+READ_SIZE = 1 << 16
+FIELDS = {
+    'ingredients': ('name', 'measurement_unit'),
+    'tags': ('name', 'slug'),
+}
+FORMATS = {'.csv': 'csv', '.json': 'json', '.ndjson': 'ndjson',
+           '.jsonl': 'ndjson'}
+
+
+def read_csv(file, fields):
+    """Строки CSV; заголовок необязателен, без него колонки по порядку."""
+    reader = csv.reader(file)
+    first = next(reader, None)
+    if first is None:
+        return
+    header = [column.strip() for column in first]
+    if set(fields) <= set(header):
+        positions = [header.index(field) for field in fields]
+    else:
+        positions = range(len(fields))
+        yield dict(zip(fields, first))
+    for row in reader:
+        if row:
+            yield {
+                field: row[position] if position < len(row) else ''
+                for field, position in zip(fields, positions)
+            }
+
+
+def read_json(file, fields):
+    """Элементы JSON-массива по одному, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        chunk = file.read(READ_SIZE)
+        buffer += chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+            if not started and position < len(buffer):
+                if buffer[position] != '[':
+                    raise CommandError('Ожидался JSON-массив объектов.')
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise CommandError('Оборванный JSON-массив.')
+                break
+            yield item
+        buffer = buffer[position:]
+        if not chunk:
+            return
+
+
+def read_ndjson(file, fields):
+    for number, line in enumerate(file, 1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as error:
+                raise CommandError(f'Строка {number}: {error}')
+
+
+READERS = {'csv': read_csv, 'json': read_json, 'ndjson': read_ndjson}
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def load_ingredients(batch):
+    Ingredient.objects.bulk_create(
+        (Ingredient(**row) for row in batch),
+        batch_size=len(batch), ignore_conflicts=True
+    )
+
+
+def copy_ingredients(batch):
+    """Postgres: COPY во временную таблицу и один INSERT ... SELECT."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(
+        (row['name'], row['measurement_unit']) for row in batch)
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE IF NOT EXISTS catalog_load '
+            '(name text, measurement_unit text) ON COMMIT DELETE ROWS'
+        )
+        cursor.cursor.copy_expert(
+            'COPY catalog_load FROM STDIN WITH (FORMAT csv)', buffer)
+        cursor.execute(
+            'INSERT INTO ingredient (name, measurement_unit, modified) '
+            'SELECT DISTINCT name, measurement_unit, now() '
+            'FROM catalog_load '
+            'ON CONFLICT (name, measurement_unit) DO NOTHING'
+        )
+
+
+def load_tags(batch):
+    rows = {row['slug']: row['name'] for row in batch}
+    existing = Tag.objects.in_bulk(rows, field_name='slug')
+    now = timezone.now()
+    changed = []
+    for slug, tag in existing.items():
+        if tag.name != rows[slug]:
+            tag.name, tag.modified = rows[slug], now
+            changed.append(tag)
+    Tag.objects.bulk_update(changed, ('name', 'modified'))
+    Tag.objects.bulk_create(
+        (Tag(slug=slug, name=name) for slug, name in rows.items()
+         if slug not in existing),
+        ignore_conflicts=True
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает ингредиенты или теги из CSV, JSON или NDJSON пачками. '
+        'Повторный запуск не создаёт дубликатов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='Файлы для загрузки.')
+        parser.add_argument(
+            '--model',
+            choices=tuple(FIELDS),
+            help='Что загружать; по умолчанию по имени файла.'
+        )
+        parser.add_argument(
+            '--format',
+            choices=tuple(READERS),
+            help='Формат файла; по умолчанию по расширению.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help=f'Строк в одной транзакции (по умолчанию {BATCH_SIZE}).'
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY даже на PostgreSQL.'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным.')
+        for path in options['paths']:
+            self.load(Path(path), options)
+
+    def load(self, path, options):
+        model = options['model'] or (
+            'tags' if path.stem.startswith('tag') else 'ingredients')
+        file_format = options['format'] or FORMATS.get(path.suffix.lower())
+        if file_format is None:
+            raise CommandError(f'{path}: укажите --format.')
+        fields = FIELDS[model]
+        if model == 'tags':
+            target, load = Tag, load_tags
+        elif connection.vendor == 'postgresql' and not options['no_copy']:
+            target, load = Ingredient, copy_ingredients
+        else:
+            target, load = Ingredient, load_ingredients
+        before = target.objects.count()
+        started = time.monotonic()
+        read = skipped = 0
+        try:
+            with open(path, encoding='utf-8', newline='') as file:
+                rows = READERS[file_format](file, fields)
+                for batch in batches(rows, options['batch_size']):
+                    read += len(batch)
+                    valid = self.clean(batch, fields)
+                    skipped += len(batch) - len(valid)
+                    if valid:
+                        with transaction.atomic():
+                            load(valid)
+        except OSError as error:
+            raise CommandError(f'{path}: {error}')
+        elapsed = time.monotonic() - started
+        created = target.objects.count() - before
+        if model == 'ingredients' and created:
+            self.after_ingredients()
+        self.stdout.write(self.style.SUCCESS(
+            f'{path}: прочитано {read}, добавлено {created}, '
+            f'пропущено {skipped} за {elapsed:.2f} с '
+            f'({read / max(elapsed, 1e-6):.0f} строк/с)'
+        ))
+
+    @staticmethod
+    def clean(batch, fields):
+        valid = []
+        for row in batch:
+            if not isinstance(row, dict):
+                continue
+            row = {field: str(row.get(field) or '').strip()
+                   for field in fields}
+            if all(row.values()) and all(
+                    len(value) <= MAX_CHAR_LENGTH for value in row.values()):
+                valid.append(row)
+        return valid
+
+    @staticmethod
+    def after_ingredients():
+        """bulk_create минует сигналы: досчитываем триграммы и индекс."""
+        if connection.vendor != 'postgresql':
+            fill_missing_trigrams(Ingredient, IngredientTrigram, 'ingredient')
+        ingredient_index.invalidate()
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Subquery
+
+from api.counters import actual_count
+from api.models import Favorite, Receipt, ShoppingList, Subscription
+from users.models import User
+
+COUNTERS = (
+    (Receipt, 'favorites_count', Favorite, 'receipt'),
+    (Receipt, 'shopping_cart_count', ShoppingList, 'receipt'),
+    (User, 'recipes_count', Receipt, 'author'),
+    (User, 'followers_count', Subscription, 'author'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Сверяет денормализованные счётчики с данными и исправляет их.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не изменяя.'
+        )
+
+    def handle(self, *args, **options):
+        for model, counter, source, field in COUNTERS:
+            with transaction.atomic():
+                drifted = model.objects.annotate(
+                    actual=actual_count(source, field)
+                ).exclude(**{counter: F('actual')})
+                total = drifted.count()
+                if total and not options['dry_run']:
+                    model.objects.filter(
+                        pk__in=Subquery(drifted.values('pk'))
+                    ).update(**{counter: actual_count(source, field)})
+            self.stdout.write(
+                f'{model._meta.label}.{counter}: расхождений {total}')
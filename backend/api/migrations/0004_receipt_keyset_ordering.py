@@ -0,0 +1,21 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_auto_20250108_1245'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='receipt',
+            options={'ordering': ('-pub_date', '-id'), 'verbose_name': 'Рецепт', 'verbose_name_plural': 'Рецепты'},
+        ),
+        migrations.AddIndex(
+            model_name='receipt',
+            index=models.Index(fields=['-pub_date', '-id'], name='receipt_pub_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_modified_timestamps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receipt',
+            name='favorites_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='receipt',
+            name='shopping_cart_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, verbose_name='В списках покупок'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Receipt = apps.get_model('api', 'Receipt')
+    Favorite = apps.get_model('api', 'Favorite')
+    ShoppingList = apps.get_model('api', 'ShoppingList')
+    Subscription = apps.get_model('api', 'Subscription')
+    User = apps.get_model('users', 'User')
+    Receipt.objects.update(
+        favorites_count=count_of(Favorite, 'receipt'),
+        shopping_cart_count=count_of(ShoppingList, 'receipt')
+    )
+    User.objects.update(
+        recipes_count=count_of(Receipt, 'author'),
+        followers_count=count_of(Subscription, 'author')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_denormalized_counters'),
+        ('users', '0003_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def fill_shopping_cart_items(apps, schema_editor):
+    IngredientReceipt = apps.get_model('api', 'IngredientReceipt')
+    ShoppingCartItem = apps.get_model('api', 'ShoppingCartItem')
+    rows = IngredientReceipt.objects.filter(
+        receipt__shopping_list__isnull=False
+    ).values(
+        'receipt__shopping_list__user', 'ingredient'
+    ).annotate(
+        total=Sum('amount'), recipes=Count('receipt')
+    ).order_by()
+    ShoppingCartItem.objects.bulk_create(
+        ShoppingCartItem(
+            user_id=row['receipt__shopping_list__user'],
+            ingredient_id=row['ingredient'],
+            total_amount=row['total'],
+            recipe_count=row['recipes']
+        )
+        for row in rows.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_shopping_cart_items'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            fill_shopping_cart_items, migrations.RunPython.noop),
+    ]
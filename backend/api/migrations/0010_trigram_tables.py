@@ -0,0 +1,48 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_fill_shopping_cart_items'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceiptTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3, verbose_name='Триграмма')),
+                ('total', models.PositiveSmallIntegerField(verbose_name='Триграмм в названии')),
+                ('receipt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='api.receipt', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Триграмма рецепта',
+                'verbose_name_plural': 'Триграммы рецептов',
+            },
+        ),
+        migrations.CreateModel(
+            name='IngredientTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3, verbose_name='Триграмма')),
+                ('total', models.PositiveSmallIntegerField(verbose_name='Триграмм в названии')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='api.ingredient', verbose_name='Ингредиент')),
+            ],
+            options={
+                'verbose_name': 'Триграмма ингредиента',
+                'verbose_name_plural': 'Триграммы ингредиентов',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='receipttrigram',
+            index=models.Index(fields=['trigram', 'receipt'], name='receipt_trigram_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredienttrigram',
+            index=models.Index(fields=['trigram', 'ingredient'], name='ingredient_trigram_idx'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+import re
+
+from django.db import migrations
+
+BATCH_SIZE = 1000
+WORD = re.compile(r'\w+')
+GIN_INDEXES = (
+    ('ingredient_name_trgm_idx', 'ingredient'),
+    ('receipt_name_trgm_idx', 'api_receipt'),
+)
+
+
+# Копии из api.trigrams на момент миграции: миграция не должна
+# зависеть от того, как живой код изменится позже.
+def trigrams(text):
+    result = set()
+    for word in WORD.findall(text.lower()):
+        padded = f'  {word} '
+        result.update(
+            padded[position:position + 3]
+            for position in range(len(padded) - 2)
+        )
+    return result
+
+
+def rebuild_trigrams(trigram_model, owner_field, objects):
+    objects = list(objects)
+    trigram_model.objects.filter(
+        **{f'{owner_field}__in': [obj.pk for obj in objects]}).delete()
+    rows = []
+    for obj in objects:
+        grams = trigrams(obj.name)
+        rows += [
+            trigram_model(
+                **{f'{owner_field}_id': obj.pk},
+                trigram=gram,
+                total=len(grams)
+            )
+            for gram in grams
+        ]
+    trigram_model.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def build_trigram_search(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for name, table in GIN_INDEXES:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {name} '
+                f'ON {table} USING gin (name gin_trgm_ops)'
+            )
+        return
+    for model_name, trigram_model_name, owner_field in (
+            ('Ingredient', 'IngredientTrigram', 'ingredient'),
+            ('Receipt', 'ReceiptTrigram', 'receipt')):
+        model = apps.get_model('api', model_name)
+        trigram_model = apps.get_model('api', trigram_model_name)
+        objects = model.objects.only('name').order_by('pk')
+        for start in range(0, objects.count(), BATCH_SIZE):
+            rebuild_trigrams(
+                trigram_model, owner_field,
+                objects[start:start + BATCH_SIZE]
+            )
+
+
+def drop_trigram_search(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for name, _ in GIN_INDEXES:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_trigram_tables'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_trigram_search, drop_trigram_search),
+    ]
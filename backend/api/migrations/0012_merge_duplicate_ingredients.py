@@ -0,0 +1,58 @@
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('api', 'Ingredient')
+    IngredientReceipt = apps.get_model('api', 'IngredientReceipt')
+    ShoppingCartItem = apps.get_model('api', 'ShoppingCartItem')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keeper=Min('id'), total=Count('id')).filter(total__gt=1)
+    for group in duplicates.order_by():
+        keeper = group['keeper']
+        others = list(Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(id=keeper).values_list('id', flat=True))
+        for row in IngredientReceipt.objects.filter(ingredient_id__in=others):
+            merged = IngredientReceipt.objects.filter(
+                receipt_id=row.receipt_id, ingredient_id=keeper).first()
+            if merged is None:
+                row.ingredient_id = keeper
+                row.save(update_fields=('ingredient',))
+            else:
+                merged.amount += row.amount
+                merged.save(update_fields=('amount',))
+                row.delete()
+        users = set(ShoppingCartItem.objects.filter(
+            ingredient_id__in=[keeper, *others]
+        ).values_list('user_id', flat=True))
+        ShoppingCartItem.objects.filter(
+            ingredient_id__in=[keeper, *others]).delete()
+        ShoppingCartItem.objects.bulk_create(
+            ShoppingCartItem(
+                user_id=row['receipt__shopping_list__user'],
+                ingredient_id=keeper,
+                total_amount=row['total'],
+                recipe_count=row['recipes']
+            )
+            for row in IngredientReceipt.objects.filter(
+                ingredient_id=keeper,
+                receipt__shopping_list__user__in=users
+            ).values('receipt__shopping_list__user').annotate(
+                total=Sum('amount'), recipes=Count('receipt')
+            ).order_by()
+        )
+        Ingredient.objects.filter(id__in=others).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_trigram_search'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop),
+    ]
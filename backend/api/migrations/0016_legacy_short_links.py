@@ -0,0 +1,52 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+BATCH_SIZE = 1000
+
+
+def copy_short_links(apps, schema_editor):
+    Receipt = apps.get_model('api', 'Receipt')
+    LegacyShortLink = apps.get_model('api', 'LegacyShortLink')
+    rows = Receipt.objects.exclude(short_link__isnull=True).exclude(
+        short_link='').values_list('pk', 'short_link')
+    LegacyShortLink.objects.bulk_create(
+        (
+            LegacyShortLink(receipt_id=pk, code=code)
+            for pk, code in rows.iterator()
+        ),
+        batch_size=BATCH_SIZE
+    )
+
+
+def restore_short_links(apps, schema_editor):
+    Receipt = apps.get_model('api', 'Receipt')
+    LegacyShortLink = apps.get_model('api', 'LegacyShortLink')
+    for link in LegacyShortLink.objects.iterator():
+        Receipt.objects.filter(pk=link.receipt_id).update(
+            short_link=link.code)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_image_uploads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LegacyShortLink',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=64, unique=True, verbose_name='Код')),
+                ('receipt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='legacy_short_links', to='api.receipt', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Старая короткая ссылка',
+                'verbose_name_plural': 'Старые короткие ссылки',
+            },
+        ),
+        migrations.RunPython(
+            copy_short_links, restore_short_links),
+    ]
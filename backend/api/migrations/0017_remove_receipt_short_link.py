@@ -0,0 +1,17 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:28
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_legacy_short_links'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='receipt',
+            name='short_link',
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_remove_receipt_short_link'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShortLinkClick',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Переходов')),
+                ('receipt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='short_link_clicks', to='api.receipt', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'Переходы по ссылке',
+                'verbose_name_plural': 'Переходы по ссылкам',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shortlinkclick',
+            constraint=models.UniqueConstraint(fields=('receipt', 'day'), name='unique_click_day'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0018_short_link_clicks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ingredient_id', models.BigIntegerField(unique=True, verbose_name='Ингредиент')),
+                ('deleted', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Дата удаления')),
+            ],
+            options={
+                'verbose_name': 'Удалённый ингредиент',
+                'verbose_name_plural': 'Удалённые ингредиенты',
+            },
+        ),
+    ]
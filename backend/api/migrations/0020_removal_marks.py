@@ -0,0 +1,25 @@
+# Generated by Django 3.2.3 on 2026-10-18 20:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_ingredient_tombstones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RemovalMark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=32, unique=True, verbose_name='Область')),
+                ('removed', models.DateTimeField(verbose_name='Дата исключения')),
+            ],
+            options={
+                'verbose_name': 'Отметка исключения',
+                'verbose_name_plural': 'Отметки исключения',
+            },
+        ),
+    ]
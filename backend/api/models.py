@@ -1,10 +1,15 @@
-import hashlib
+import os
+import secrets
 
+from django.conf import settings
 from django.db import models
+from django.db.models import Exists, OuterRef, Prefetch, Value
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 from users.models import User
-from .constants import MIN_AMOUNT, MAX_AMOUNT, MAX_CHAR_LENGTH
+from . import shortlinks
+from .constants import (
+    MIN_AMOUNT, MAX_AMOUNT, MAX_CHAR_LENGTH, UPLOAD_TOKEN_LENGTH)
 
 
 class Tag(models.Model):
@@ -12,6 +17,8 @@ class Tag(models.Model):
         max_length=MAX_CHAR_LENGTH, unique=True, verbose_name='Название')
     slug = models.SlugField(
         max_length=MAX_CHAR_LENGTH, unique=True, verbose_name='slug')
+    modified = models.DateTimeField(
+        'Дата изменения', auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = 'Тег'
@@ -26,16 +33,83 @@ class Ingredient(models.Model):
         max_length=MAX_CHAR_LENGTH, verbose_name='Название')
     measurement_unit = models.CharField(
         max_length=MAX_CHAR_LENGTH, verbose_name='Единица измерения')
+    modified = models.DateTimeField(
+        'Дата изменения', auto_now=True, db_index=True)
 
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         db_table = 'ingredient'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient_unit'
+            ),
+        )
 
     def __str__(self):
         return self.name
 
 
+class IngredientTombstone(models.Model):
+    """След удалённого ингредиента для дельты каталога."""
+
+    ingredient_id = models.BigIntegerField('Ингредиент', unique=True)
+    deleted = models.DateTimeField(
+        'Дата удаления', auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Удалённый ингредиент'
+        verbose_name_plural = 'Удалённые ингредиенты'
+
+    def __str__(self):
+        return f'{self.ingredient_id} удалён {self.deleted}'
+
+
+class RemovalMark(models.Model):
+    """Время, когда объект последний раз выпал из списков области.
+
+    Максимальная версия списка не замечает удалённых и отфильтрованных
+    объектов, поэтому ETag списка учитывает и эту отметку. Она хранится
+    в базе, чтобы все воркеры видели одно и то же.
+    """
+
+    scope = models.CharField('Область', max_length=32, unique=True)
+    removed = models.DateTimeField('Дата исключения')
+
+    class Meta:
+        verbose_name = 'Отметка исключения'
+        verbose_name_plural = 'Отметки исключения'
+
+    def __str__(self):
+        return f'{self.scope}: {self.removed}'
+
+
+class ReceiptQuerySet(models.QuerySet):
+    def with_related(self):
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'receipts',
+                queryset=IngredientReceipt.objects.select_related(
+                    'ingredient')
+            )
+        )
+
+    def with_user_flags(self, user):
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=Value(False, models.BooleanField()),
+                is_in_shopping_cart=Value(False, models.BooleanField())
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, receipt=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingList.objects.filter(
+                user=user, receipt=OuterRef('pk')))
+        )
+
+
 class Receipt(models.Model):
     author = models.ForeignKey(
         User,
@@ -49,6 +123,8 @@ class Receipt(models.Model):
         upload_to='recipes/',
         verbose_name='Изображение'
     )
+    image_variants = models.JSONField(
+        'Уменьшенные копии', default=dict, blank=True, editable=False)
     text = models.TextField(verbose_name='Описание')
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -76,21 +152,27 @@ class Receipt(models.Model):
         'Дата публикации',
         auto_now_add=True,
         db_index=True)
-    short_link = models.CharField(
-        max_length=MAX_CHAR_LENGTH, blank=True, null=True, unique=True)
+    modified = models.DateTimeField(
+        'Дата изменения', auto_now=True, db_index=True)
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, db_index=True)
+    shopping_cart_count = models.PositiveIntegerField(
+        'В списках покупок', default=0, db_index=True)
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        if not self.short_link:
-            self.short_link = self.generate_short_link()
-            super().save(update_fields=['short_link'])
+    objects = ReceiptQuerySet.as_manager()
 
-    def generate_short_link(self):
-        unique_string = f'{self.id}{self.name}'
-        return hashlib.md5(unique_string.encode()).hexdigest()[:8]
+    @property
+    def short_code(self):
+        return shortlinks.encode(self.pk)
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='receipt_pub_date_id_idx'
+            ),
+        )
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -176,6 +258,8 @@ class ShoppingList(models.Model):
         verbose_name='В списке у юзеров'
     )
 
+    counter_field = 'shopping_cart_count'
+
     class Meta:
         constraints = (
             models.UniqueConstraint(
@@ -190,6 +274,36 @@ class ShoppingList(models.Model):
         return f'Юзер {self.user} добавил рецепт {self.receipt} в покупки'
 
 
+class ShoppingCartItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_items',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_items',
+        verbose_name='Ингредиент'
+    )
+    total_amount = models.PositiveIntegerField('Количество')
+    recipe_count = models.PositiveIntegerField('Рецептов')
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_cart_item'
+            ),
+        )
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списков покупок'
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.total_amount}'
+
+
 class Favorite(models.Model):
     receipt = models.ForeignKey(
         Receipt,
@@ -204,6 +318,8 @@ class Favorite(models.Model):
         verbose_name='Избранные рецепты'
     )
 
+    counter_field = 'favorites_count'
+
     class Meta:
         constraints = (
             models.UniqueConstraint(
@@ -246,3 +362,136 @@ class Subscription(models.Model):
 
     def __str__(self):
         return f'{self.user} follows {self.author}'
+
+
+class IngredientTrigram(models.Model):
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='trigrams',
+        verbose_name='Ингредиент'
+    )
+    trigram = models.CharField('Триграмма', max_length=3)
+    total = models.PositiveSmallIntegerField('Триграмм в названии')
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('trigram', 'ingredient'),
+                name='ingredient_trigram_idx'
+            ),
+        )
+        verbose_name = 'Триграмма ингредиента'
+        verbose_name_plural = 'Триграммы ингредиентов'
+
+    def __str__(self):
+        return f'{self.ingredient} - {self.trigram}'
+
+
+class ReceiptTrigram(models.Model):
+    receipt = models.ForeignKey(
+        Receipt,
+        on_delete=models.CASCADE,
+        related_name='trigrams',
+        verbose_name='Рецепт'
+    )
+    trigram = models.CharField('Триграмма', max_length=3)
+    total = models.PositiveSmallIntegerField('Триграмм в названии')
+
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('trigram', 'receipt'),
+                name='receipt_trigram_idx'
+            ),
+        )
+        verbose_name = 'Триграмма рецепта'
+        verbose_name_plural = 'Триграммы рецептов'
+
+    def __str__(self):
+        return f'{self.receipt} - {self.trigram}'
+
+
+def new_upload_token():
+    return secrets.token_hex(UPLOAD_TOKEN_LENGTH // 2)
+
+
+class ImageUpload(models.Model):
+    """Изображение, загружаемое по частям до отправки рецепта."""
+
+    token = models.CharField(
+        'Токен', max_length=UPLOAD_TOKEN_LENGTH, unique=True,
+        default=new_upload_token, editable=False)
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='image_uploads',
+        verbose_name='Пользователь'
+    )
+    size = models.PositiveIntegerField('Размер')
+    offset = models.PositiveIntegerField('Получено', default=0)
+    width = models.PositiveIntegerField('Ширина', null=True, blank=True)
+    height = models.PositiveIntegerField('Высота', null=True, blank=True)
+    format = models.CharField('Формат', max_length=16, blank=True)
+    created = models.DateTimeField(
+        'Дата создания', auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Загрузка изображения'
+        verbose_name_plural = 'Загрузки изображений'
+
+    def __str__(self):
+        return f'{self.token}: {self.offset}/{self.size}'
+
+    @property
+    def path(self):
+        return os.path.join(settings.IMAGE_UPLOAD_DIR, f'{self.token}.part')
+
+    @property
+    def complete(self):
+        return self.offset == self.size and self.format != ''
+
+
+class LegacyShortLink(models.Model):
+    """Короткая ссылка старого формата: префикс md5 от id и названия."""
+
+    code = models.CharField('Код', max_length=MAX_CHAR_LENGTH, unique=True)
+    receipt = models.ForeignKey(
+        Receipt,
+        on_delete=models.CASCADE,
+        related_name='legacy_short_links',
+        verbose_name='Рецепт'
+    )
+
+    class Meta:
+        verbose_name = 'Старая короткая ссылка'
+        verbose_name_plural = 'Старые короткие ссылки'
+
+    def __str__(self):
+        return self.code
+
+
+class ShortLinkClick(models.Model):
+    """Переходы по короткой ссылке рецепта за день."""
+
+    receipt = models.ForeignKey(
+        Receipt,
+        on_delete=models.CASCADE,
+        related_name='short_link_clicks',
+        verbose_name='Рецепт'
+    )
+    day = models.DateField('День')
+    count = models.PositiveIntegerField('Переходов', default=0)
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('receipt', 'day'),
+                name='unique_click_day'
+            ),
+        )
+        verbose_name = 'Переходы по ссылке'
+        verbose_name_plural = 'Переходы по ссылкам'
+
+    def __str__(self):
+        return f'{self.receipt} {self.day}: {self.count}'
@@ -1,8 +1,174 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
 
-from .constants import PAGE_SIZE
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (BasePagination, PageNumberPagination,
+                                       _positive_int)
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .constants import MAX_PAGE_SIZE, PAGE_SIZE
+from .filters import TrigramSearchFilter
 
 
 class ReceiptPagination(PageNumberPagination):
     page_size = PAGE_SIZE
     page_size_query_param = 'limit'
+
+
+class KeysetPagination(BasePagination):
+    """Курсорная пагинация по ключу сортировки без OFFSET и COUNT.
+
+    Курсор хранит значения полей сортировки последней (или первой,
+    для перехода назад) записи страницы, поэтому выборка любой страницы
+    сводится к диапазонному сканированию индекса.
+    """
+    page_size = PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+    cursor_query_param = 'cursor'
+    ordering = ('-pub_date', '-id')
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.fields = [
+            (field.lstrip('-'), field.startswith('-'))
+            for field in self.get_ordering(request, queryset, view)
+        ]
+        model_fields = [
+            queryset.model._meta.get_field(name) for name, _ in self.fields
+        ]
+        position, reverse = self.decode_cursor(request, model_fields)
+
+        ordering = [
+            f'-{name}' if descending != reverse else name
+            for name, descending in self.fields
+        ]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(
+                self.get_keyset_filter(position, reverse))
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+        self.page = results
+        self.model_fields = model_fields
+        return results
+
+    def get_ordering(self, request, queryset, view):
+        ordering = list(queryset.query.order_by) or list(self.ordering)
+        for field in self.ordering:
+            if field.lstrip('-') not in (
+                    name.lstrip('-') for name in ordering):
+                ordering.append(field)
+        return ordering
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(
+                request.query_params[self.page_size_query_param],
+                strict=True,
+                cutoff=self.max_page_size
+            )
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_keyset_filter(self, position, reverse):
+        keyset_filter = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.fields, position):
+            lookup = 'lt' if descending != reverse else 'gt'
+            keyset_filter |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return keyset_filter
+
+    def decode_cursor(self, request, model_fields):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            values = data['p']
+            if len(values) != len(model_fields):
+                raise ValueError
+            position = [
+                field.to_python(value)
+                for field, value in zip(model_fields, values)
+            ]
+            return position, bool(data.get('r'))
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, instance, reverse):
+        data = {
+            'p': [field.value_to_string(instance)
+                  for field in self.model_fields],
+        }
+        if reverse:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(
+            json.dumps(data, separators=(',', ':')).encode()).decode()
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(
+                self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(
+                self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+
+class ReceiptFeedPagination(BasePagination):
+    """Курсорная пагинация ленты рецептов.
+
+    Старые клиенты, передающие ``?page=``, получают прежний ответ
+    постраничной пагинации с полем ``count``. Так же постранично
+    отдаётся ранжированная выдача нечёткого поиска: её порядок задаёт
+    вычисляемое сходство, а не поля модели.
+    """
+    page_number_class = ReceiptPagination
+    keyset_class = KeysetPagination
+    page_number_params = (
+        page_number_class.page_query_param, TrigramSearchFilter.search_param)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if any(
+            param in request.query_params
+            for param in self.page_number_params
+        ):
+            self.paginator = self.page_number_class()
+        else:
+            self.paginator = self.keyset_class()
+        return self.paginator.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.paginator.get_paginated_response(data)
@@ -0,0 +1,114 @@
+from django.db import connection
+
+ADDED = 'added'
+EXISTS = 'exists'
+REMOVED = 'removed'
+ABSENT = 'absent'
+NOT_FOUND = 'not_found'
+SELF = 'self'
+
+
+def columns(model, target_field):
+    qn = connection.ops.quote_name
+    meta = model._meta
+    field = meta.get_field(target_field)
+    return (qn(meta.db_table), qn(meta.get_field('user').column),
+            qn(field.column), field.related_model._meta)
+
+
+def insert_links(model, user_id, target_field, target_ids):
+    """Создаёт связи пользователя с целями одним INSERT.
+
+    ``INSERT ... SELECT`` берёт id из таблицы цели, поэтому
+    несуществующие цели не вставляются, а ``ON CONFLICT DO NOTHING``
+    пропускает уже существующие связи, в том числе созданные
+    параллельным запросом. ``RETURNING`` отдаёт id целей, строки для
+    которых действительно вставлены: только к ним применяются счётчики.
+    """
+    qn = connection.ops.quote_name
+    table, user_column, target_column, target = columns(model, target_field)
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({user_column}, {target_column}) '
+            f'SELECT %s, {qn(target.pk.column)} '
+            f'FROM {qn(target.db_table)} '
+            f'WHERE {qn(target.pk.column)} IN ({placeholders}) '
+            f'ON CONFLICT DO NOTHING RETURNING {target_column}',
+            (user_id, *target_ids)
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def delete_links(model, user_id, target_field, target_ids):
+    """Удаляет связи одним DELETE; возвращает id действительно удалённых.
+
+    Связи с пользователями и рецептами удаляются без сигналов, поэтому
+    обходить ``QuerySet.delete`` здесь безопасно.
+    """
+    table, user_column, target_column, _ = columns(model, target_field)
+    placeholders = ', '.join(['%s'] * len(target_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE {user_column} = %s '
+            f'AND {target_column} IN ({placeholders}) '
+            f'RETURNING {target_column}',
+            (user_id, *target_ids)
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def link(model, user_id, target_field, target_id):
+    """Добавляет одну связь; True, если строка вставлена.
+
+    При False причину различает ``missing_target``.
+    """
+    return bool(insert_links(model, user_id, target_field, (target_id,)))
+
+
+def unlink(model, user_id, target_field, target_id):
+    """Удаляет одну связь; True, если строка была."""
+    return bool(delete_links(model, user_id, target_field, (target_id,)))
+
+
+def missing_target(model, target_field, target_id):
+    """Для редкого пути: нет цели (404) или связь уже/ещё не была (400)."""
+    target = model._meta.get_field(target_field).related_model
+    return not target.objects.filter(pk=target_id).exists()
+
+
+def existing_targets(model, target_field, target_ids):
+    if not target_ids:
+        return set()
+    target = model._meta.get_field(target_field).related_model
+    return set(target.objects.filter(
+        pk__in=target_ids).values_list('pk', flat=True))
+
+
+def link_many(model, user_id, target_field, target_ids):
+    """Связывает пользователя с целями; исход по каждой и добавленные.
+
+    Запрос к таблице целей нужен, только если что-то не вставилось:
+    он отличает несуществующие цели от уже связанных.
+    """
+    added = insert_links(model, user_id, target_field, target_ids)
+    existing = existing_targets(
+        model, target_field, [pk for pk in target_ids if pk not in added])
+    outcomes = {
+        pk: ADDED if pk in added else EXISTS if pk in existing else NOT_FOUND
+        for pk in target_ids
+    }
+    return outcomes, [pk for pk in target_ids if pk in added]
+
+
+def unlink_many(model, user_id, target_field, target_ids):
+    """Удаляет связи пользователя с целями одним DELETE."""
+    removed = delete_links(model, user_id, target_field, target_ids)
+    existing = existing_targets(
+        model, target_field, [pk for pk in target_ids if pk not in removed])
+    outcomes = {
+        pk: REMOVED if pk in removed else ABSENT if pk in existing
+        else NOT_FOUND
+        for pk in target_ids
+    }
+    return outcomes, [pk for pk in target_ids if pk in removed]
@@ -1,10 +1,33 @@
+import json
+
 from rest_framework import serializers, validators
 from djoser.serializers import UserSerializer, UserCreateSerializer
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 
 from .models import (Tag, Ingredient, Receipt, IngredientReceipt,
-                     User, Favorite, ShoppingList, Subscription)
-from .fields import Base64ImageField
+                     TagReceipt, User, Favorite, ShoppingList, Subscription,
+                     ImageUpload)
+from . import images, shopping_cart
+from .constants import BATCH_MAX_SIZE, IMAGE_UPLOAD_MAX_SIZE
+from .counters import shift_user_counter
+from .fields import (Base64ImageField, ImageVariantsField,
+                     PrimaryKeyListField, missing_pks)
+
+
+def get_subscribed_ids(context):
+    """Id авторов, на которых подписан пользователь запроса.
+
+    Загружаются одним запросом при первом обращении и сохраняются
+    в контексте, общем для корневого и всех вложенных сериализаторов.
+    """
+    request = context.get('request')
+    if request is None or request.user.is_anonymous:
+        return frozenset()
+    if 'subscribed_ids' not in context:
+        context['subscribed_ids'] = frozenset(
+            request.user.follower.values_list('author_id', flat=True))
+    return context['subscribed_ids']
 
 
 class UserAvatarSerializer(serializers.ModelSerializer):
@@ -15,6 +38,27 @@ class UserAvatarSerializer(serializers.ModelSerializer):
         fields = ('avatar',)
 
 
+class ImageUploadSerializer(serializers.ModelSerializer):
+    complete = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = ImageUpload
+        fields = (
+            'token', 'size', 'offset', 'width', 'height', 'format',
+            'complete'
+        )
+        read_only_fields = (
+            'token', 'offset', 'width', 'height', 'format')
+
+    def validate_size(self, value):
+        if not 0 < value <= IMAGE_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Размер должен быть от 1 байта до '
+                f'{IMAGE_UPLOAD_MAX_SIZE // 1024 // 1024} МБ.'
+            )
+        return value
+
+
 class IngredientReceiptSerializer(serializers.ModelSerializer):
     id = serializers.ReadOnlyField(source='ingredient.id')
     name = serializers.ReadOnlyField(source='ingredient.name')
@@ -37,7 +81,8 @@ class IngredientReceiptSerializer(serializers.ModelSerializer):
 
 
 class AddIngredientSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    # Разрешается в Ingredient пачкой в AddReceiptSerializer.
+    id = serializers.IntegerField(min_value=1)
 
     class Meta:
         model = IngredientReceipt
@@ -46,6 +91,7 @@ class AddIngredientSerializer(serializers.ModelSerializer):
 
 class MyUserSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
+    avatar_variants = ImageVariantsField('avatar')
 
     class Meta:
         model = User
@@ -56,14 +102,20 @@ class MyUserSerializer(UserSerializer):
             'first_name',
             'last_name',
             'is_subscribed',
-            'avatar'
+            'avatar',
+            'avatar_variants'
         )
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if request is None or request.user.is_anonymous:
-            return False
-        return request.user.follower.filter(author=obj).exists()
+        return obj.id in get_subscribed_ids(self.context)
+
+
+class MyUserDetailSerializer(MyUserSerializer):
+
+    class Meta(MyUserSerializer.Meta):
+        fields = MyUserSerializer.Meta.fields + (
+            'recipes_count', 'followers_count')
+        read_only_fields = ('recipes_count', 'followers_count')
 
 
 class MyUserCreateSerializer(UserCreateSerializer):
@@ -81,35 +133,6 @@ class MyUserCreateSerializer(UserCreateSerializer):
         return user
 
 
-class SubscribeSerializer(serializers.ModelSerializer):
-
-    class Meta:
-        model = Subscription
-        fields = ('user', 'author')
-
-    def to_representation(self, instance):
-        request = self.context.get('request')
-        context = {'request': request}
-        serializer = SubscriptionSerializer(
-            instance,
-            context=context
-        )
-        return serializer.data
-
-    def validate(self, data):
-        user = data.get('user')
-        author = data.get('author')
-        if user == author:
-            raise serializers.ValidationError(
-                'Нельзя подписаться на самого себя!'
-            )
-        if author.following.filter(user=user).exists():
-            raise serializers.ValidationError(
-                'Вы уже подписаны на этого пользователя!'
-            )
-        return data
-
-
 class SubscriptionSerializer(serializers.ModelSerializer):
     email = serializers.ReadOnlyField(source='author.email')
     id = serializers.ReadOnlyField(source='author.id')
@@ -117,10 +140,12 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     first_name = serializers.ReadOnlyField(source='author.first_name')
     last_name = serializers.ReadOnlyField(source='author.last_name')
     avatar = serializers.SerializerMethodField()
+    avatar_variants = ImageVariantsField('avatar', source='author')
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.ReadOnlyField(
-        source='author.author_receipts.count')
+    recipes_count = serializers.ReadOnlyField(source='author.recipes_count')
+    followers_count = serializers.ReadOnlyField(
+        source='author.followers_count')
 
     class Meta:
         model = Subscription
@@ -131,21 +156,28 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             'first_name',
             'last_name',
             'avatar',
+            'avatar_variants',
             'is_subscribed',
             'recipes',
-            'recipes_count'
+            'recipes_count',
+            'followers_count'
         )
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
-        return request.user.follower.filter(author=obj.author).exists()
+        if obj.user_id == request.user.id:
+            return True
+        return obj.author_id in get_subscribed_ids(self.context)
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        queryset = obj.author.author_receipts.all()
-        if request.GET.get('recipes_limit'):
-            receipt_limit = int(request.GET.get('recipes_limit'))
-            queryset = queryset[:receipt_limit]
+        if hasattr(obj.author, 'subscription_receipts'):
+            queryset = obj.author.subscription_receipts
+        else:
+            request = self.context.get('request')
+            queryset = obj.author.author_receipts.all()
+            recipes_limit = request.GET.get('recipes_limit')
+            if recipes_limit and recipes_limit.isdigit():
+                queryset = queryset[:int(recipes_limit)]
         serializer = ShortReceiptSerializer(
             queryset, read_only=True, many=True
         )
@@ -161,7 +193,7 @@ class TagSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Tag
-        fields = '__all__'
+        fields = ('id', 'name', 'slug')
 
 
 class TagField(serializers.SlugRelatedField):
@@ -175,6 +207,7 @@ class TagField(serializers.SlugRelatedField):
 
 class ReceiptSerializer(serializers.ModelSerializer):
     image = Base64ImageField(required=False, allow_null=True)
+    image_variants = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     ingredients = IngredientReceiptSerializer(
@@ -187,11 +220,13 @@ class ReceiptSerializer(serializers.ModelSerializer):
     class Meta:
         model = Receipt
         fields = (
-            'id', 'author', 'name', 'image', 'text',
+            'id', 'author', 'name', 'image', 'image_variants', 'text',
             'ingredients', 'tags', 'cooking_time',
-            'is_favorited', 'is_in_shopping_cart'
+            'is_favorited', 'is_in_shopping_cart',
+            'favorites_count', 'shopping_cart_count'
         )
-        read_only_fields = ('author',)
+        read_only_fields = (
+            'author', 'favorites_count', 'shopping_cart_count')
 
     def is_included(self, obj, model):
         request = self.context.get('request')
@@ -200,9 +235,13 @@ class ReceiptSerializer(serializers.ModelSerializer):
         return model.objects.filter(user=request.user, receipt=obj).exists()
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return self.is_included(obj, Favorite)
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return self.is_included(obj, ShoppingList)
 
 
@@ -210,14 +249,11 @@ class IngredientSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Ingredient
-        fields = '__all__'
+        fields = ('id', 'name', 'measurement_unit')
 
 
 class AddReceiptSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
-    )
+    tags = PrimaryKeyListField(queryset=Tag.objects.all())
     ingredients = AddIngredientSerializer(many=True)
     image = Base64ImageField(max_length=None)
 
@@ -233,9 +269,30 @@ class AddReceiptSerializer(serializers.ModelSerializer):
         )
 
     def to_representation(self, instance):
+        # Ингредиенты ответа одним запросом, а не по одному на строку.
+        prefetch_related_objects([instance], 'tags', Prefetch(
+            'receipts',
+            queryset=IngredientReceipt.objects.select_related('ingredient')
+        ))
         serializer = ReceiptSerializer(instance)
         return serializer.data
 
+    def to_internal_value(self, data):
+        # В multipart/form-data ингредиенты можно передать JSON-строкой.
+        if hasattr(data, 'getlist') and isinstance(
+                data.get('ingredients'), str):
+            try:
+                ingredients = json.loads(data['ingredients'])
+            except ValueError:
+                raise serializers.ValidationError(
+                    {'ingredients': ['Ожидался JSON-массив.']})
+            data = {
+                key: data.getlist(key) if key == 'tags' else data[key]
+                for key in data
+            }
+            data['ingredients'] = ingredients
+        return super().to_internal_value(data)
+
     def create_ingredients(self, ingredients, receipt):
         ingredient_receipts = [
             IngredientReceipt(
@@ -254,95 +311,168 @@ class AddReceiptSerializer(serializers.ModelSerializer):
         receipt = Receipt.objects.create(**validated_data)
         receipt.tags.set(tags)
         self.create_ingredients(ingredients, receipt)
+        shift_user_counter((receipt.author_id,), 'recipes_count', 1)
+        images.schedule(images.build_receipt_variants, receipt.pk)
         return receipt
 
+    def sync_ingredients(self, instance, ingredients):
+        """Приводит ингредиенты рецепта к ``ingredients`` по разнице.
+
+        Вставляются только новые строки, количество обновляется одним
+        ``bulk_update``, удаляются лишь исчезнувшие. Возвращает True,
+        если что-то изменилось.
+        """
+        current = {
+            row.ingredient_id: row
+            for row in IngredientReceipt.objects.filter(receipt=instance)
+        }
+        wanted = {item['id'].pk: item['amount'] for item in ingredients}
+        created = [
+            IngredientReceipt(
+                receipt=instance, ingredient_id=pk, amount=amount)
+            for pk, amount in wanted.items() if pk not in current
+        ]
+        changed = []
+        for pk, row in current.items():
+            if pk in wanted and row.amount != wanted[pk]:
+                row.amount = wanted[pk]
+                changed.append(row)
+        removed = [row.pk for pk, row in current.items() if pk not in wanted]
+        IngredientReceipt.objects.bulk_create(created)
+        IngredientReceipt.objects.bulk_update(changed, ('amount',))
+        if removed:
+            IngredientReceipt.objects.filter(pk__in=removed).delete()
+        return bool(created or changed or removed)
+
+    def sync_tags(self, instance, tags):
+        current = set(TagReceipt.objects.filter(
+            receipt=instance).values_list('tag_id', flat=True))
+        wanted = {tag.pk for tag in tags}
+        if current == wanted:
+            return False
+        if current - wanted:
+            instance.tags.remove(*(current - wanted))
+        if wanted - current:
+            instance.tags.add(*(wanted - current))
+        return True
+
+    def same_image(self, instance, image):
+        """Совпадает ли присланная картинка с сохранённой.
+
+        Хранилище по содержимому даёт имя по хешу, поэтому повторная
+        отправка того же изображения узнаётся без записи файла.
+        """
+        storage = instance.image.storage
+        if not instance.image or not hasattr(storage, 'content_name'):
+            return False
+        name = instance._meta.get_field('image').generate_filename(
+            instance, image.name)
+        return storage.content_name(name, image) == instance.image.name
+
     @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('ingredients', [])
-        tags = validated_data.pop('tags', [])
-        instance.ingredients.clear()
-        self.create_ingredients(ingredients, instance)
-        instance.tags.set(tags)
-        return super().update(instance, validated_data)
+        ingredients = validated_data.pop('ingredients', None)
+        tags = validated_data.pop('tags', None)
+        image = validated_data.get('image')
+        if image is not None and self.same_image(instance, image):
+            del validated_data['image']
+        fields = [
+            field for field, value in validated_data.items()
+            if getattr(instance, field) != value
+        ]
+        ingredients_changed = (
+            ingredients is not None
+            and self.sync_ingredients(instance, ingredients)
+        )
+        tags_changed = tags is not None and self.sync_tags(instance, tags)
+        if fields or ingredients_changed or tags_changed:
+            for field in fields:
+                setattr(instance, field, validated_data[field])
+            # Сохранение сдвигает modified и сбрасывает кеш рецепта.
+            instance.save(update_fields=(*fields, 'modified'))
+        if ingredients_changed:
+            shopping_cart.recompute(
+                instance.shopping_list.values_list('user_id', flat=True))
+        if instance.image.name != instance.image_variants.get('source'):
+            images.schedule(images.build_receipt_variants, instance.pk)
+        return instance
+
+    def validate_ingredients(self, value):
+        """Все ингредиенты рецепта одним запросом ``in_bulk``."""
+        pks = [item['id'] for item in value]
+        found = Ingredient.objects.in_bulk(set(pks))
+        if len(found) < len(set(pks)):
+            raise serializers.ValidationError(
+                f'Не найдены ингредиенты с id: {missing_pks(pks, found)}.')
+        for item in value:
+            item['id'] = found[item['id']]
+        return value
 
     def validate(self, data):
         def contains_duplicates(seq):
-            seen = []
-            return any(i in seen or seen.append(i) for i in seq)
-        if 'ingredients' not in data:
-            raise serializers.ValidationError(
-                'Поле с ингредиентами отсутствует'
-            )
-        if 'tags' not in data:
-            raise serializers.ValidationError(
-                'Поле с тегами отсутствует'
-            )
-        if 'cooking_time' not in data:
-            raise serializers.ValidationError(
-                'Поле с временем готовки отсутствует'
-            )
-        ingredients = data['ingredients']
-        if not ingredients:
-            raise serializers.ValidationError(
-                'Поле с ингредиентами должно иметь значение'
-            )
-        if ingredients == []:
-            raise serializers.ValidationError(
-                'В рецепте должен быть хотя бы один ингредиент'
-            )
-        for ingredient in ingredients:
-            if not isinstance(ingredient['amount'], int):
+            seq = list(seq)
+            return len(set(seq)) < len(seq)
+        # При PATCH проверяются только присланные поля, остальные
+        # остаются как есть.
+        if not self.partial:
+            if 'ingredients' not in data:
                 raise serializers.ValidationError(
-                    'Недопустимое нецелое значение'
+                    'Поле с ингредиентами отсутствует'
                 )
-        if contains_duplicates(ingredients):
-            raise serializers.ValidationError(
-                'В рецепте не должно быть повторяющихся ингредиентов'
-            )
-        tags = data['tags']
-        if not tags:
-            raise serializers.ValidationError(
-                'Поле с тегами должно иметь значение'
-            )
-        if tags == []:
-            raise serializers.ValidationError(
-                'В рецепте должен быть хотя бы один тег'
-            )
-        if contains_duplicates(tags):
-            raise serializers.ValidationError(
-                'В рецепте не должно быть повторяющихся тегов'
-            )
-        cooking_time = data['cooking_time']
-        if not cooking_time:
+            if 'tags' not in data:
+                raise serializers.ValidationError(
+                    'Поле с тегами отсутствует'
+                )
+            if 'cooking_time' not in data:
+                raise serializers.ValidationError(
+                    'Поле с временем готовки отсутствует'
+                )
+        if 'ingredients' in data:
+            ingredients = data['ingredients']
+            if not ingredients:
+                raise serializers.ValidationError(
+                    'Поле с ингредиентами должно иметь значение'
+                )
+            for ingredient in ingredients:
+                if not isinstance(ingredient['amount'], int):
+                    raise serializers.ValidationError(
+                        'Недопустимое нецелое значение'
+                    )
+            if contains_duplicates(item['id'] for item in ingredients):
+                raise serializers.ValidationError(
+                    'В рецепте не должно быть повторяющихся ингредиентов'
+                )
+        if 'tags' in data:
+            tags = data['tags']
+            if not tags:
+                raise serializers.ValidationError(
+                    'Поле с тегами должно иметь значение'
+                )
+            if contains_duplicates(tags):
+                raise serializers.ValidationError(
+                    'В рецепте не должно быть повторяющихся тегов'
+                )
+        if 'cooking_time' in data and not data['cooking_time']:
             raise serializers.ValidationError(
                 'Поле с временем готовки не может быть пустым'
             )
         return data
 
 
-class AddReceiptToListesSerializer(serializers.Serializer):
-    user = serializers.PrimaryKeyRelatedField(queryset=User.objects.all())
-    receipt = serializers.PrimaryKeyRelatedField(
-        queryset=Receipt.objects.all())
-
-    def validate(self, data):
-        table = self.context.get('table')
-        user = data['user']
-        receipt = data['receipt']
-
-        if table.objects.filter(user=user, receipt=receipt).exists():
-            raise serializers.ValidationError(
-                {'detail': 'Этот рецепт уже добавлен.'})
-
-        return data
+class IdBatchSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BATCH_MAX_SIZE
+    )
 
-    def create(self, validated_data):
-        table = self.context.get('table')
-        return table.objects.create(**validated_data)
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
 
 
 class ShortReceiptSerializer(serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Receipt
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
@@ -0,0 +1,75 @@
+from django.db.models import Count, Sum
+
+from .models import IngredientReceipt, ShoppingCartItem, User
+
+
+def live_totals(user_ids):
+    """Суммы ингредиентов по спискам покупок, посчитанные по рецептам."""
+    return IngredientReceipt.objects.filter(
+        receipt__shopping_list__user__in=user_ids
+    ).values(
+        'receipt__shopping_list__user', 'ingredient'
+    ).annotate(
+        total=Sum('amount'), recipes=Count('receipt')
+    ).order_by('receipt__shopping_list__user', 'ingredient')
+
+
+def apply_receipts(user_id, receipt_ids, sign):
+    """Добавляет (sign=1) или вычитает (sign=-1) рецепты из агрегата.
+
+    Вызывается внутри транзакции, изменившей ShoppingList. Строка
+    пользователя блокируется, чтобы параллельные изменения одного
+    списка не теряли друг друга.
+    """
+    list(User.objects.select_for_update().filter(pk=user_id).values('pk'))
+    changes = {
+        row['ingredient']: (row['total'], row['recipes'])
+        for row in IngredientReceipt.objects.filter(
+            receipt_id__in=receipt_ids
+        ).values('ingredient').annotate(
+            total=Sum('amount'), recipes=Count('receipt')
+        ).order_by()
+    }
+    if not changes:
+        return
+    items = {
+        item.ingredient_id: item
+        for item in ShoppingCartItem.objects.filter(
+            user_id=user_id, ingredient_id__in=changes)
+    }
+    updated, created, emptied = [], [], []
+    for ingredient_id, (total, recipes) in changes.items():
+        item = items.get(ingredient_id)
+        if item is None:
+            if sign > 0:
+                created.append(ShoppingCartItem(
+                    user_id=user_id, ingredient_id=ingredient_id,
+                    total_amount=total, recipe_count=recipes))
+            continue
+        item.total_amount += sign * total
+        item.recipe_count += sign * recipes
+        if item.recipe_count > 0 and item.total_amount > 0:
+            updated.append(item)
+        else:
+            emptied.append(item.pk)
+    ShoppingCartItem.objects.bulk_create(created)
+    ShoppingCartItem.objects.bulk_update(
+        updated, ('total_amount', 'recipe_count'))
+    ShoppingCartItem.objects.filter(pk__in=emptied).delete()
+
+
+def recompute(user_ids):
+    """Пересобирает агрегат заданных пользователей по живым данным."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    ShoppingCartItem.objects.filter(user_id__in=user_ids).delete()
+    ShoppingCartItem.objects.bulk_create(
+        ShoppingCartItem(
+            user_id=row['receipt__shopping_list__user'],
+            ingredient_id=row['ingredient'],
+            total_amount=row['total'],
+            recipe_count=row['recipes']
+        )
+        for row in live_totals(user_ids).iterator()
+    )
@@ -0,0 +1,70 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+ALPHABET = (
+    '0123456789'
+    'abcdefghijklmnopqrstuvwxyz'
+    'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+)
+BASE = len(ALPHABET)
+DIGITS = {char: value for value, char in enumerate(ALPHABET)}
+CODE_LENGTH = 6
+CODE_SPACE = BASE ** CODE_LENGTH
+# Перестановка id внутри пространства кодов: соседние рецепты получают
+# непохожие коды. Смена множителя или сдвига ломает выданные ссылки.
+MULTIPLIER = settings.SHORT_LINK_MULTIPLIER % CODE_SPACE
+OFFSET = settings.SHORT_LINK_OFFSET % CODE_SPACE
+INVERSE = pow(MULTIPLIER, -1, CODE_SPACE)
+
+_lock = threading.Lock()
+_known = OrderedDict()
+
+
+def encode(pk):
+    """Код из CODE_LENGTH символов base62 для id рецепта."""
+    if not 0 < pk < CODE_SPACE:
+        raise ValueError(f'id {pk} не помещается в короткую ссылку')
+    value = (pk * MULTIPLIER + OFFSET) % CODE_SPACE
+    chars = []
+    for _ in range(CODE_LENGTH):
+        value, digit = divmod(value, BASE)
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+
+def decode(code):
+    """Id рецепта по коду или None, если код не из этой схемы."""
+    if len(code) != CODE_LENGTH:
+        return None
+    value = 0
+    for char in code:
+        digit = DIGITS.get(char)
+        if digit is None:
+            return None
+        value = value * BASE + digit
+    pk = (value - OFFSET) * INVERSE % CODE_SPACE
+    return pk or None
+
+
+def is_known(pk):
+    """Есть ли id в LRU проверенных рецептов этого процесса."""
+    with _lock:
+        if pk not in _known:
+            return False
+        _known.move_to_end(pk)
+        return True
+
+
+def remember(pk):
+    with _lock:
+        _known[pk] = True
+        _known.move_to_end(pk)
+        while len(_known) > settings.SHORT_LINK_CACHE_SIZE:
+            _known.popitem(last=False)
+
+
+def forget(pk):
+    with _lock:
+        _known.pop(pk, None)
@@ -0,0 +1,132 @@
+from django.db import connection
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import ingredient_index, shortlinks
+from .cache import invalidate_receipt, invalidate_receipts
+from .conditional import (REMOVED_INGREDIENTS, REMOVED_RECIPES, REMOVED_TAGS,
+                          mark_removed)
+from .models import (Ingredient, IngredientReceipt, IngredientTombstone,
+                     IngredientTrigram, Receipt, ReceiptTrigram, Tag,
+                     TagReceipt, User)
+from .trigrams import rebuild_trigrams
+
+AUTHOR_FIELDS = frozenset((
+    'email', 'username', 'first_name', 'last_name',
+    'avatar', 'avatar_variants'
+))
+
+
+@receiver(post_save, sender=Receipt)
+def receipt_changed(sender, instance, created, update_fields=None,
+                    **kwargs):
+    invalidate_receipt(
+        instance.pk, author_id=instance.author_id, touched=True)
+    # Переименованный рецепт может выпасть из поиска по названию.
+    if not created and (update_fields is None or 'name' in update_fields):
+        mark_removed(REMOVED_RECIPES)
+
+
+@receiver(post_delete, sender=Receipt)
+def receipt_deleted(sender, instance, **kwargs):
+    invalidate_receipt(
+        instance.pk, author_id=instance.author_id, touched=True)
+    mark_removed(REMOVED_RECIPES)
+    shortlinks.forget(instance.pk)
+
+
+@receiver(post_save, sender=TagReceipt)
+def tag_receipt_saved(sender, instance, **kwargs):
+    invalidate_receipt(instance.receipt_id, tag_ids=(instance.tag_id,))
+
+
+@receiver(post_delete, sender=TagReceipt)
+def tag_receipt_deleted(sender, instance, **kwargs):
+    invalidate_receipt(instance.receipt_id, tag_ids=(instance.tag_id,))
+    mark_removed(REMOVED_RECIPES)
+
+
+@receiver(post_save, sender=IngredientReceipt)
+@receiver(post_delete, sender=IngredientReceipt)
+def ingredient_receipt_changed(sender, instance, **kwargs):
+    invalidate_receipt(instance.receipt_id)
+
+
+@receiver(m2m_changed, sender=Receipt.tags.through)
+def receipt_tags_added(sender, instance, action, reverse, pk_set, **kwargs):
+    # add() создаёт строки через bulk_create без post_save, удаление же
+    # приходит построчно в tag_receipt_changed.
+    if action != 'post_add':
+        return
+    if reverse:
+        for receipt_id in pk_set:
+            invalidate_receipt(receipt_id, tag_ids=(instance.pk,))
+    else:
+        invalidate_receipt(instance.pk, tag_ids=pk_set)
+
+
+@receiver(m2m_changed, sender=Receipt.ingredients.through)
+def receipt_ingredients_added(sender, instance, action, reverse, pk_set,
+                              **kwargs):
+    if action != 'post_add':
+        return
+    for receipt_id in (pk_set if reverse else (instance.pk,)):
+        invalidate_receipt(receipt_id)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, **kwargs):
+    if not created:
+        # Переименованный ингредиент может выпасть из поиска по имени.
+        mark_removed(REMOVED_INGREDIENTS)
+        invalidate_receipts(Receipt.objects.filter(ingredients=instance))
+
+
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_receipts(Receipt.objects.filter(tags=instance))
+
+
+@receiver(post_delete, sender=Tag)
+def tag_deleted(sender, **kwargs):
+    mark_removed(REMOVED_TAGS)
+
+
+@receiver(post_save, sender=User)
+def author_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Вход пользователя сохраняет только last_login — его не видно
+    # в рецептах.
+    if created or (
+            update_fields is not None
+            and AUTHOR_FIELDS.isdisjoint(update_fields)):
+        return
+    invalidate_receipts(Receipt.objects.filter(author=instance))
+
+
+@receiver(post_delete, sender=Ingredient)
+def ingredient_deleted(sender, instance, **kwargs):
+    mark_removed(REMOVED_INGREDIENTS)
+    IngredientTombstone.objects.update_or_create(
+        ingredient_id=instance.pk, defaults={'deleted': timezone.now()})
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_save, sender=Receipt)
+def name_saved(sender, instance, update_fields=None, **kwargs):
+    # На PostgreSQL поиск идёт по GIN-индексу pg_trgm, таблицы не нужны.
+    if connection.vendor == 'postgresql':
+        return
+    if update_fields is not None and 'name' not in update_fields:
+        return
+    if sender is Ingredient:
+        rebuild_trigrams(IngredientTrigram, 'ingredient', (instance,))
+    else:
+        rebuild_trigrams(ReceiptTrigram, 'receipt', (instance,))
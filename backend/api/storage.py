@@ -0,0 +1,96 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from PIL import Image
+
+# Одно расширение на формат: одинаковые байты, присланные как .jpg
+# и .jpeg, должны получить одно имя.
+FORMAT_EXTENSIONS = {
+    'JPEG': '.jpg',
+    'PNG': '.png',
+    'GIF': '.gif',
+    'WEBP': '.webp',
+    'BMP': '.bmp',
+    'TIFF': '.tif',
+}
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под именем из SHA-256 их содержимого.
+
+    Одинаковые загрузки получают одно имя, и повторно файл не пишется:
+    ``recipes/temp.png`` становится ``recipes/3f/a9...e1.png``.
+
+    Счётчиков ссылок хранилище не ведёт: ``collect_media`` считает
+    ссылки из ``Receipt.image`` и ``User.avatar`` в момент сборки и
+    удаляет файлы без ссылок. Хранимый счётчик расходился бы с базой
+    при откате транзакции после записи файла и при ``update()``,
+    минующем сигналы.
+    """
+
+    def extension(self, filename, content):
+        """Расширение по формату изображения, а не по имени от клиента."""
+        try:
+            image_format = Image.open(content).format
+        except (OSError, SyntaxError, ValueError):
+            image_format = None
+        finally:
+            content.seek(0)
+        if image_format is None:
+            return os.path.splitext(filename)[1].lower()
+        return FORMAT_EXTENSIONS.get(
+            image_format, '.' + image_format.lower())
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, filename = os.path.split(name)
+        ext = self.extension(filename, content)
+        digest = digest.hexdigest()
+        return os.path.join(directory, digest[:2], digest[2:] + ext)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(self.generate_filename(name), content)
+        if self.exists(name):
+            if self.size(name) == content.size:
+                # collect_media судит о свежести по mtime: без этого
+                # давно осиротевший файл удалили бы из-под новой ссылки.
+                os.utime(self.path(name))
+                return name
+            # Оборванная запись: тот же хеш при другом размере.
+            self.delete(name)
+        return self._save(name, content)
+
+    def _save(self, name, content):
+        """Пишет во временный файл и публикует его жёсткой ссылкой.
+
+        ``os.link`` не перезаписывает файл: если параллельная загрузка
+        тех же байтов успела первой, ``FileExistsError`` означает, что
+        файл уже есть, и возвращается то же имя без суффикса.
+        """
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(
+            dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(descriptor, 'wb') as temp:
+                for chunk in content.chunks():
+                    temp.write(chunk)
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+            try:
+                os.link(temp_path, full_path)
+            except FileExistsError:
+                os.utime(full_path)
+        finally:
+            os.unlink(temp_path)
+        return name
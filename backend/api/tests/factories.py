@@ -0,0 +1,51 @@
+from rest_framework.test import APIClient
+
+from api.models import Ingredient, IngredientReceipt, Receipt, Tag, TagReceipt
+from users.models import User
+
+IMAGE = 'recipes/test.png'
+
+
+def make_user(name, **extra):
+    return User.objects.create_user(
+        username=name, email=f'{name}@example.com', password='pass12345X',
+        first_name=name, last_name=name, **extra)
+
+
+def make_client(user=None):
+    client = APIClient()
+    if user is not None:
+        client.force_authenticate(user)
+    return client
+
+
+def make_tags(count):
+    return [
+        Tag.objects.create(name=f'Тег {number}', slug=f'tag-{number}')
+        for number in range(count)
+    ]
+
+
+def make_ingredients(count, unit='г'):
+    return [
+        Ingredient.objects.create(
+            name=f'Ингредиент {number}', measurement_unit=unit)
+        for number in range(count)
+    ]
+
+
+def make_recipe(author, ingredients=(), tags=(), name='Рецепт', **extra):
+    """Рецепт без файла изображения: варианты считаются уже готовыми."""
+    receipt = Receipt.objects.create(
+        author=author, name=name, text='Описание', cooking_time=10,
+        image=IMAGE, image_variants={'source': IMAGE}, **extra)
+    IngredientReceipt.objects.bulk_create(
+        IngredientReceipt(
+            receipt=receipt, ingredient=ingredient, amount=amount)
+        for ingredient, amount in ingredients
+    )
+    TagReceipt.objects.bulk_create(
+        TagReceipt(receipt=receipt, tag=tag) for tag in tags)
+    User.objects.filter(pk=author.pk).update(
+        recipes_count=author.author_receipts.count())
+    return receipt
@@ -0,0 +1,107 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from api.constants import BATCH_MAX_SIZE
+from api.models import Favorite, Receipt, ShoppingList, Subscription
+from api.tests.factories import make_client, make_recipe, make_user
+from users.models import User
+
+MISSING = 10 ** 6
+
+
+class BatchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.reader = make_user('reader')
+        cls.recipes = [
+            make_recipe(cls.author, name=f'Рецепт {number}')
+            for number in range(3)
+        ]
+        cls.authors = [cls.author] + [
+            make_user(f'author{number}') for number in range(2)]
+
+    def setUp(self):
+        self.client = make_client(self.reader)
+
+    def send(self, method, url, ids):
+        response = getattr(self.client, method)(
+            url, {'ids': ids}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [
+            (item['id'], item['status'])
+            for item in response.json()['results']
+        ]
+
+    def test_receipt_batches(self):
+        first, second, third = (recipe.pk for recipe in self.recipes)
+        for action, model, field in (
+                ('favorite', Favorite, 'favorites_count'),
+                ('shopping_cart', ShoppingList, 'shopping_cart_count')):
+            url = f'/api/recipes/{action}/batch/'
+            with self.subTest(action=action):
+                model.objects.create(user=self.reader, receipt_id=second)
+                Receipt.objects.filter(pk=second).update(**{field: 1})
+                self.assertEqual(
+                    self.send('post', url, [third, MISSING, second, third,
+                                            first]),
+                    [(third, 'added'), (MISSING, 'not_found'),
+                     (second, 'exists'), (first, 'added')])
+                self.assertEqual(
+                    dict(Receipt.objects.values_list('pk', field)),
+                    {first: 1, second: 1, third: 1})
+                self.assertEqual(
+                    self.send('delete', url, [first, MISSING, first, second]),
+                    [(first, 'removed'), (MISSING, 'not_found'),
+                     (second, 'removed')])
+                self.assertEqual(
+                    self.send('delete', url, [second]), [(second, 'absent')])
+                self.assertEqual(
+                    list(model.objects.values_list('receipt_id', flat=True)),
+                    [third])
+                self.assertEqual(
+                    dict(Receipt.objects.values_list('pk', field)),
+                    {first: 0, second: 0, third: 1})
+
+    def test_subscription_batch(self):
+        url = '/api/users/subscribe/batch/'
+        ids = [author.pk for author in self.authors]
+        self.assertEqual(
+            self.send('post', url, [self.reader.pk, *ids, MISSING]),
+            [(self.reader.pk, 'self'), *((pk, 'added') for pk in ids),
+             (MISSING, 'not_found')])
+        self.assertEqual(
+            self.send('post', url, ids[:1]), [(ids[0], 'exists')])
+        self.assertEqual(
+            self.send('delete', url, ids[1:]),
+            [(pk, 'removed') for pk in ids[1:]])
+        self.assertEqual(
+            list(Subscription.objects.values_list('author_id', flat=True)),
+            ids[:1])
+        self.assertEqual(
+            dict(User.objects.filter(pk__in=ids).values_list(
+                'pk', 'followers_count')),
+            {ids[0]: 1, ids[1]: 0, ids[2]: 0})
+
+    def test_batch_size_does_not_change_query_count(self):
+        url = '/api/recipes/favorite/batch/'
+        counts = []
+        for ids in ([self.recipes[0].pk],
+                    [recipe.pk for recipe in self.recipes[1:]] + [MISSING]):
+            with CaptureQueriesContext(connection) as context:
+                self.send('post', url, ids)
+            counts.append(len(context))
+        # Лишний запрос только один: проверка целей, которые не вставились.
+        self.assertEqual(counts[0] + 1, counts[1])
+
+    def test_invalid_payloads(self):
+        url = '/api/recipes/favorite/batch/'
+        for ids in ([], ['x'], [0], list(range(1, BATCH_MAX_SIZE + 2))):
+            with self.subTest(ids=ids[:3]):
+                response = self.client.post(url, {'ids': ids}, format='json')
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            make_client().post(url, {'ids': [1]}, format='json').status_code,
+            401)
@@ -0,0 +1,106 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from api.cache import ALL_RECIPES, detail_key, generation_key, get_cache
+from api.tests.factories import (make_client, make_ingredients, make_recipe,
+                                 make_tags, make_user)
+
+
+class AnonymousCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.reader = make_user('reader')
+        cls.tags = make_tags(2)
+        ingredients = make_ingredients(1)
+        cls.receipt = make_recipe(
+            cls.author, [(ingredients[0], 10)], cls.tags[:1], name='Суп')
+        cls.other = make_recipe(
+            cls.author, [(ingredients[0], 20)], cls.tags[1:], name='Каша')
+
+    def setUp(self):
+        get_cache().clear()
+        self.anonymous = make_client()
+        self.author_client = make_client(self.author)
+        self.reader_client = make_client(self.reader)
+        self.url = f'/api/recipes/{self.receipt.pk}/'
+
+    def write(self, method, url, data=None, client=None):
+        # Кеш сбрасывается после фиксации транзакции.
+        with self.captureOnCommitCallbacks(execute=True):
+            response = getattr(client or self.author_client, method)(
+                url, data, format='json')
+        self.assertLess(response.status_code, 300, response.content)
+        return response
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.anonymous.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context), response.json()
+
+    def test_repeat_request_is_served_from_cache(self):
+        for url in (self.url, '/api/recipes/'):
+            with self.subTest(url=url):
+                miss, data = self.queries(url)
+                hit, cached = self.queries(url)
+                self.assertLess(hit, miss)
+                self.assertEqual(cached, data)
+
+    def test_detail_key_ignores_leading_zeros(self):
+        self.anonymous.get(f'/api/recipes/0{self.receipt.pk}/')
+        self.assertIsNotNone(get_cache().get(detail_key(self.receipt.pk)))
+        self.write('patch', self.url, {'name': 'Борщ'})
+        response = self.anonymous.get(f'/api/recipes/0{self.receipt.pk}/')
+        self.assertEqual(response.json()['name'], 'Борщ')
+
+    def test_update_invalidates_detail_and_lists(self):
+        urls = (self.url, '/api/recipes/',
+                f'/api/recipes/?tags={self.tags[0].slug}',
+                f'/api/recipes/?author={self.author.pk}')
+        for url in urls:
+            self.anonymous.get(url)
+        self.write('patch', self.url, {'name': 'Борщ'})
+        for url in urls:
+            with self.subTest(url=url):
+                data = self.anonymous.get(url).json()
+                names = [
+                    recipe['name'] for recipe in data.get('results', [data])]
+                self.assertIn('Борщ', names)
+
+    def test_delete_invalidates_lists(self):
+        self.anonymous.get('/api/recipes/')
+        self.write('delete', f'/api/recipes/{self.other.pk}/')
+        ids = [
+            recipe['id']
+            for recipe in self.anonymous.get('/api/recipes/').json()['results']
+        ]
+        self.assertEqual(ids, [self.receipt.pk])
+
+    def test_counters_are_overlaid_without_invalidation(self):
+        self.anonymous.get('/api/recipes/')
+        self.anonymous.get(self.url)
+        keys = [generation_key(ALL_RECIPES), detail_key(self.receipt.pk)]
+        cached = get_cache().get_many(keys)
+        self.write(
+            'post', f'/api/recipes/{self.receipt.pk}/favorite/',
+            client=self.reader_client)
+        self.write(
+            'post', f'/api/recipes/{self.receipt.pk}/shopping_cart/',
+            client=self.reader_client)
+        self.assertEqual(get_cache().get_many(keys), cached)
+        detail = self.anonymous.get(self.url).json()
+        self.assertEqual(
+            (detail['favorites_count'], detail['shopping_cart_count']),
+            (1, 1))
+        listed = {
+            recipe['id']: recipe['favorites_count']
+            for recipe in self.anonymous.get('/api/recipes/').json()['results']
+        }
+        self.assertEqual(listed, {self.receipt.pk: 1, self.other.pk: 0})
+
+    def test_authenticated_requests_bypass_cache(self):
+        self.reader_client.get(self.url)
+        self.assertIsNone(get_cache().get(detail_key(self.receipt.pk)))
@@ -0,0 +1,99 @@
+import gzip
+import json
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from api.models import Ingredient
+from api.tests.factories import make_client, make_ingredients
+
+CATALOG = '/api/ingredients/catalog/'
+
+
+class IngredientCatalogTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ingredients = make_ingredients(3)
+
+    def setUp(self):
+        cache.clear()
+        self.client = make_client()
+
+    def get(self, params=None, **headers):
+        response = self.client.get(CATALOG, params, **headers)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def data(self, params=None):
+        return json.loads(self.get(params).content)
+
+    def test_snapshot_lists_every_ingredient(self):
+        response = self.get()
+        data = json.loads(response.content)
+        self.assertTrue(data['full'])
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(
+            [item['id'] for item in data['ingredients']],
+            [ingredient.pk for ingredient in self.ingredients])
+        self.assertEqual(response['Cache-Control'], 'public, no-cache')
+        pinned = self.get({'version': data['version']})
+        self.assertIn('immutable', pinned['Cache-Control'])
+        self.assertEqual(pinned.content, response.content)
+
+    def test_etag_round_trip(self):
+        etag = self.get()['ETag']
+        response = self.client.get(CATALOG, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        response = self.client.get(CATALOG, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_delta_since_version(self):
+        version = self.data()['version']
+        self.assertEqual(self.data({'since': version})['ingredients'], [])
+        added = Ingredient.objects.create(name='Соль', measurement_unit='г')
+        renamed = Ingredient.objects.get(pk=self.ingredients[0].pk)
+        renamed.name = 'Перец'
+        renamed.save()
+        deleted = self.ingredients[1].pk
+        self.ingredients[1].delete()
+        delta = self.data({'since': version})
+        self.assertFalse(delta['full'])
+        self.assertEqual(delta['count'], 3)
+        self.assertEqual(delta['ingredients'], [
+            {'id': renamed.pk, 'name': 'Перец', 'measurement_unit': 'г'},
+            {'id': added.pk, 'name': 'Соль', 'measurement_unit': 'г'},
+        ])
+        self.assertEqual(delta['deleted'], [deleted])
+        self.assertGreater(delta['version'], version)
+        latest = self.data({'since': delta['version']})
+        self.assertEqual((latest['ingredients'], latest['deleted']), ([], []))
+
+    def test_snapshot_changes_with_version(self):
+        before = self.data()
+        deleted = self.ingredients[2].pk
+        self.ingredients[2].delete()
+        after = self.data()
+        self.assertGreater(after['version'], before['version'])
+        self.assertEqual(after['count'], 2)
+        self.assertNotIn(
+            deleted, [item['id'] for item in after['ingredients']])
+
+    def test_gzip_has_own_etag(self):
+        plain = self.get()
+        compressed = self.get(HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(compressed['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', compressed['Vary'])
+        self.assertTrue(compressed['ETag'].endswith('-gzip"'))
+        self.assertNotEqual(compressed['ETag'], plain['ETag'])
+        self.assertEqual(gzip.decompress(compressed.content), plain.content)
+        response = self.client.get(
+            CATALOG, HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=plain['ETag'])
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            CATALOG, HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=compressed['ETag'])
+        self.assertEqual(response.status_code, 304)
@@ -0,0 +1,93 @@
+import datetime as dt
+import os
+from collections import Counter
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import TestCase
+from django.utils import timezone
+
+from api import clicks, shortlinks
+from api.models import ShortLinkClick
+from api.tests.factories import make_client, make_recipe, make_user
+
+
+class ClickCounterTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.first = make_recipe(cls.author, name='Первый')
+        cls.second = make_recipe(cls.author, name='Второй')
+
+    def setUp(self):
+        # Фоновый поток сброса не запускается: сбрасываем вручную.
+        for name, value in (('_owner_pid', os.getpid()),
+                            ('_pending', Counter())):
+            patcher = mock.patch.object(clicks, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def counts(self):
+        return dict(ShortLinkClick.objects.values_list(
+            'receipt_id', 'count'))
+
+    def visit(self, receipt, times=1):
+        code = shortlinks.encode(receipt.pk)
+        for _ in range(times):
+            self.assertEqual(
+                self.client.get(f'/short/{code}/').status_code, 302)
+
+    def test_clicks_are_counted_in_memory_until_flush(self):
+        self.visit(self.first, 3)
+        self.visit(self.second)
+        self.assertEqual(self.counts(), {})
+        with self.assertNumQueries(2):
+            clicks.flush()
+        self.assertEqual(
+            self.counts(), {self.first.pk: 3, self.second.pk: 1})
+        self.visit(self.first, 2)
+        clicks.flush()
+        self.assertEqual(
+            self.counts(), {self.first.pk: 5, self.second.pk: 1})
+        with self.assertNumQueries(0):
+            clicks.flush()
+
+    def test_clicks_of_deleted_recipe_are_dropped(self):
+        self.visit(self.second)
+        clicks.record(10 ** 6)
+        clicks.flush()
+        self.assertEqual(self.counts(), {self.second.pk: 1})
+
+    def test_failed_flush_keeps_clicks(self):
+        self.visit(self.first, 2)
+        with mock.patch.object(clicks, 'upsert', side_effect=DatabaseError), \
+                self.assertLogs('api.clicks', 'ERROR'):
+            clicks.flush()
+        self.visit(self.first)
+        clicks.flush()
+        self.assertEqual(self.counts(), {self.first.pk: 3})
+
+    def test_stats_for_author(self):
+        today = timezone.localdate()
+        ShortLinkClick.objects.bulk_create([
+            ShortLinkClick(receipt=self.first, day=today, count=4),
+            ShortLinkClick(
+                receipt=self.first, day=today - dt.timedelta(days=3),
+                count=2),
+            ShortLinkClick(
+                receipt=self.first, day=today - dt.timedelta(days=100),
+                count=7),
+        ])
+        url = f'/api/recipes/{self.first.pk}/clicks/'
+        response = make_client(self.author).get(url, {'days': 7})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'total': 13, 'days': [
+            {'day': str(today - dt.timedelta(days=3)), 'count': 2},
+            {'day': str(today), 'count': 4},
+        ]})
+        self.assertEqual(
+            make_client(make_user('reader')).get(url).status_code, 403)
+        self.assertEqual(make_client().get(url).status_code, 401)
+        self.assertEqual(
+            make_client(self.author).get(url, {'days': 0}).status_code, 400)
@@ -0,0 +1,123 @@
+from django.test import TestCase
+
+from api.cache import get_cache
+from api.models import Ingredient, Tag
+from api.tests.factories import (make_client, make_ingredients, make_recipe,
+                                 make_tags, make_user)
+
+
+class ConditionalGetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.reader = make_user('reader')
+        cls.tags = make_tags(2)
+        cls.ingredients = make_ingredients(2)
+        cls.first = make_recipe(
+            cls.author, [(cls.ingredients[0], 10)], cls.tags[:1],
+            name='Первый')
+        cls.second = make_recipe(
+            cls.author, [(cls.ingredients[1], 20)], cls.tags[1:],
+            name='Второй')
+
+    def setUp(self):
+        self.anonymous = make_client()
+        self.author_client = make_client(self.author)
+        self.reader_client = make_client(self.reader)
+
+    def etag(self, url, client=None):
+        response = (client or self.anonymous).get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def assertNotModified(self, url, etag, client=None):
+        response = (client or self.anonymous).get(
+            url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def assertModified(self, url, etag, client=None):
+        response = (client or self.anonymous).get(
+            url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_round_trip(self):
+        for url in ('/api/recipes/', '/api/tags/', '/api/ingredients/'):
+            with self.subTest(url=url):
+                self.assertNotModified(url, self.etag(url))
+
+    def test_detail_round_trip(self):
+        url = f'/api/recipes/{self.first.pk}/'
+        response = self.anonymous.get(url)
+        self.assertNotModified(url, response['ETag'])
+        response = self.anonymous.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_does_not_depend_on_process_cache(self):
+        # Другой воркер начинает с пустым локальным кешем.
+        etag = self.etag('/api/recipes/')
+        get_cache().clear()
+        self.assertNotModified('/api/recipes/', etag)
+
+    def test_create_changes_list(self):
+        etag = self.etag('/api/recipes/')
+        make_recipe(self.author, name='Третий')
+        self.assertModified('/api/recipes/', etag)
+
+    def test_update_changes_list_and_detail(self):
+        url = f'/api/recipes/{self.first.pk}/'
+        list_etag, detail_etag = self.etag('/api/recipes/'), self.etag(url)
+        response = self.author_client.patch(
+            url, {'text': 'Новое описание'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertModified('/api/recipes/', list_etag)
+        self.assertModified(url, detail_etag)
+
+    def test_delete_changes_list_in_every_process(self):
+        etag = self.etag('/api/recipes/')
+        response = self.author_client.delete(
+            f'/api/recipes/{self.second.pk}/')
+        self.assertEqual(response.status_code, 204)
+        get_cache().clear()
+        self.assertModified('/api/recipes/', etag)
+
+    def test_removal_from_filtered_list(self):
+        url = f'/api/recipes/?tags={self.tags[1].slug}'
+        make_recipe(self.author, tags=self.tags[1:], name='Третий')
+        etag = self.etag(url)
+        self.second.tags.remove(self.tags[1])
+        self.assertModified(url, etag)
+
+    def test_related_rows_change_recipe(self):
+        url = f'/api/recipes/{self.first.pk}/'
+        etag = self.etag(url)
+        ingredient = Ingredient.objects.get(pk=self.ingredients[0].pk)
+        ingredient.name = 'Переименованный'
+        # Версия рецептов сдвигается после фиксации транзакции.
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.save()
+        self.assertModified(url, etag)
+        etag = self.etag(url)
+        self.author.first_name = 'Новое'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.save()
+        self.assertModified(url, etag)
+
+    def test_tag_and_ingredient_removal(self):
+        tags_etag = self.etag('/api/tags/')
+        ingredients_etag = self.etag('/api/ingredients/')
+        Tag.objects.create(name='Лишний', slug='extra').delete()
+        Ingredient.objects.create(
+            name='Лишний', measurement_unit='г').delete()
+        self.assertModified('/api/tags/', tags_etag)
+        self.assertModified('/api/ingredients/', ingredients_etag)
+
+    def test_user_state_changes_list(self):
+        etag = self.etag('/api/recipes/', self.reader_client)
+        response = self.reader_client.post(
+            f'/api/recipes/{self.first.pk}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        self.assertModified('/api/recipes/', etag, self.reader_client)
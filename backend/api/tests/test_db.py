@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from api.db import check_connections
+
+
+def make_connection(usable=True):
+    return SimpleNamespace(
+        connection=object(), in_atomic_block=False,
+        is_usable=mock.Mock(return_value=usable), close=mock.Mock())
+
+
+@override_settings(DB_HEALTH_CHECK_INTERVAL=30)
+class CheckConnectionsTest(SimpleTestCase):
+
+    def check(self, connection, now):
+        with mock.patch('api.db.connections') as connections, \
+                mock.patch('api.db.time.monotonic', return_value=now):
+            connections.all.return_value = [connection]
+            check_connections()
+
+    def test_checks_at_most_once_per_interval(self):
+        connection = make_connection()
+        for now in (100, 110, 129):
+            self.check(connection, now)
+        self.assertEqual(connection.is_usable.call_count, 1)
+        self.check(connection, 130)
+        self.assertEqual(connection.is_usable.call_count, 2)
+
+    def test_reopened_connection_is_checked(self):
+        connection = make_connection()
+        self.check(connection, 100)
+        connection.connection = object()
+        self.check(connection, 101)
+        self.assertEqual(connection.is_usable.call_count, 2)
+
+    def test_broken_connection_is_closed(self):
+        connection = make_connection(usable=False)
+        self.check(connection, 100)
+        connection.close.assert_called_once_with()
+
+    def test_skips_closed_and_atomic_connections(self):
+        closed = make_connection()
+        closed.connection = None
+        atomic = make_connection()
+        atomic.in_atomic_block = True
+        for connection in (closed, atomic):
+            self.check(connection, 100)
+            connection.is_usable.assert_not_called()
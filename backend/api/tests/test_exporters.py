@@ -0,0 +1,157 @@
+import io
+import os
+import re
+import struct
+import unittest
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase
+from PIL import Image, ImageDraw, ImageFont
+
+from api import fonts
+from api.exporters import CYRILLIC_LOWER, CYRILLIC_UPPER, PDFWriter
+from api.models import ShoppingList
+from api.tests.factories import (make_client, make_ingredients, make_recipe,
+                                 make_user)
+
+FONT = settings.SHOPPING_LIST_PDF_FONT
+HAS_FONT = bool(FONT) and os.path.exists(FONT)
+ROWS = [('Молоко', 'мл', 200), ('Мука (пшеничная)', 'г', 500)]
+
+
+def render_pdf(rows, font_path=FONT):
+    return b''.join(PDFWriter(font_path).write(rows))
+
+
+def objects(pdf):
+    """Объекты PDF по таблице xref: номер -> смещение."""
+    start = int(re.search(rb'startxref\n(\d+)\n%%EOF\n$', pdf).group(1))
+    assert pdf[start:start + 5] == b'xref\n'
+    first, count = map(int, re.match(
+        rb'xref\n(\d+) (\d+)\n', pdf[start:]).groups())
+    table = pdf[start:].split(b'\n', 2)[2]
+    offsets = {}
+    for number in range(first, first + count):
+        entry = table[number * 20:(number + 1) * 20]
+        offset, _, kind = entry.split()[:3]
+        if kind == b'n':
+            offsets[number] = int(offset)
+    return offsets
+
+
+def glyph_outlines(font):
+    """Длина контура каждого глифа из таблицы loca."""
+    tables = fonts.read_tables(font)
+    count, = struct.unpack_from('>H', tables[b'maxp'], 4)
+    long_loca = struct.unpack_from('>h', tables[b'head'], 50)[0]
+    if long_loca:
+        loca = struct.unpack(f'>{count + 1}I', tables[b'loca'])
+    else:
+        loca = [offset * 2 for offset in struct.unpack(
+            f'>{count + 1}H', tables[b'loca'])]
+    return tables, [loca[glyph + 1] - loca[glyph] for glyph in range(count)]
+
+
+class PDFWriterTest(unittest.TestCase):
+
+    def assertValidXref(self, pdf):
+        offsets = objects(pdf)
+        self.assertTrue(pdf.startswith(b'%PDF-1.4\n'))
+        size = int(re.search(rb'/Size (\d+)', pdf).group(1))
+        self.assertEqual(sorted(offsets), list(range(1, size)))
+        for number, offset in offsets.items():
+            self.assertTrue(
+                pdf[offset:].startswith(f'{number} 0 obj\n'.encode()),
+                number)
+        return offsets
+
+    def test_xref_offsets_without_font(self):
+        self.assertValidXref(render_pdf(ROWS, None))
+
+    def test_xref_offsets_across_pages(self):
+        rows = [(f'Ингредиент {number}', 'г', number) for number in range(120)]
+        pdf = render_pdf(rows, None)
+        self.assertValidXref(pdf)
+        pages = int(re.search(rb'/Type /Pages /Kids \[[^]]*\] /Count (\d+)',
+                              pdf).group(1))
+        self.assertEqual(pages, 3)
+
+    def test_text_is_cp1251(self):
+        pdf = render_pdf(ROWS, None)
+        self.assertIn('(Молоко) Tj'.encode('cp1251'), pdf)
+        self.assertIn(
+            '(Мука \\(пшеничная\\)) Tj'.encode('cp1251'), pdf)
+
+    @unittest.skipUnless(HAS_FONT, 'Нет шрифта SHOPPING_LIST_PDF_FONT')
+    def test_embedded_font_covers_cyrillic(self):
+        pdf = render_pdf(ROWS)
+        offsets = self.assertValidXref(pdf)
+        match = re.search(rb'/FontFile2 (\d+) 0 R', pdf)
+        stream = pdf[offsets[int(match.group(1))]:]
+        length, length1 = map(int, re.search(
+            rb'/Length (\d+) /Length1 (\d+) /Filter /FlateDecode',
+            stream).groups())
+        data = stream[stream.index(b'stream\n') + 7:][:length]
+        font = zlib.decompress(data)
+        self.assertEqual(len(font), length1)
+        self.assertLess(len(pdf), 100 * 1024)
+        tables, outlines = glyph_outlines(font)
+        glyphs = fonts.cmap_glyphs(
+            tables[b'cmap'], CYRILLIC_UPPER + CYRILLIC_LOWER)
+        self.assertEqual(len(glyphs), 66)
+        for glyph in glyphs:
+            self.assertGreater(outlines[glyph], 0, glyph)
+        self.assertEqual(
+            fonts.checksum(font), fonts.CHECKSUM_MAGIC)
+
+    @unittest.skipUnless(HAS_FONT, 'Нет шрифта SHOPPING_LIST_PDF_FONT')
+    def test_subset_renders_like_original(self):
+        with open(FONT, 'rb') as font_file:
+            subset = fonts.subset(
+                font_file.read(), CYRILLIC_UPPER + CYRILLIC_LOWER + '0123')
+        text = 'Съешь ещё 0123'
+
+        def draw(font):
+            image = Image.new('L', (400, 40), 255)
+            ImageDraw.Draw(image).text((0, 0), text, font=font, fill=0)
+            return image.tobytes()
+
+        self.assertEqual(
+            draw(ImageFont.truetype(io.BytesIO(subset), 20)),
+            draw(ImageFont.truetype(FONT, 20)))
+
+
+class ShoppingCartDownloadTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('buyer')
+        ingredients = make_ingredients(2)
+        receipt = make_recipe(
+            cls.user, [(ingredients[0], 10), (ingredients[1], 20)])
+        ShoppingList.objects.create(user=cls.user, receipt=receipt)
+
+    def setUp(self):
+        cache.clear()
+        self.client = make_client(self.user)
+
+    def download(self, export_format, **headers):
+        return self.client.get(
+            f'/api/recipes/download_shopping_cart/?format={export_format}',
+            **headers)
+
+    def test_repeat_download_is_cached(self):
+        for export_format in ('txt', 'csv', 'json', 'pdf'):
+            with self.subTest(export_format=export_format):
+                first = self.download(export_format)
+                self.assertTrue(first.streaming)
+                body = b''.join(first.streaming_content)
+                second = self.download(export_format)
+                self.assertFalse(second.streaming)
+                self.assertEqual(second.content, body)
+                self.assertEqual(second['ETag'], first['ETag'])
+                self.assertEqual(self.download(
+                    export_format, HTTP_IF_NONE_MATCH=first['ETag']
+                ).status_code, 304)
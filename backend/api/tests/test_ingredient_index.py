@@ -0,0 +1,76 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from api import ingredient_index
+from api.models import Ingredient
+from api.tests.factories import (make_client, make_ingredients, make_recipe,
+                                 make_user)
+
+
+class IngredientIndexTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.ingredients = make_ingredients(3)
+        make_recipe(cls.author, [(cls.ingredients[2], 10)])
+
+    def setUp(self):
+        ingredient_index.invalidate()
+        self.client = make_client()
+        self.addCleanup(ingredient_index.invalidate)
+
+    def search(self, name):
+        response = self.client.get('/api/ingredients/', {'name': name})
+        self.assertEqual(response.status_code, 200)
+        return [item['name'] for item in response.json()]
+
+    def in_other_process(self):
+        # Сигналы другого воркера не сбрасывают индекс этого процесса.
+        return mock.patch.object(ingredient_index, 'invalidate')
+
+    def test_search_by_prefix_orders_by_usage(self):
+        self.assertEqual(self.search('ингредиент'), [
+            'Ингредиент 2', 'Ингредиент 0', 'Ингредиент 1'])
+        self.assertEqual(self.search('ИНГРЕДИЕНТ 1'), ['Ингредиент 1'])
+        self.assertEqual(self.search('соль'), [])
+
+    def test_index_is_reused_while_catalog_is_unchanged(self):
+        self.search('ингредиент')
+        index = ingredient_index.get_index()
+        self.assertIs(ingredient_index.get_index(), index)
+
+    def test_create_in_other_process_rebuilds_index(self):
+        self.search('ингредиент')
+        with self.in_other_process():
+            Ingredient.objects.create(
+                name='Ингредиент 3', measurement_unit='г')
+        self.assertIn('Ингредиент 3', self.search('ингредиент'))
+
+    def test_bulk_create_rebuilds_index(self):
+        self.search('соль')
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='Соль', measurement_unit='г')])
+        self.assertEqual(self.search('соль'), ['Соль'])
+
+    def test_rename_in_other_process_rebuilds_index(self):
+        self.search('ингредиент')
+        ingredient = Ingredient.objects.get(pk=self.ingredients[0].pk)
+        ingredient.name = 'Перец'
+        with self.in_other_process():
+            ingredient.save()
+        self.assertEqual(self.search('перец'), ['Перец'])
+        self.assertNotIn('Ингредиент 0', self.search('ингредиент'))
+
+    def test_delete_in_other_process_rebuilds_index(self):
+        self.search('ингредиент')
+        with self.in_other_process():
+            Ingredient.objects.filter(pk=self.ingredients[1].pk).delete()
+        self.assertEqual(
+            self.search('ингредиент'), ['Ингредиент 2', 'Ингредиент 0'])
+
+    def test_index_expires_by_timeout(self):
+        index = ingredient_index.get_index()
+        with self.settings(INGREDIENT_INDEX_TIMEOUT=-1):
+            self.assertIsNot(ingredient_index.get_index(), index)
@@ -0,0 +1,127 @@
+import io
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from api import ingredient_index
+from api.models import Ingredient, IngredientTrigram, Tag
+
+DATA = Path(settings.BASE_DIR).parent / 'data'
+ROWS = [
+    {'name': 'Мука', 'measurement_unit': 'г'},
+    {'name': 'Молоко', 'measurement_unit': 'мл'},
+    {'name': 'Соль', 'measurement_unit': 'г'},
+]
+
+
+class LoadCatalogTest(TestCase):
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.addCleanup(ingredient_index.invalidate)
+
+    def write(self, name, content):
+        path = self.directory / name
+        path.write_text(content, encoding='utf-8')
+        return str(path)
+
+    def load(self, *args):
+        out = io.StringIO()
+        call_command('load_catalog', *args, stdout=out)
+        return out.getvalue()
+
+    def ingredients(self):
+        return sorted(Ingredient.objects.values_list(
+            'name', 'measurement_unit'))
+
+    def expected(self):
+        return sorted((row['name'], row['measurement_unit']) for row in ROWS)
+
+    def test_formats(self):
+        files = {
+            'ingredients.csv': ''.join(
+                f'{row["name"]},{row["measurement_unit"]}\n'
+                for row in ROWS),
+            'with_header.csv': 'measurement_unit,name\n' + ''.join(
+                f'{row["measurement_unit"]},{row["name"]}\n'
+                for row in ROWS),
+            'ingredients.json': json.dumps(ROWS, ensure_ascii=False),
+            'ingredients.ndjson': ''.join(
+                json.dumps(row, ensure_ascii=False) + '\n' for row in ROWS),
+        }
+        for name, content in files.items():
+            with self.subTest(name=name):
+                Ingredient.objects.all().delete()
+                output = self.load(self.write(name, content))
+                self.assertEqual(self.ingredients(), self.expected())
+                self.assertIn('добавлено 3', output)
+
+    def test_json_is_streamed_across_reads_and_batches(self):
+        path = self.write(
+            'ingredients.json', json.dumps(ROWS, ensure_ascii=False))
+        with mock.patch(
+                'api.management.commands.load_catalog.READ_SIZE', 7):
+            self.load(path, '--batch-size', '2')
+        self.assertEqual(self.ingredients(), self.expected())
+
+    def test_rerun_adds_nothing(self):
+        path = self.write(
+            'ingredients.json', json.dumps(ROWS, ensure_ascii=False))
+        self.load(path)
+        output = self.load(path, '--batch-size', '1')
+        self.assertIn('добавлено 0', output)
+        self.assertEqual(self.ingredients(), self.expected())
+
+    def test_invalid_rows_are_skipped(self):
+        path = self.write('ingredients.ndjson', '\n'.join((
+            json.dumps(ROWS[0], ensure_ascii=False),
+            '[1, 2]',
+            json.dumps({'name': 'Перец'}, ensure_ascii=False),
+            json.dumps({'name': 'П' * 300, 'measurement_unit': 'г'}),
+        )))
+        output = self.load(path)
+        self.assertIn('пропущено 3', output)
+        self.assertEqual(self.ingredients(), [('Мука', 'г')])
+
+    def test_new_ingredients_are_searchable(self):
+        ingredient_index.get_index()
+        self.load(self.write(
+            'ingredients.json', json.dumps(ROWS, ensure_ascii=False)))
+        self.assertEqual(
+            [item['name'] for item in ingredient_index.get_index().search(
+                'мо', 10)], ['Молоко'])
+        self.assertTrue(IngredientTrigram.objects.filter(
+            ingredient__name='Молоко').exists())
+
+    def test_tags_update_names(self):
+        Tag.objects.create(name='Завтрак', slug='breakfast')
+        self.load(self.write('tags.csv', (
+            'name,slug\nУтро,breakfast\nОбед,lunch\n')))
+        self.assertEqual(
+            sorted(Tag.objects.values_list('slug', 'name')),
+            [('breakfast', 'Утро'), ('lunch', 'Обед')])
+
+    def test_repository_data(self):
+        for name in ('ingredients.csv', 'ingredients.json'):
+            self.load(str(DATA / name))
+        with open(DATA / 'ingredients.json', encoding='utf-8') as file:
+            expected = {
+                (row['name'], row['measurement_unit'])
+                for row in json.load(file)
+            }
+        self.assertEqual(set(self.ingredients()), expected)
+
+    def test_errors(self):
+        with self.assertRaisesMessage(CommandError, 'укажите --format'):
+            self.load(self.write('ingredients.xml', ''))
+        with self.assertRaisesMessage(CommandError, 'JSON-массив'):
+            self.load(self.write('ingredients.json', '{"name": "Мука"}'))
+        with self.assertRaisesMessage(CommandError, 'Строка 2'):
+            self.load(self.write('ingredients.ndjson', '{}\n{\n'))
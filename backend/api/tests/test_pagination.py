@@ -0,0 +1,112 @@
+import datetime as dt
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from api.models import Favorite, Receipt
+from api.tests.factories import make_client, make_recipe, make_tags, make_user
+
+FEED = '/api/recipes/'
+
+
+class KeysetPaginationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.reader = make_user('reader')
+        cls.tags = make_tags(2)
+        start = timezone.now() - dt.timedelta(days=1)
+        cls.recipes = []
+        for number in range(7):
+            receipt = make_recipe(
+                cls.author, tags=cls.tags[number % 2:number % 2 + 1],
+                name=f'Рецепт {number}')
+            # Пары рецептов с одной датой: порядок решает id.
+            Receipt.objects.filter(pk=receipt.pk).update(
+                pub_date=start + dt.timedelta(minutes=number // 2))
+            cls.recipes.append(receipt)
+        for receipt in cls.recipes[::3]:
+            Favorite.objects.create(user=cls.reader, receipt=receipt)
+
+    def setUp(self):
+        # Запросы с авторизацией минуют кеш анонимной ленты.
+        self.client = make_client(self.reader)
+
+    def expected(self, **filters):
+        return list(Receipt.objects.filter(**filters).order_by(
+            '-pub_date', '-id').values_list('pk', flat=True))
+
+    def get(self, url, params=None):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        self.assertNotIn('count', data)
+        return data
+
+    def walk(self, params):
+        data = self.get(FEED, params)
+        pages = [[recipe['id'] for recipe in data['results']]]
+        while data['next']:
+            data = self.get(data['next'])
+            pages.append([recipe['id'] for recipe in data['results']])
+        return pages, data
+
+    def test_walks_feed_in_index_order(self):
+        pages, last = self.walk({'limit': 2})
+        self.assertEqual(sum(pages, []), self.expected())
+        self.assertEqual([len(page) for page in pages], [2, 2, 2, 1])
+        self.assertIsNotNone(last['previous'])
+
+    def test_previous_link_returns_same_page(self):
+        first = self.get(FEED, {'limit': 3})
+        self.assertIsNone(first['previous'])
+        second = self.get(first['next'])
+        back = self.get(second['previous'])
+        self.assertEqual(back['results'], first['results'])
+        self.assertIsNone(back['previous'])
+        self.assertEqual(self.get(back['next'])['results'],
+                         second['results'])
+
+    def test_inserts_do_not_shift_pages(self):
+        first = self.get(FEED, {'limit': 3})
+        expected = self.expected()[3:6]
+        make_recipe(self.author, name='Новый')
+        second = self.get(first['next'])
+        self.assertEqual(
+            [recipe['id'] for recipe in second['results']], expected)
+        back = self.get(second['previous'])
+        self.assertEqual(back['results'], first['results'])
+        self.assertIsNotNone(back['previous'])
+
+    def test_filters_combine_with_cursor(self):
+        pages, _ = self.walk({
+            'limit': 1, 'tags': self.tags[0].slug, 'is_favorited': 1})
+        self.assertEqual(sum(pages, []), self.expected(
+            tags=self.tags[0], favorites_of_users__user=self.reader))
+        pages, _ = self.walk({
+            'limit': 2, 'tags': [tag.slug for tag in self.tags]})
+        self.assertEqual(sum(pages, []), self.expected())
+
+    def test_cursor_page_runs_no_count(self):
+        first = self.get(FEED, {'limit': 2})
+        with CaptureQueriesContext(connection) as context:
+            self.get(first['next'])
+        sql = ' '.join(query['sql'] for query in context).upper()
+        self.assertNotIn('__COUNT', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_page_number_mode_for_old_clients(self):
+        data = self.client.get(FEED, {'page': 2, 'limit': 3}).json()
+        self.assertEqual(data['count'], len(self.recipes))
+        self.assertEqual(
+            [recipe['id'] for recipe in data['results']],
+            self.expected()[3:6])
+
+    def test_invalid_cursor(self):
+        for cursor in ('garbage', 'eyJwIjpbXX0='):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(FEED, {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
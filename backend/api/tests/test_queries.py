@@ -0,0 +1,139 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.cache import get_cache
+from api.models import (Favorite, Ingredient, IngredientReceipt, Receipt,
+                        ShoppingList, Subscription, Tag, TagReceipt)
+from users.models import User
+
+AUTHORS = 12
+RECIPES_PER_AUTHOR = 3
+
+
+class QueryCountTestCase(TestCase):
+    """Число запросов к базе не должно зависеть от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        tags = [
+            Tag.objects.create(name=f'Тег {number}', slug=f'tag-{number}')
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(5)
+        ]
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com')
+        cls.authors = [
+            User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+                recipes_count=RECIPES_PER_AUTHOR
+            )
+            for number in range(AUTHORS)
+        ]
+        for number, author in enumerate(cls.authors):
+            for index in range(RECIPES_PER_AUTHOR):
+                receipt = Receipt.objects.create(
+                    author=author, name=f'Рецепт {number}-{index}',
+                    text='Описание', cooking_time=10,
+                    image='recipes/test.png'
+                )
+                IngredientReceipt.objects.bulk_create(
+                    IngredientReceipt(
+                        receipt=receipt, ingredient=ingredient, amount=10)
+                    for ingredient in ingredients[index:index + 2]
+                )
+                TagReceipt.objects.bulk_create(
+                    TagReceipt(receipt=receipt, tag=tag)
+                    for tag in tags[index:index + 2]
+                )
+                if number % 2:
+                    Favorite.objects.create(user=cls.reader, receipt=receipt)
+                    ShoppingList.objects.create(
+                        user=cls.reader, receipt=receipt)
+        Subscription.objects.bulk_create(
+            Subscription(user=cls.reader, author=author)
+            for author in cls.authors[::2]
+        )
+
+    def setUp(self):
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def count_queries(self, client, url):
+        # Иначе анонимный ответ пришёл бы из кеша без запросов к базе.
+        get_cache().clear()
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def assertConstantQueries(self, client, small_url, large_url):
+        expected = self.count_queries(client, small_url)
+        get_cache().clear()
+        with self.assertNumQueries(expected):
+            response = client.get(large_url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+
+class ReceiptListQueriesTest(QueryCountTestCase):
+
+    def test_anonymous_list(self):
+        data = self.assertConstantQueries(
+            self.anonymous, '/api/recipes/?limit=2', '/api/recipes/?limit=30')
+        self.assertEqual(len(data['results']), 30)
+
+    def test_authenticated_list(self):
+        data = self.assertConstantQueries(
+            self.client, '/api/recipes/?limit=2', '/api/recipes/?limit=30')
+        self.assertEqual(len(data['results']), 30)
+        favorited = set(Favorite.objects.filter(
+            user=self.reader).values_list('receipt_id', flat=True))
+        self.assertEqual(
+            {recipe['id'] for recipe in data['results']
+             if recipe['is_favorited']},
+            {recipe['id'] for recipe in data['results']} & favorited
+        )
+
+
+class UserListQueriesTest(QueryCountTestCase):
+
+    def test_anonymous_list(self):
+        data = self.assertConstantQueries(
+            self.anonymous, '/api/users/?limit=2', '/api/users/?limit=100')
+        self.assertEqual(len(data['results']), AUTHORS + 1)
+
+    def test_authenticated_list(self):
+        data = self.assertConstantQueries(
+            self.client, '/api/users/?limit=2', '/api/users/?limit=100')
+        self.assertEqual(
+            sum(user['is_subscribed'] for user in data['results']),
+            len(self.authors[::2])
+        )
+
+    def test_subscriptions(self):
+        data = self.assertConstantQueries(
+            self.client,
+            '/api/users/subscriptions/?limit=1&recipes_limit=1',
+            '/api/users/subscriptions/?limit=100&recipes_limit=2'
+        )
+        self.assertEqual(len(data['results']), len(self.authors[::2]))
+        for subscription in data['results']:
+            self.assertEqual(len(subscription['recipes']), 2)
+
+    def test_subscriptions_without_limit(self):
+        data = self.assertConstantQueries(
+            self.client,
+            '/api/users/subscriptions/?limit=1',
+            '/api/users/subscriptions/?limit=100'
+        )
+        for subscription in data['results']:
+            self.assertEqual(
+                len(subscription['recipes']), RECIPES_PER_AUTHOR)
@@ -0,0 +1,112 @@
+import io
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from api.models import Ingredient, LegacyShortLink, Receipt, Tag
+from api.tests.factories import (make_ingredients, make_recipe, make_tags,
+                                 make_user)
+from users.models import User
+
+
+class RecipeTransferTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.cook = make_user('cook')
+        tags = make_tags(2)
+        ingredients = make_ingredients(3)
+        for number in range(5):
+            receipt = make_recipe(
+                (cls.author, cls.cook)[number % 2],
+                [(ingredients[number % 3], 10 + number),
+                 (ingredients[(number + 1) % 3], 20)],
+                tags[:number % 3], name=f'Рецепт {number}')
+            LegacyShortLink.objects.create(
+                receipt=receipt, code=f'old{number}')
+
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = str(self.directory / 'recipes.ndjson')
+
+    def export(self, *args):
+        call_command(
+            'export_recipes', '--output', self.path, *args,
+            stderr=io.StringIO())
+        return self.lines()
+
+    def lines(self):
+        with open(self.path, encoding='utf-8') as file:
+            return file.read().splitlines()
+
+    def import_(self, *args):
+        out = io.StringIO()
+        call_command(
+            'import_recipes', self.path, *args, stdout=out,
+            stderr=io.StringIO())
+        return out.getvalue()
+
+    def test_round_trip(self):
+        exported = self.export('--chunk-size', '2')
+        self.assertEqual(len(exported), 5)
+        self.assertEqual(
+            [json.loads(line)['id'] for line in exported],
+            sorted(Receipt.objects.values_list('pk', flat=True)))
+        Receipt.objects.all().delete()
+        Tag.objects.all().delete()
+        Ingredient.objects.all().delete()
+        output = self.import_('--chunk-size', '2')
+        self.assertIn('Добавлено рецептов: 5', output)
+        self.assertEqual(self.export(), exported)
+        self.assertEqual(
+            sorted(User.objects.values_list('username', 'recipes_count')),
+            [('author', 3), ('cook', 2)])
+
+    def test_import_skips_existing_recipes(self):
+        self.export()
+        self.assertIn('уже были: 5', self.import_())
+        self.assertEqual(Receipt.objects.count(), 5)
+
+    def test_import_resumes_from_line(self):
+        exported = self.export()
+        Receipt.objects.all().delete()
+        output = self.import_('--start-line', '3')
+        self.assertIn('Добавлено рецептов: 2', output)
+        self.assertEqual(
+            sorted(Receipt.objects.values_list('pk', flat=True)),
+            [json.loads(line)['id'] for line in exported[3:]])
+
+    def test_export_resumes_after_partial_line(self):
+        exported = self.export()
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(exported[:2]) + '\n' + exported[2][:15])
+        self.export('--start-line', '2')
+        self.assertEqual(self.lines(), exported)
+        with self.assertRaisesMessage(CommandError, 'целых строк'):
+            self.export('--start-line', '10')
+
+    def test_recipes_without_author_are_reported(self):
+        self.export()
+        Receipt.objects.all().delete()
+        User.objects.filter(username='cook').delete()
+        output = self.import_()
+        self.assertIn('Добавлено рецептов: 3', output)
+        self.assertIn('без автора: 2', output)
+
+    def test_invalid_amount_rolls_back_chunk(self):
+        exported = self.export()
+        Receipt.objects.all().delete()
+        broken = json.loads(exported[1])
+        broken['ingredients'][0]['amount'] = 0
+        exported[1] = json.dumps(broken, ensure_ascii=False)
+        with open(self.path, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(exported) + '\n')
+        with self.assertRaisesMessage(CommandError, 'Строка 2'):
+            self.import_('--chunk-size', '2')
+        self.assertFalse(Receipt.objects.exists())
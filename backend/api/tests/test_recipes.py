@@ -0,0 +1,67 @@
+from django.test import TestCase
+
+from api.models import IngredientReceipt, TagReceipt
+from api.tests.factories import (make_client, make_ingredients, make_recipe,
+                                 make_tags, make_user)
+
+
+class ReceiptUpdateTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.tags = make_tags(3)
+        cls.ingredients = make_ingredients(4)
+        cls.receipt = make_recipe(
+            cls.author,
+            ingredients=[(cls.ingredients[0], 10), (cls.ingredients[1], 20)],
+            tags=cls.tags[:2]
+        )
+
+    def setUp(self):
+        self.client = make_client(self.author)
+        self.url = f'/api/recipes/{self.receipt.pk}/'
+
+    def rows(self):
+        return (
+            list(IngredientReceipt.objects.filter(
+                receipt=self.receipt).order_by('pk').values_list(
+                    'pk', 'ingredient_id', 'amount')),
+            list(TagReceipt.objects.filter(
+                receipt=self.receipt).order_by('pk').values_list(
+                    'pk', 'tag_id')),
+        )
+
+    def test_patch_text_only_keeps_relations(self):
+        before = self.rows()
+        response = self.client.patch(
+            self.url, {'text': 'Новое описание'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['text'], 'Новое описание')
+        self.assertEqual(self.rows(), before)
+
+    def test_patch_ingredients_updates_by_diff(self):
+        (kept, changed), _ = self.rows()
+        response = self.client.patch(self.url, {'ingredients': [
+            {'id': self.ingredients[0].pk, 'amount': 10},
+            {'id': self.ingredients[1].pk, 'amount': 25},
+            {'id': self.ingredients[2].pk, 'amount': 5},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        ingredients, _ = self.rows()
+        self.assertEqual(ingredients[:2], [kept, (changed[0], changed[1], 25)])
+        self.assertEqual(ingredients[2][1:], (self.ingredients[2].pk, 5))
+
+    def test_patch_validates_sent_fields(self):
+        response = self.client.patch(
+            self.url, {'tags': [self.tags[0].pk, self.tags[0].pk]},
+            format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(
+            self.url, {'ingredients': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_put_requires_all_fields(self):
+        response = self.client.put(
+            self.url, {'text': 'Новое описание'}, format='json')
+        self.assertEqual(response.status_code, 400)
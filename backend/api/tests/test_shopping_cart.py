@@ -0,0 +1,132 @@
+import io
+import json
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from api.models import ShoppingCartItem
+from api.shopping_cart import live_totals
+from api.tests.factories import (make_client, make_ingredients, make_recipe,
+                                 make_user)
+
+
+class ShoppingCartAggregateTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.buyer = make_user('buyer')
+        cls.other = make_user('other')
+        cls.flour, cls.milk, cls.salt = make_ingredients(3)
+        cls.pancakes = make_recipe(
+            cls.author, [(cls.flour, 200), (cls.milk, 300)], name='Блины')
+        cls.bread = make_recipe(
+            cls.author, [(cls.flour, 500), (cls.salt, 5)], name='Хлеб')
+
+    def setUp(self):
+        cache.clear()
+        self.client = make_client(self.buyer)
+
+    def cart(self, user=None):
+        return {
+            ingredient_id: (total, recipes)
+            for ingredient_id, total, recipes
+            in ShoppingCartItem.objects.filter(
+                user=user or self.buyer
+            ).values_list('ingredient_id', 'total_amount', 'recipe_count')
+        }
+
+    def assertMatchesLive(self, user=None):
+        user = user or self.buyer
+        live = {
+            row['ingredient']: (row['total'], row['recipes'])
+            for row in live_totals([user.pk])
+        }
+        self.assertEqual(self.cart(user), live)
+
+    def add(self, receipt, client=None):
+        response = (client or self.client).post(
+            f'/api/recipes/{receipt.pk}/shopping_cart/')
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def download(self):
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/?format=json')
+        self.assertEqual(response.status_code, 200)
+        return {
+            row['name']: row['amount'] for row in json.loads(
+                b''.join(response.streaming_content))
+        }
+
+    def test_add_and_remove_update_aggregate(self):
+        self.add(self.pancakes)
+        self.add(self.bread)
+        self.assertEqual(self.cart(), {
+            self.flour.pk: (700, 2), self.milk.pk: (300, 1),
+            self.salt.pk: (5, 1)})
+        self.assertMatchesLive()
+        self.assertEqual(self.download(), {
+            self.flour.name: 700, self.milk.name: 300, self.salt.name: 5})
+        response = self.client.delete(
+            f'/api/recipes/{self.pancakes.pk}/shopping_cart/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.cart(), {
+            self.flour.pk: (500, 1), self.salt.pk: (5, 1)})
+        self.assertMatchesLive()
+
+    def test_batch_add_and_remove(self):
+        url = '/api/recipes/shopping_cart/batch/'
+        ids = {'ids': [self.pancakes.pk, self.bread.pk]}
+        self.assertEqual(
+            self.client.post(url, ids, format='json').status_code, 200)
+        self.assertMatchesLive()
+        self.assertEqual(
+            self.client.delete(url, ids, format='json').status_code, 200)
+        self.assertEqual(self.cart(), {})
+
+    def test_other_users_are_not_affected(self):
+        self.add(self.pancakes)
+        self.add(self.bread, make_client(self.other))
+        self.assertEqual(self.cart(self.other), {
+            self.flour.pk: (500, 1), self.salt.pk: (5, 1)})
+        self.assertMatchesLive()
+
+    def test_recipe_edit_recomputes_carts(self):
+        self.add(self.pancakes)
+        self.add(self.bread)
+        self.download()
+        response = make_client(self.author).patch(
+            f'/api/recipes/{self.pancakes.pk}/', {'ingredients': [
+                {'id': self.flour.pk, 'amount': 250},
+                {'id': self.salt.pk, 'amount': 2},
+            ]}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.cart(), {
+            self.flour.pk: (750, 2), self.salt.pk: (7, 2)})
+        self.assertMatchesLive()
+        self.assertEqual(self.download(), {
+            self.flour.name: 750, self.salt.name: 7})
+
+    def test_recipe_delete_recomputes_carts(self):
+        self.add(self.pancakes)
+        self.add(self.bread)
+        response = make_client(self.author).delete(
+            f'/api/recipes/{self.bread.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.cart(), {
+            self.flour.pk: (200, 1), self.milk.pk: (300, 1)})
+
+    def test_check_command_finds_and_fixes_drift(self):
+        self.add(self.pancakes)
+        ShoppingCartItem.objects.filter(
+            user=self.buyer, ingredient=self.flour).update(total_amount=1)
+        out = io.StringIO()
+        call_command('check_shopping_carts', stdout=out)
+        self.assertIn('с расхождениями: 1', out.getvalue())
+        self.assertEqual(self.cart()[self.flour.pk], (1, 1))
+        call_command('check_shopping_carts', '--fix', stdout=out)
+        self.assertMatchesLive()
+        out = io.StringIO()
+        call_command('check_shopping_carts', stdout=out)
+        self.assertIn('с расхождениями: 0', out.getvalue())
@@ -0,0 +1,85 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from api import shortlinks
+from api.models import LegacyShortLink
+from api.tests.factories import make_client, make_recipe, make_user
+
+
+class ShortLinkCodeTest(SimpleTestCase):
+
+    def test_round_trip(self):
+        pks = [*range(1, 2000), 10 ** 6, shortlinks.CODE_SPACE - 1]
+        codes = [shortlinks.encode(pk) for pk in pks]
+        self.assertEqual(len(set(codes)), len(pks))
+        for pk, code in zip(pks, codes):
+            self.assertEqual(len(code), shortlinks.CODE_LENGTH)
+            self.assertEqual(shortlinks.decode(code), pk)
+
+    def test_neighbours_get_unrelated_codes(self):
+        self.assertNotEqual(
+            shortlinks.encode(1)[:4], shortlinks.encode(2)[:4])
+
+    def test_foreign_codes(self):
+        for code in ('', 'abc', 'abcdefg', 'abc-ef', '1a2b3c4d'):
+            with self.subTest(code=code):
+                self.assertIsNone(shortlinks.decode(code))
+        for pk in (0, -1, shortlinks.CODE_SPACE):
+            with self.subTest(pk=pk), self.assertRaises(ValueError):
+                shortlinks.encode(pk)
+
+
+@mock.patch('api.views.clicks.record')
+class ShortLinkRedirectTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.receipt = make_recipe(make_user('author'))
+        LegacyShortLink.objects.create(receipt=cls.receipt, code='a1b2c3d4')
+
+    def setUp(self):
+        shortlinks.forget(self.receipt.pk)
+        self.client = make_client()
+        self.code = shortlinks.encode(self.receipt.pk)
+
+    def redirect(self, code):
+        return self.client.get(f'/short/{code}/')
+
+    def test_get_link_writes_nothing(self, record):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(
+                f'/api/recipes/{self.receipt.pk}/get-link/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['short-link'].endswith(
+            f'/short/{self.code}'))
+        self.assertTrue(all(
+            query['sql'].startswith('SELECT') for query in context))
+
+    def test_redirect_skips_database_when_known(self, record):
+        response = self.redirect(self.code)
+        self.assertRedirects(
+            response, f'/recipes/{self.receipt.pk}/',
+            fetch_redirect_response=False)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.redirect(self.code).status_code, 302)
+        record.assert_called_with(self.receipt.pk)
+
+    def test_legacy_code(self, record):
+        response = self.redirect('a1b2c3d4')
+        self.assertRedirects(
+            response, f'/recipes/{self.receipt.pk}/',
+            fetch_redirect_response=False)
+
+    def test_unknown_and_deleted_recipes(self, record):
+        self.assertEqual(self.redirect('zzzzzzzz').status_code, 404)
+        self.assertEqual(
+            self.redirect(shortlinks.encode(self.receipt.pk + 1)).status_code,
+            404)
+        self.assertEqual(self.redirect(self.code).status_code, 302)
+        self.receipt.delete()
+        self.assertEqual(self.redirect(self.code).status_code, 404)
+        self.assertEqual(self.redirect('a1b2c3d4').status_code, 404)
+        record.assert_called_once()
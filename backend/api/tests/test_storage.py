@@ -0,0 +1,75 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+from PIL import Image
+
+from api.storage import ContentAddressedStorage
+
+
+def make_image(color='red', image_format='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (4, 4), color).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class ContentAddressedStorageTest(SimpleTestCase):
+
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.location)
+            for root, _, names in os.walk(self.location) for name in names)
+
+    def save(self, data, name='recipes/temp.png'):
+        return self.storage.save(name, ContentFile(data))
+
+    def test_same_content_is_stored_once(self):
+        data = make_image()
+        name = self.save(data)
+        self.assertRegex(name, r'^recipes/[0-9a-f]{2}/[0-9a-f]{62}\.png$')
+        self.assertEqual(self.save(data, 'recipes/temp.jpg'), name)
+        self.assertEqual(self.files(), [name])
+        self.assertNotEqual(self.save(make_image('blue')), name)
+
+    def test_extension_follows_content(self):
+        name = self.save(make_image(image_format='JPEG'), 'recipes/a.png')
+        self.assertTrue(name.endswith('.jpg'))
+        name = self.save(b'plain text', 'recipes/notes.TXT')
+        self.assertTrue(name.endswith('.txt'))
+
+    def test_dedupe_hit_refreshes_mtime(self):
+        data = make_image()
+        name = self.save(data)
+        os.utime(self.storage.path(name), (0, 0))
+        self.save(data)
+        self.assertGreater(os.path.getmtime(self.storage.path(name)), 0)
+
+    def test_concurrent_save_is_a_dedupe_hit(self):
+        data = make_image()
+        name = self.save(data)
+        os.utime(self.storage.path(name), (0, 0))
+        # Параллельная загрузка записала файл после проверки exists.
+        with mock.patch.object(self.storage, 'exists', return_value=False):
+            self.assertEqual(self.save(data), name)
+        self.assertEqual(self.files(), [name])
+        self.assertGreater(os.path.getmtime(self.storage.path(name)), 0)
+        with self.storage.open(name) as stored:
+            self.assertEqual(stored.read(), data)
+
+    def test_truncated_file_is_replaced(self):
+        data = make_image()
+        name = self.save(data)
+        with open(self.storage.path(name), 'wb') as stored:
+            stored.write(data[:10])
+        self.assertEqual(self.save(data), name)
+        with self.storage.open(name) as stored:
+            self.assertEqual(stored.read(), data)
@@ -0,0 +1,120 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from api.models import Favorite, Receipt, ShoppingList, Subscription
+from api.tests.factories import make_client, make_recipe, make_user
+from users.models import User
+
+MISSING = 10 ** 6
+
+
+class ReceiptToggleTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.reader = make_user('reader')
+        cls.receipt = make_recipe(cls.author, name='Суп')
+
+    def setUp(self):
+        self.client = make_client(self.reader)
+
+    def url(self, action, pk=None):
+        return f'/api/recipes/{pk or self.receipt.pk}/{action}/'
+
+    def counter(self, field):
+        return Receipt.objects.values_list(field, flat=True).get(
+            pk=self.receipt.pk)
+
+    def test_add_and_remove(self):
+        for action, model, field in (
+                ('favorite', Favorite, 'favorites_count'),
+                ('shopping_cart', ShoppingList, 'shopping_cart_count')):
+            with self.subTest(action=action):
+                response = self.client.post(self.url(action))
+                self.assertEqual(response.status_code, 201)
+                data = response.json()
+                self.assertEqual(
+                    (data['id'], data['name'], data['cooking_time']),
+                    (self.receipt.pk, 'Суп', 10))
+                self.assertEqual(self.counter(field), 1)
+                self.assertEqual(
+                    self.client.post(self.url(action)).status_code, 400)
+                self.assertEqual(self.counter(field), 1)
+                self.assertEqual(
+                    self.client.delete(self.url(action)).status_code, 204)
+                self.assertEqual(
+                    self.client.delete(self.url(action)).status_code, 400)
+                self.assertEqual(self.counter(field), 0)
+                self.assertFalse(model.objects.exists())
+
+    def test_missing_recipe_is_404(self):
+        for action in ('favorite', 'shopping_cart'):
+            for method in ('post', 'delete'):
+                with self.subTest(action=action, method=method):
+                    response = getattr(self.client, method)(
+                        self.url(action, MISSING))
+                    self.assertEqual(response.status_code, 404)
+
+    def test_recipe_deleted_during_add_is_404(self):
+        # Рецепт удалён между INSERT связи и UPDATE счётчика.
+        with mock.patch('api.views.increment_returning', return_value=None):
+            response = self.client.post(self.url('favorite'))
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_add_runs_constant_queries(self):
+        # INSERT/DELETE связи и UPDATE счётчика плюс SAVEPOINT и RELEASE.
+        with self.assertNumQueries(4):
+            self.client.post(self.url('favorite'))
+        with self.assertNumQueries(4):
+            self.client.delete(self.url('favorite'))
+
+
+class SubscribeToggleTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.reader = make_user('reader')
+        make_recipe(cls.author, name='Суп')
+        make_recipe(cls.author, name='Каша')
+
+    def setUp(self):
+        self.client = make_client(self.reader)
+        self.url = f'/api/users/{self.author.pk}/subscribe/'
+
+    def followers(self):
+        return User.objects.values_list('followers_count', flat=True).get(
+            pk=self.author.pk)
+
+    def test_subscribe_and_unsubscribe(self):
+        response = self.client.post(f'{self.url}?recipes_limit=1')
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(
+            (data['id'], data['recipes_count'], len(data['recipes'])),
+            (self.author.pk, 2, 1))
+        self.assertTrue(data['is_subscribed'])
+        self.assertEqual(self.followers(), 1)
+        self.assertEqual(self.client.post(self.url).status_code, 400)
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertEqual(self.client.delete(self.url).status_code, 400)
+        self.assertEqual(self.followers(), 0)
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_self_subscription_is_rejected(self):
+        response = make_client(self.author).post(self.url)
+        self.assertEqual(response.status_code, 400)
+
+    def test_missing_author_is_404(self):
+        url = f'/api/users/{MISSING}/subscribe/'
+        self.assertEqual(self.client.post(url).status_code, 404)
+        self.assertEqual(self.client.delete(url).status_code, 404)
+
+    def test_author_deleted_during_subscribe_is_404(self):
+        with mock.patch('api.views.increment_returning', return_value=None):
+            response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Subscription.objects.exists())
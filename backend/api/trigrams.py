@@ -0,0 +1,77 @@
+import re
+
+WORD = re.compile(r'\w+')
+LATIN_TO_CYRILLIC = (
+    ('shch', 'щ'), ('sch', 'щ'), ('yo', 'ё'), ('zh', 'ж'), ('kh', 'х'),
+    ('ts', 'ц'), ('ch', 'ч'), ('sh', 'ш'), ('yu', 'ю'), ('ya', 'я'),
+    ('a', 'а'), ('b', 'б'), ('v', 'в'), ('g', 'г'), ('d', 'д'),
+    ('e', 'е'), ('z', 'з'), ('i', 'и'), ('j', 'й'), ('k', 'к'),
+    ('l', 'л'), ('m', 'м'), ('n', 'н'), ('o', 'о'), ('p', 'п'),
+    ('r', 'р'), ('s', 'с'), ('t', 'т'), ('u', 'у'), ('f', 'ф'),
+    ('h', 'х'), ('c', 'к'), ('y', 'ы'), ('w', 'в'), ('x', 'кс'),
+    ('q', 'к'),
+)
+TRANSLIT = re.compile('|'.join(latin for latin, _ in LATIN_TO_CYRILLIC))
+CYRILLIC = dict(LATIN_TO_CYRILLIC)
+
+
+def trigrams(text):
+    """Триграммы строки по правилам pg_trgm.
+
+    Каждое слово в нижнем регистре дополняется двумя пробелами
+    в начале и одним в конце.
+    """
+    result = set()
+    for word in WORD.findall(text.lower()):
+        padded = f'  {word} '
+        result.update(
+            padded[position:position + 3]
+            for position in range(len(padded) - 2)
+        )
+    return result
+
+
+def query_variants(query):
+    """Запрос и, если он набран латиницей, его транслитерация."""
+    variants = [query]
+    lowered = query.lower()
+    if re.search('[a-z]', lowered) and not re.search('[а-яё]', lowered):
+        variants.append(TRANSLIT.sub(
+            lambda match: CYRILLIC[match.group()], lowered))
+    return variants
+
+
+def rebuild_trigrams(trigram_model, owner_field, objects):
+    """Пересобирает строки инвертированного индекса для объектов."""
+    objects = list(objects)
+    trigram_model.objects.filter(
+        **{f'{owner_field}__in': [obj.pk for obj in objects]}).delete()
+    rows = []
+    for obj in objects:
+        grams = trigrams(obj.name)
+        rows += [
+            trigram_model(
+                **{f'{owner_field}_id': obj.pk},
+                trigram=gram,
+                total=len(grams)
+            )
+            for gram in grams
+        ]
+    trigram_model.objects.bulk_create(rows, batch_size=1000)
+
+
+def fill_missing_trigrams(model, trigram_model, owner_field,
+                          batch_size=1000):
+    """Строит триграммы для объектов, у которых их ещё нет.
+
+    Нужна после массовой загрузки: ``bulk_create`` не шлёт сигналов.
+    """
+    missing = model.objects.filter(
+        trigrams__isnull=True).only('name').order_by('pk')
+    last = 0
+    while True:
+        chunk = list(missing.filter(pk__gt=last)[:batch_size])
+        if not chunk:
+            return
+        rebuild_trigrams(trigram_model, owner_field, chunk)
+        last = chunk[-1].pk
@@ -0,0 +1,172 @@
+import fcntl
+import io
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+from django.utils import timezone
+from PIL import Image
+
+from .constants import (
+    IMAGE_HEADER_LIMIT, IMAGE_MAX_SIDE, IMAGE_UPLOAD_MAX_SIZE,
+    UPLOAD_CHUNK_SIZE)
+from .models import ImageUpload
+
+
+class ImageRejected(ValueError):
+    pass
+
+
+class UploadConflict(Exception):
+    """Смещение клиента не совпало с сохранённым."""
+
+    def __init__(self, offset):
+        super().__init__(offset)
+        self.offset = offset
+
+
+class ImageProbe:
+    """Узнаёт формат и размеры картинки по первым байтам потока.
+
+    ``Image.open`` читает только заголовок и не выделяет память под
+    пиксели, поэтому проверка не зависит от размеров изображения.
+    """
+
+    def __init__(self):
+        self.head = b''
+        self.format = None
+        self.size = None
+
+    def feed(self, data):
+        if self.size is not None:
+            return
+        self.head += data[:IMAGE_HEADER_LIMIT - len(self.head)]
+        try:
+            image = Image.open(io.BytesIO(self.head))
+        except Image.DecompressionBombError:
+            raise ImageRejected('Слишком большое изображение.')
+        except (OSError, SyntaxError, ValueError):
+            if len(self.head) >= IMAGE_HEADER_LIMIT:
+                raise ImageRejected('Файл не похож на изображение.')
+            return
+        if max(image.size) > IMAGE_MAX_SIDE:
+            raise ImageRejected(
+                f'Сторона изображения больше {IMAGE_MAX_SIDE} пикселей.')
+        self.format, self.size = image.format, image.size
+        self.head = b''
+
+
+def check_size(size):
+    if size > IMAGE_UPLOAD_MAX_SIZE:
+        raise ImageRejected(
+            f'Файл больше {IMAGE_UPLOAD_MAX_SIZE // 1024 // 1024} МБ.')
+
+
+class ImageLimitUploadHandler(FileUploadHandler):
+    """Проверяет размер и габариты картинок в multipart по мере приёма.
+
+    Стоит первым в FILE_UPLOAD_HANDLERS и отдаёт чанки дальше без
+    изменений: лишний файл обрывается на первом же неподходящем чанке.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.probe = (
+            ImageProbe() if (self.content_type or '').startswith('image/')
+            else None
+        )
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        try:
+            check_size(self.received)
+            if self.probe is not None:
+                self.probe.feed(raw_data)
+        except ImageRejected as error:
+            raise MultiPartParserError(f'{self.field_name}: {error}')
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def append_chunk(upload, stream, length):
+    """Дописывает в загрузку ``length`` байт из потока запроса.
+
+    Поток читается кусками по UPLOAD_CHUNK_SIZE прямо в файл, так что
+    в памяти воркера не бывает больше одного куска. Файл заблокирован,
+    пока новое смещение не записано в базу; параллельная запись или
+    устаревшее смещение дают ``UploadConflict``.
+    """
+    if upload.offset + length > upload.size:
+        raise ImageRejected('Данных больше объявленного размера.')
+    os.makedirs(settings.IMAGE_UPLOAD_DIR, exist_ok=True)
+    with open(upload.path, 'ab') as file:
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadConflict(upload.offset)
+        stored = ImageUpload.objects.filter(
+            pk=upload.pk).values_list('offset', flat=True).first()
+        if stored != upload.offset:
+            raise UploadConflict(stored)
+        # Хвост от оборванного запроса, смещение которого не сохранилось.
+        file.truncate(upload.offset)
+        remaining = length
+        while remaining:
+            chunk = stream.read(min(UPLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            file.write(chunk)
+            remaining -= len(chunk)
+        file.flush()
+        upload.offset = file.tell()
+        if upload.format == '':
+            probe_upload(upload)
+        upload.save(update_fields=('offset', 'width', 'height', 'format'))
+    return upload.offset
+
+
+def probe_upload(upload):
+    probe = ImageProbe()
+    with open(upload.path, 'rb') as file:
+        while probe.size is None and file.tell() < upload.offset:
+            probe.feed(file.read(UPLOAD_CHUNK_SIZE))
+    if probe.size is None and upload.offset == upload.size:
+        raise ImageRejected('Файл не похож на изображение.')
+    if probe.size is not None:
+        upload.format = probe.format
+        upload.width, upload.height = probe.size
+
+
+class UploadedImage(UploadedFile):
+    """Готовая загрузка: хранилище перемещает файл, а не копирует его."""
+
+    def __init__(self, upload):
+        super().__init__(
+            open(upload.path, 'rb'),
+            name=f'image.{upload.format.lower()}',
+            content_type=Image.MIME.get(upload.format),
+            size=upload.size
+        )
+        self.upload = upload
+
+    def temporary_file_path(self):
+        return self.upload.path
+
+
+def expired_uploads():
+    return ImageUpload.objects.filter(
+        created__lt=timezone.now() - timedelta(
+            seconds=settings.IMAGE_UPLOAD_TTL)
+    )
+
+
+def discard(upload):
+    if os.path.exists(upload.path):
+        os.remove(upload.path)
+    upload.delete()
@@ -3,8 +3,9 @@ from rest_framework import routers
 from django.views.generic import TemplateView
 
 from .views import (ReceiptViewSet, TagViewSet, IngredientViewSet,
-                    SubscribeView, SubscriptionViewSet,
-                    UserAvatarViewSet, ReceiptShortLinkView)
+                    SubscribeView, SubscribeBatchView, SubscriptionViewSet,
+                    UserAvatarViewSet, ReceiptShortLinkView,
+                    ImageUploadView, ImageUploadDetailView)
 from users.views import CustomUserViewSet
 
 router_v1 = routers.DefaultRouter()
@@ -16,12 +17,15 @@ urlpatterns = [
     path('users/me/', CustomUserViewSet.as_view(
         {'get': 'retrieve'})),
     path('users/<int:pk_of_user>/subscribe/', SubscribeView.as_view()),
+    path('users/subscribe/batch/', SubscribeBatchView.as_view()),
     path('users/subscriptions/', SubscriptionViewSet.as_view()),
     path(
         'recipes/<int:pk_of_receipt>/get-link/',
         ReceiptShortLinkView.as_view(),
         name='receipt-get-link'
     ),
+    path('uploads/', ImageUploadView.as_view()),
+    path('uploads/<str:token>/', ImageUploadDetailView.as_view()),
     path('', include(router_v1.urls)),
     path('', include('djoser.urls')),
     path(
@@ -1,70 +1,159 @@
-from django.db.models import Sum
+import hashlib
+from datetime import timedelta
+
+from django.db.models import Count, Max, OuterRef, Prefetch, Subquery, Sum
 from rest_framework import status, viewsets, views, filters, mixins
 from rest_framework.generics import ListAPIView
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.views import APIView
-from django.http import HttpResponse, HttpResponseRedirect
+from django.core.cache import cache
+from django.http import (Http404, HttpResponse, HttpResponseRedirect,
+                         StreamingHttpResponse)
+from django.utils import timezone
+from django.utils.http import quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.response import Response
 from rest_framework.validators import ValidationError
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 
 from .models import (Receipt, Tag, Ingredient, Favorite,
-                     IngredientReceipt, ShoppingList,
-                     User)
+                     ShoppingList, Subscription, User, ImageUpload,
+                     LegacyShortLink, ShortLinkClick)
 from .serializers import (ReceiptSerializer, TagSerializer,
-                          IngredientSerializer, AddReceiptToListesSerializer,
-                          AddReceiptSerializer, ShortReceiptSerializer,
-                          SubscribeSerializer, SubscriptionSerializer,
-                          UserAvatarSerializer)
-from .filters import IngredientFilter, TagFilter
+                          IngredientSerializer, AddReceiptSerializer,
+                          ShortReceiptSerializer, SubscriptionSerializer,
+                          UserAvatarSerializer, ImageUploadSerializer,
+                          IdBatchSerializer)
+from .filters import IngredientFilter, TagFilter, TrigramSearchFilter
 from .permissions import IsOwnerOrReadOnly
-from .pagination import ReceiptPagination
+from .cache import AnonymousCacheMixin
+from .catalog import catalog_response
+from .conditional import (REMOVED_INGREDIENTS, REMOVED_RECIPES, REMOVED_TAGS,
+                          ConditionalGetMixin, etag_matches)
+from .constants import (CLICK_STATS_DAYS, CLICK_STATS_MAX_DAYS,
+                        EXPORT_CHUNK_SIZE, INGREDIENT_AUTOCOMPLETE_LIMIT)
+from .counters import (increment_returning, shift_receipt_counter,
+                       shift_user_counter)
+from . import (clicks, images, ingredient_index, relations,
+               shopping_cart, shortlinks, uploads)
+from .exporters import cached_export
+from .pagination import ReceiptFeedPagination, ReceiptPagination
+from .renderers import SHOPPING_LIST_RENDERERS
+
+
+def receipt_exists(pk):
+    """Проверяет рецепт, по возможности без запроса к базе."""
+    if shortlinks.is_known(pk):
+        return True
+    if not Receipt.objects.filter(pk=pk).exists():
+        return False
+    shortlinks.remember(pk)
+    return True
 
 
 class ReceiptShortLinkView(APIView):
     permission_classes = (AllowAny,)
 
     def get(self, request, pk_of_receipt):
-        receipt = get_object_or_404(Receipt, pk=pk_of_receipt)
-        if not receipt.short_link:
-            receipt.short_link = receipt.generate_short_link()
-            receipt.save()
+        if not receipt_exists(pk_of_receipt):
+            raise Http404
         short_url = request.build_absolute_uri(
-            f'/short/{receipt.short_link}')
+            f'/short/{shortlinks.encode(pk_of_receipt)}')
         return Response({'short-link': short_url}, status=status.HTTP_200_OK)
 
 
+def batch_ids(request):
+    serializer = IdBatchSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data['ids']
+
+
+def batch_response(outcomes):
+    """Исход по каждому id в порядке запроса."""
+    return Response({'results': [
+        {'id': pk, 'status': outcome} for pk, outcome in outcomes.items()
+    ]})
+
+
 class ReceiptMixin:
+    short_fields = ('name', 'image', 'image_variants', 'cooking_time')
+
+    def receipt_pk(self, pk):
+        try:
+            return int(pk)
+        except ValueError:
+            raise Http404
+
+    @transaction.atomic
     def add_receipt(self, request, pk, table):
-        receipt = get_object_or_404(Receipt, pk=pk)
-        user = request.user
-        data = {'user': user.id, 'receipt': receipt.id}
-        serializer = AddReceiptToListesSerializer(
-            data=data, context={'table': table})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+        pk, user = self.receipt_pk(pk), request.user
+        if not relations.link(table, user.id, 'receipt', pk):
+            if relations.missing_target(table, 'receipt', pk):
+                raise Http404
+            raise ValidationError(
+                {'detail': ['Этот рецепт уже добавлен.']})
+        receipt = increment_returning(
+            Receipt, pk, table.counter_field, self.short_fields,
+            modified=timezone.now()
+        )
+        if receipt is None:
+            # Рецепт удалён между INSERT и UPDATE; транзакция откатится.
+            raise Http404
+        if table is ShoppingList:
+            shopping_cart.apply_receipts(user.id, (receipt.id,), 1)
         serializer = ShortReceiptSerializer(receipt)
         return Response(data=serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete_receipt(self, request, pk, table):
-        receipt = get_object_or_404(Receipt, pk=pk)
-        user = request.user
-        deleting_object = table.objects.filter(
-            user=user, receipt=receipt).first()
-        if not deleting_object:
+        pk, user = self.receipt_pk(pk), request.user
+        if not relations.unlink(table, user.id, 'receipt', pk):
+            if relations.missing_target(table, 'receipt', pk):
+                raise Http404
             raise ValidationError({'detail': 'Объект не существует'})
-        deleting_object.delete()
+        shift_receipt_counter((pk,), table.counter_field, -1)
+        if table is ShoppingList:
+            shopping_cart.apply_receipts(user.id, (pk,), -1)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def add_receipts(self, request, table):
+        ids, user = batch_ids(request), request.user
+        with transaction.atomic():
+            outcomes, added = relations.link_many(
+                table, user.id, 'receipt', ids)
+            if added:
+                shift_receipt_counter(added, table.counter_field, 1)
+                if table is ShoppingList:
+                    shopping_cart.apply_receipts(user.id, added, 1)
+        return batch_response(outcomes)
+
+    def delete_receipts(self, request, table):
+        ids, user = batch_ids(request), request.user
+        with transaction.atomic():
+            outcomes, removed = relations.unlink_many(
+                table, user.id, 'receipt', ids)
+            if removed:
+                shift_receipt_counter(removed, table.counter_field, -1)
+                if table is ShoppingList:
+                    shopping_cart.apply_receipts(user.id, removed, -1)
+        return batch_response(outcomes)
+
 
 class ShortLinkRedirectView(APIView):
     permission_classes = (AllowAny,)
 
     def get(self, request, short_link):
-        receipt = get_object_or_404(Receipt, short_link=short_link)
-        return HttpResponseRedirect(f'/recipes/{receipt.id}/')
+        pk = shortlinks.decode(short_link)
+        if pk is None:
+            pk = get_object_or_404(
+                LegacyShortLink, code=short_link).receipt_id
+        elif not receipt_exists(pk):
+            raise Http404
+        clicks.record(pk)
+        return HttpResponseRedirect(f'/recipes/{pk}/')
 
 
 class UserAvatarViewSet(viewsets.ModelViewSet):
@@ -85,19 +174,55 @@ class UserAvatarViewSet(viewsets.ModelViewSet):
             return Response(status=status.HTTP_400_BAD_REQUEST)
         return super().update(request, *args, **kwargs)
 
+    def perform_update(self, serializer):
+        user = serializer.save()
+        if user.avatar and (
+                user.avatar.name != user.avatar_variants.get('source')):
+            images.schedule(images.build_avatar_variants, user.pk)
+
     def destroy(self, request, *args, **kwargs):
         user = self.get_object()
         user.avatar = None
+        user.avatar_variants = {}
         user.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class ReceiptViewSet(viewsets.ModelViewSet, ReceiptMixin):
+class ReceiptViewSet(ConditionalGetMixin, AnonymousCacheMixin,
+                     viewsets.ModelViewSet, ReceiptMixin):
     queryset = Receipt.objects.all()
     permission_classes = (IsOwnerOrReadOnly,)
-    pagination_class = ReceiptPagination
-    filter_backends = (DjangoFilterBackend,)
+    pagination_class = ReceiptFeedPagination
+    filter_backends = (
+        DjangoFilterBackend, filters.OrderingFilter, TrigramSearchFilter)
     filterset_class = TagFilter
+    ordering_fields = ('pub_date', 'favorites_count', 'shopping_cart_count')
+    removal_scope = REMOVED_RECIPES
+    volatile_fields = ('favorites_count', 'shopping_cart_count')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.with_related().with_user_flags(
+                self.request.user)
+        return queryset
+
+    def get_user_state(self, request):
+        user = request.user
+        if user.is_anonymous:
+            return ()
+        state = {}
+        for name, model in (('favorites', Favorite),
+                            ('shopping_list', ShoppingList),
+                            ('follower', Subscription)):
+            rows = model.objects.filter(
+                user=OuterRef('pk')).order_by().values('user')
+            state[f'{name}_count'] = Subquery(
+                rows.annotate(value=Count('pk')).values('value'))
+            state[f'{name}_last'] = Subquery(
+                rows.annotate(value=Max('pk')).values('value'))
+        return User.objects.filter(pk=user.pk).annotate(
+            **state).values_list(*state).first()
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
@@ -108,6 +233,15 @@ class ReceiptViewSet(viewsets.ModelViewSet, ReceiptMixin):
         user = self.request.user
         serializer.save(author=user)
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        author_id = instance.author_id
+        cart_users = list(
+            instance.shopping_list.values_list('user_id', flat=True))
+        instance.delete()
+        shift_user_counter((author_id,), 'recipes_count', -1)
+        shopping_cart.recompute(cart_users)
+
     @action(
         detail=True,
         methods=('post',),
@@ -122,32 +256,53 @@ class ReceiptViewSet(viewsets.ModelViewSet, ReceiptMixin):
 
     @action(
         detail=False,
+        methods=('post',),
+        url_path='favorite/batch',
         permission_classes=(IsAuthenticated,)
     )
+    def favorite_batch(self, request):
+        return self.add_receipts(request, Favorite)
+
+    @favorite_batch.mapping.delete
+    def delete_favorite_batch(self, request):
+        return self.delete_receipts(request, Favorite)
+
+    @action(
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=SHOPPING_LIST_RENDERERS
+    )
     def download_shopping_cart(self, request):
-        ingredients = IngredientReceipt.objects.filter(
-            receipt__shopping_list__user=request.user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).order_by(
-            'ingredient__name'
-        ).annotate(ingredient_total=Sum('amount'))
-        file_name = 'shopping_list.txt'
-        header = '{:<30} {:<20} {:<10}'.format(
-            'Ингредиент', 'Мера измерения', 'Количество')
-        lines = [header, '-' * len(header)]  # Заголовок и разделитель
-        for ingredient in ingredients:
-            name = ingredient['ingredient__name']
-            measurement_unit = ingredient['ingredient__measurement_unit']
-            amount = ingredient['ingredient_total']
-            line = '{:<30} {:<20} {:<10}'.format(
-                name, measurement_unit, amount)
-            lines.append(line)
-        lines.append('\nAlexMos Production')
-        content = '\n'.join(lines)
-        content_type = 'text/plain;charset=utf-8'
-        response = HttpResponse(content, content_type=content_type)
+        export_format = request.accepted_renderer.format
+        state = ShoppingList.objects.filter(
+            user=request.user
+        ).order_by('receipt_id').values_list('receipt_id', 'receipt__modified')
+        digest = hashlib.md5(repr(list(state)).encode()).hexdigest()
+        etag = quote_etag(f'{digest}-{export_format}')
+        if etag_matches(etag, request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+            response['ETag'] = etag
+            return response
+        content_type = request.accepted_renderer.media_type
+        if request.accepted_renderer.charset:
+            content_type += f';charset={request.accepted_renderer.charset}'
+        cache_key = f'shopping_cart:{request.user.id}:{etag}'
+        content = cache.get(cache_key)
+        if content is not None:
+            response = HttpResponse(content, content_type=content_type)
+        else:
+            ingredients = request.user.shopping_cart_items.values_list(
+                'ingredient__name', 'ingredient__measurement_unit',
+                'total_amount'
+            ).order_by('ingredient__name').iterator(
+                chunk_size=EXPORT_CHUNK_SIZE)
+            response = StreamingHttpResponse(
+                cached_export(ingredients, export_format, cache_key),
+                content_type=content_type
+            )
+        file_name = f'shopping_list.{export_format}'
         response['Content-Disposition'] = f'attachment; filename={file_name}'
+        response['ETag'] = etag
         return response
 
     @action(
@@ -162,28 +317,85 @@ class ReceiptViewSet(viewsets.ModelViewSet, ReceiptMixin):
     def delete_shopping_cart(self, request, pk):
         return self.delete_receipt(request, pk, ShoppingList)
 
-
-class TagViewSet(mixins.ListModelMixin,
+    @action(
+        detail=False,
+        methods=('post',),
+        url_path='shopping_cart/batch',
+        permission_classes=(IsAuthenticated,)
+    )
+    def shopping_cart_batch(self, request):
+        return self.add_receipts(request, ShoppingList)
+
+    @shopping_cart_batch.mapping.delete
+    def delete_shopping_cart_batch(self, request):
+        return self.delete_receipts(request, ShoppingList)
+
+    @action(detail=True, permission_classes=(IsAuthenticated,))
+    def clicks(self, request, pk):
+        """Переходы по короткой ссылке рецепта по дням, только автору.
+
+        Счётчики сбрасываются в базу пачками, поэтому последние
+        переходы появляются здесь с задержкой.
+        """
+        author_id = get_object_or_404(
+            Receipt.objects.values_list('author_id', flat=True), pk=pk)
+        if author_id != request.user.id:
+            raise PermissionDenied('Статистика доступна только автору.')
+        try:
+            days = int(request.query_params.get('days', CLICK_STATS_DAYS))
+        except ValueError:
+            days = 0
+        if not 0 < days <= CLICK_STATS_MAX_DAYS:
+            raise ValidationError({'days': (
+                f'Укажите число дней от 1 до {CLICK_STATS_MAX_DAYS}.')})
+        rows = ShortLinkClick.objects.filter(
+            receipt_id=pk,
+            day__gt=timezone.localdate() - timedelta(days=days)
+        ).order_by('day').values('day', 'count')
+        return Response({
+            'total': ShortLinkClick.objects.filter(
+                receipt_id=pk).aggregate(total=Sum('count'))['total'] or 0,
+            'days': list(rows),
+        })
+
+
+class TagViewSet(ConditionalGetMixin,
+                 mixins.ListModelMixin,
                  mixins.RetrieveModelMixin,
                  viewsets.GenericViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
+    removal_scope = REMOVED_TAGS
 
 
-class IngredientViewSet(mixins.ListModelMixin,
+class IngredientViewSet(ConditionalGetMixin,
+                        mixins.ListModelMixin,
                         mixins.RetrieveModelMixin,
                         viewsets.GenericViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [
+        DjangoFilterBackend, filters.SearchFilter, TrigramSearchFilter]
     filterset_class = IngredientFilter
     pagination_class = None
+    removal_scope = REMOVED_INGREDIENTS
 
     search_fields = ['name']
 
+    @action(detail=False)
+    def catalog(self, request):
+        return catalog_response(request)
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name and len(request.query_params) == 1:
+            return Response(ingredient_index.get_index().search(
+                name, INGREDIENT_AUTOCOMPLETE_LIMIT))
+        return super().list(request, *args, **kwargs)
+
 
 class SubscriptionViewSet(ListAPIView):
     serializer_class = SubscriptionSerializer
@@ -192,34 +404,162 @@ class SubscriptionViewSet(ListAPIView):
 
     def get_queryset(self):
         user = self.request.user
-        return user.follower.all()
+        return user.follower.select_related('author').prefetch_related(
+            Prefetch(
+                'author__author_receipts',
+                queryset=self.get_recipes_queryset(),
+                to_attr='subscription_receipts'
+            )
+        ).order_by('-id')
+
+    def get_recipes_queryset(self):
+        """Рецепты авторов страницы, не более recipes_limit на автора.
+
+        Ограничение применяется в SQL коррелированным подзапросом,
+        поэтому рецепты всех авторов страницы выбираются одним запросом.
+        """
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        queryset = Receipt.objects.all()
+        if recipes_limit and recipes_limit.isdigit():
+            queryset = queryset.filter(pk__in=Subquery(
+                Receipt.objects.filter(
+                    author=OuterRef('author')
+                ).values('pk')[:int(recipes_limit)]
+            ))
+        return queryset
 
 
 class SubscribeView(views.APIView):
     permission_classes = (IsAuthenticated,)
+    author_fields = ('email', 'username', 'first_name', 'last_name',
+                     'avatar', 'avatar_variants', 'recipes_count',
+                     'followers_count')
 
-    def get_author(self, pk_of_user):
-        return get_object_or_404(User, pk=pk_of_user)
-
+    @transaction.atomic
     def post(self, request, pk_of_user):
-        author = self.get_author(pk_of_user)
         user = request.user
-        serializer = SubscribeSerializer(
-            data={'author': author.id, 'user': user.id},
+        if pk_of_user == user.id:
+            raise ValidationError(
+                {'non_field_errors': ['Нельзя подписаться на самого себя!']})
+        if not relations.link(Subscription, user.id, 'author', pk_of_user):
+            if relations.missing_target(Subscription, 'author', pk_of_user):
+                raise Http404
+            raise ValidationError({'non_field_errors': [
+                'Вы уже подписаны на этого пользователя!']})
+        author = increment_returning(
+            User, pk_of_user, 'followers_count', self.author_fields)
+        if author is None:
+            raise Http404
+        recipes = []
+        if author.recipes_count:
+            recipes = Receipt.objects.filter(author_id=author.id).only(
+                *ReceiptMixin.short_fields)
+            recipes_limit = request.query_params.get('recipes_limit')
+            if recipes_limit and recipes_limit.isdigit():
+                recipes = recipes[:int(recipes_limit)]
+        author.subscription_receipts = list(recipes)
+        serializer = SubscriptionSerializer(
+            Subscription(user=user, author=author),
             context={'request': request}
         )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete(self, request, pk_of_user):
-        author = self.get_author(pk_of_user)
         user = request.user
-        subscription = author.following.filter(user=user).first()
-        if not subscription:
+        if not relations.unlink(Subscription, user.id, 'author', pk_of_user):
+            if relations.missing_target(Subscription, 'author', pk_of_user):
+                raise Http404
             return Response(
                 {'detail': 'Подписка не существует.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        subscription.delete()
+        shift_user_counter((pk_of_user,), 'followers_count', -1)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class SubscribeBatchView(views.APIView):
+    """Подписка и отписка списком id авторов за один запрос."""
+
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request):
+        return self.apply(request, relations.link_many, 1)
+
+    def delete(self, request):
+        return self.apply(request, relations.unlink_many, -1)
+
+    def apply(self, request, change, delta):
+        ids, user = batch_ids(request), request.user
+        with transaction.atomic():
+            outcomes, changed = change(
+                Subscription, user.id, 'author',
+                [pk for pk in ids if pk != user.id]
+            )
+            if changed:
+                shift_user_counter(changed, 'followers_count', delta)
+        if user.id in ids:
+            outcomes[user.id] = relations.SELF
+        return batch_response({pk: outcomes[pk] for pk in ids})
+
+
+class ImageUploadView(views.APIView):
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request):
+        serializer = ImageUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(user=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class ImageUploadDetailView(views.APIView):
+    """Дозагрузка изображения частями.
+
+    PATCH с заголовком ``Upload-Offset`` и сырыми байтами в теле дописывает
+    их в файл; тело читается из потока, не через ``request.data``.
+    """
+
+    permission_classes = (IsAuthenticated,)
+
+    def get_upload(self, token):
+        return get_object_or_404(
+            ImageUpload, token=token, user=self.request.user)
+
+    def get(self, request, token):
+        return Response(ImageUploadSerializer(self.get_upload(token)).data)
+
+    def patch(self, request, token):
+        upload = self.get_upload(token)
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return Response(
+                {'detail': 'Нужны заголовки Upload-Offset и Content-Length.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if offset != upload.offset:
+            return Response(
+                {'detail': 'Смещение не совпадает.', 'offset': upload.offset},
+                status=status.HTTP_409_CONFLICT
+            )
+        try:
+            uploads.append_chunk(upload, request.stream, length)
+        except uploads.UploadConflict as conflict:
+            return Response(
+                {
+                    'detail': 'Смещение не совпадает.',
+                    'offset': conflict.offset
+                },
+                status=status.HTTP_409_CONFLICT
+            )
+        except uploads.ImageRejected as error:
+            uploads.discard(upload)
+            return Response(
+                {'detail': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(ImageUploadSerializer(upload).data)
+
+    def delete(self, request, token):
+        uploads.discard(self.get_upload(token))
         return Response(status=status.HTTP_204_NO_CONTENT)
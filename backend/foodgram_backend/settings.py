@@ -64,13 +64,96 @@ TEMPLATES = [
 WSGI_APPLICATION = 'foodgram_backend.wsgi.application'
 
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+# PgBouncer в режиме transaction: пул соединений снаружи Django.
+# Именованные курсоры и параметры запуска через него не проходят,
+# поэтому statement_timeout задаётся роли: ALTER ROLE ... SET.
+DB_POOLER = os.getenv('DB_POOLER', '')
+DB_STATEMENT_TIMEOUT = int(os.getenv('DB_STATEMENT_TIMEOUT', 30000))
+# Перед запросом проверять постоянное соединение и закрывать порванное,
+# но не чаще раза в DB_HEALTH_CHECK_INTERVAL секунд на соединение.
+DB_HEALTH_CHECKS = os.getenv('DB_HEALTH_CHECKS', 'True') == 'True'
+DB_HEALTH_CHECK_INTERVAL = int(os.getenv('DB_HEALTH_CHECK_INTERVAL', 30))
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('POSTGRES_DB', 'foodgram'),
+            'USER': os.getenv('POSTGRES_USER', 'foodgram'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'db'),
+            'PORT': int(os.getenv('DB_PORT', 5432)),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 600)),
+            'DISABLE_SERVER_SIDE_CURSORS': DB_POOLER == 'pgbouncer',
+            'OPTIONS': {
+                'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', 5)),
+            },
+        }
+    }
+    if DB_POOLER != 'pgbouncer':
+        DATABASES['default']['OPTIONS']['options'] = (
+            f'-c statement_timeout={DB_STATEMENT_TIMEOUT}')
+else:
+    # WAL, synchronous=NORMAL и BEGIN IMMEDIATE: см. foodgram_backend.sqlite3.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'foodgram_backend.sqlite3',
+            'NAME': os.getenv('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 600)),
+            'PRAGMAS': {
+                'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', 5000)),
+                'cache_size': -int(os.getenv('SQLITE_CACHE_KB', 64000)),
+                'mmap_size': int(os.getenv(
+                    'SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+            },
+        }
     }
+
+# lru живёт в памяти процесса: адресная инвалидация не доходит до других
+# воркеров. При нескольких воркерах нужен общий кеш (file).
+RECIPES_CACHE = os.getenv('RECIPES_CACHE', 'lru')
+RECIPES_CACHE_TIMEOUT = int(os.getenv('RECIPES_CACHE_TIMEOUT', 300))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'recipes': {
+        'lru': {
+            'BACKEND': 'api.cache_backends.SizedLRUCache',
+            'TIMEOUT': RECIPES_CACHE_TIMEOUT,
+            'OPTIONS': {
+                'MAX_SIZE': int(os.getenv(
+                    'RECIPES_CACHE_MAX_SIZE', 64 * 1024 * 1024)),
+            },
+        },
+        'file': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv(
+                'RECIPES_CACHE_LOCATION', BASE_DIR / 'cache' / 'recipes'),
+            'TIMEOUT': RECIPES_CACHE_TIMEOUT,
+        },
+    }[RECIPES_CACHE],
 }
 
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+SHOPPING_LIST_CACHE_MAX_SIZE = int(os.getenv(
+    'SHOPPING_LIST_CACHE_MAX_SIZE', 2 * 1024 * 1024))
+
+INGREDIENT_INDEX_TIMEOUT = int(os.getenv('INGREDIENT_INDEX_TIMEOUT', 300))
+
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', 2))
+
+if DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    INSTALLED_APPS.append('django.contrib.postgres')
+
+TRIGRAM_SIMILARITY_THRESHOLD = float(
+    os.getenv('TRIGRAM_SIMILARITY_THRESHOLD', 0.3))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -107,6 +190,25 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 # MEDIA_ROOT = BASE_DIR / 'media'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+DEFAULT_FILE_STORAGE = 'api.storage.ContentAddressedStorage'
+MEDIA_GC_MIN_AGE = int(os.getenv('MEDIA_GC_MIN_AGE', 3600))
+
+FILE_UPLOAD_HANDLERS = (
+    'api.uploads.ImageLimitUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+)
+IMAGE_UPLOAD_DIR = os.getenv(
+    'IMAGE_UPLOAD_DIR', os.path.join(BASE_DIR, 'uploads'))
+IMAGE_UPLOAD_TTL = int(os.getenv('IMAGE_UPLOAD_TTL', 24 * 3600))
+
+SHORT_LINK_MULTIPLIER = int(os.getenv('SHORT_LINK_MULTIPLIER', 1580030173))
+SHORT_LINK_OFFSET = int(os.getenv('SHORT_LINK_OFFSET', 0))
+SHORT_LINK_CACHE_SIZE = int(os.getenv('SHORT_LINK_CACHE_SIZE', 100000))
+SHORT_LINK_CLICKS_FLUSH_INTERVAL = int(
+    os.getenv('SHORT_LINK_CLICKS_FLUSH_INTERVAL', 30))
+SHORT_LINK_CLICKS_MAX_PENDING = int(
+    os.getenv('SHORT_LINK_CLICKS_MAX_PENDING', 10000))
 
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -133,8 +235,8 @@ DJOSER = {
     'USER_ID_FIELD': 'id',
     'HIDE_USERS': False,
     'SERIALIZERS': {
-        'user': 'api.serializers.MyUserSerializer',
-        'current_user': 'api.serializers.MyUserSerializer',
+        'user': 'api.serializers.MyUserDetailSerializer',
+        'current_user': 'api.serializers.MyUserDetailSerializer',
         'user_create': 'api.serializers.MyUserCreateSerializer',
     },
     'VIEWSET': {
@@ -0,0 +1,35 @@
+from django.db.backends.sqlite3 import base
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite, настроенный для нескольких воркеров на одной машине.
+
+    На каждом соединении включаются WAL (читатели не ждут писателя),
+    ``synchronous=NORMAL`` (fsync при checkpoint, а не на каждый
+    коммит), ``busy_timeout``, кеш страниц и mmap. Значения по умолчанию
+    переопределяются ключом ``PRAGMAS`` в настройках базы.
+
+    Транзакции открываются ``BEGIN IMMEDIATE``: блокировка записи
+    берётся сразу, и ожидание укладывается в ``busy_timeout``.
+    Отложенный ``BEGIN`` при попытке повысить блокировку в момент
+    чужой записи сразу падает с ``database is locked``.
+    """
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        pragmas = {**DEFAULT_PRAGMAS, **self.settings_dict.get('PRAGMAS', {})}
+        for name, value in pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
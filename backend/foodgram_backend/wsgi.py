@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_backend.settings')
 
 application = get_wsgi_application()
+
+# Индекс ингредиентов строится при старте воркера, а не на первом запросе.
+from api import ingredient_index  # noqa: E402
+from django.db import DatabaseError  # noqa: E402
+
+try:
+    ingredient_index.get_index()
+except DatabaseError:
+    pass
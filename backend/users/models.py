@@ -37,6 +37,11 @@ class User(AbstractUser):
         null=True,
         default=None
     )
+    avatar_variants = models.JSONField(
+        'Уменьшенные копии', default=dict, blank=True, editable=False)
+    recipes_count = models.PositiveIntegerField('Рецептов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0, db_index=True)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']